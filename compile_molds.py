@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import logging
+import sys
+
+logging.basicConfig(
+    level='INFO',
+    format='%(asctime)s %(levelname)s %(name)s %(message)s'
+)
+
+COMPILED_TARGET = 'nunja.compiled'
+
+
+def main():
+    from repodono.nunja.registry import registry
+    from repodono.nunja.precompile import compile_molds
+    import repodono.nunja.testing
+    registry.register_module(repodono.nunja.testing, subdir='mold')
+    registry.init_entrypoints()
+
+    target = sys.argv[1] if len(sys.argv) > 1 else COMPILED_TARGET
+    compile_molds(registry, target)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,7 @@ def main():
     # Testing molds needed manual intervention.
     from repodono.nunja.registry import registry
     from repodono.nunja import exporters
+    from repodono.nunja.archive import pack_molds
     import repodono.nunja.testing
     registry.register_module(repodono.nunja.testing, subdir='mold')
     registry.init_entrypoints()
@@ -35,12 +36,22 @@ def main():
     compiler = NunjaRJSToolchain()
     compiler(bundle_target)
 
+    requirejs_json, template_paths_json = (
+        registry.export_requirejs_and_template_paths())
+
     with open('nunja.generated.js', 'w') as fd:
-        fd.write(exporters.export_umd_requirejs())
+        fd.write(exporters.export_umd_generic_json(requirejs_json))
 
     with open('nunja_id.exported.js', 'w') as fd:
-        fd.write(exporters.export_umd_generic_json(
-            registry.export_jinja_template_paths()))
+        fd.write(exporters.export_umd_generic_json(template_paths_json))
+
+    with open('nunja.manifest.json', 'w') as fd:
+        fd.write(registry.export_manifest())
+
+    pack_molds(registry, 'nunja.molds.pack')
+
+    exporters.export_fingerprinted(
+        'nunja.fingerprinted', bundles={'repodono.nunja': bundle_target})
 
     os.environ['NODE_PATH'] = NODE_PATH
     call([GRUNT, '--gruntfile=Gruntfile.js'] + sys.argv[1:])
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Rendering of molds from within an asyncio event loop.
+
+This requires Python 3.5 or later along with a Jinja2 version that
+supports the ``enable_async`` environment option.
+"""
+
+import asyncio
+from functools import partial
+from types import CodeType
+
+from jinja2 import TemplateNotFound
+
+from repodono.nunja.engine import Engine
+from repodono.nunja.registry import TMPL_FN_EXT
+
+# only available from within a coroutine since Python 3.7, where the
+# get_event_loop function is deprecated for that use.
+_get_running_loop = getattr(
+    asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+def _code_constants(code):
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            for value in _code_constants(const):
+                yield value
+        elif isinstance(const, str):
+            yield const
+
+
+def referenced_templates(template):
+    """
+    Return the set of names of the templates that the compiled template
+    may include, import or extend by name, which are the string
+    constants with the template file extension in its code.
+
+    As the code is used, this works for templates loaded from the
+    bytecode cache, and the source need not be parsed again.
+    """
+
+    codes = [template.root_render_func.__code__] + [
+        func.__code__ for func in template.blocks.values()]
+    return set(
+        value for code in codes for value in _code_constants(code)
+        # the name of the template itself is passed along with loads.
+        if value.endswith(TMPL_FN_EXT) and value != template.name
+    )
+
+
+class AsyncEngine(Engine):
+    """
+    An engine that render molds with coroutines.
+
+    The loading of templates (and, unless the engine is frozen, their
+    revalidation) is done through the executor, such that the event
+    loop will never block on the filesystem.  Note that templates that
+    are included by name still have their freshness checked as part of
+    the rendering, unless the engine is frozen.
+
+    Iterables in the data may also be asynchronous iterables, such as
+    async generators.
+    """
+
+    environment_options = {'enable_async': True}
+
+    def __init__(self, *a, **kw):
+        """
+        Accepts the same arguments as ``Engine``, plus an ``executor``
+        for the loading of templates; the default executor of the loop
+        will be used if one is not provided.
+        """
+
+        self.executor = kw.pop('executor', None)
+        super(AsyncEngine, self).__init__(*a, **kw)
+
+    def load_mold_tree(self, mold_id):
+        """
+        Load the template for the mold along with the templates that it
+        statically include, import or extend by name, recursively, such
+        that their use during rendering will not require a load.
+        """
+
+        template = self.get_mold(mold_id)
+        seen = set([template.name])
+        pending = [template]
+        while pending:
+            for name in referenced_templates(pending.pop()):
+                if name in seen:
+                    continue
+                seen.add(name)
+                try:
+                    pending.append(self.env.get_template(name))
+                except TemplateNotFound:
+                    # not every matching constant is a template name.
+                    continue
+        return template
+
+    async def get_mold_async(self, mold_id):
+        """
+        Return the template for the mold like ``get_mold``, with all
+        the potential filesystem access done through the executor.
+        """
+
+        if self.frozen and mold_id in self._mold_cache:
+            return self.get_mold(mold_id)
+
+        if mold_id in self._mold_cache:
+            load = partial(self.get_mold, mold_id)
+        else:
+            load = partial(self.load_mold_tree, mold_id)
+        return await _get_running_loop().run_in_executor(
+            self.executor, load)
+
+    async def execute_async(self, mold_id, data, wrapper_tag='div'):
+        """
+        Execute a mold `mold_id` like ``execute``, as a coroutine.
+        """
+
+        template = await self.get_mold_async(mold_id)
+        cached = self._fused_cache.get(mold_id)
+        if cached is not None and cached[0] is template:
+            fused = cached[1] or self._core_template_
+        else:
+            # loading requires the source of the mold template.
+            fused = await _get_running_loop().run_in_executor(
+                self.executor, self.get_fused, mold_id, template, wrapper_tag)
+        kwargs = self._execute_kwargs(mold_id, template, data, wrapper_tag)
+        # as rendering is not likely to be suspended, give other tasks a
+        # chance to run between the renders.
+        await asyncio.sleep(0)
+        return await fused.render_async(**kwargs)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Single file archive of the templates of all registered molds.
+
+The archive starts with a fixed header, which is the magic bytes along
+with the length of the json encoded index that follows it.  The index
+records the registry name, the templates of each mold, and for every
+mold_id path the offset (from the end of the index) and size of its
+contents along with its sha256 hash.  The contents follow the index.
+
+For deployment, ``pack_molds`` will produce such an archive from a
+registry, and the ``ArchiveLoader`` may then be used by the engine in
+place of the ``NunjaLoader`` to serve the templates directly from the
+memory mapped archive, without any access to the mold directories.
+"""
+
+import json
+import mmap
+import struct
+from hashlib import sha256
+from os.path import join
+from threading import Lock
+
+from jinja2.loaders import BaseLoader
+from jinja2.loaders import TemplateNotFound
+
+from .exc import ArchiveError
+from .resources import read_bytes
+from .utils import atomic_write
+
+MAGIC = b'NUNJAPK1'
+HEADER = struct.Struct('>8sQ')
+
+
+def pack_molds(registry, target):
+    """
+    Pack every template of the molds in the registry, as enumerated by
+    ``export_jinja_template_paths``, into a single archive at target.
+    Returns the index that was written.
+    """
+
+    template_map = json.loads(
+        registry.export_jinja_template_paths())['template_map']
+    entries = {}
+    chunks = []
+    offset = 0
+    for mold_id in sorted(template_map):
+        root = registry.mold_id_to_path(mold_id)
+        for name in template_map[mold_id]:
+            name = name.replace('\\', '/')
+            contents = read_bytes(join(root, *name.split('/')))
+            entries[mold_id + '/' + name] = [
+                offset, len(contents), sha256(contents).hexdigest()]
+            chunks.append(contents)
+            offset += len(contents)
+
+    index = {
+        'registry_name': registry.registry_name,
+        'molds': dict(
+            (mold_id, sorted(n.replace('\\', '/') for n in names))
+            for mold_id, names in template_map.items()
+        ),
+        'entries': entries,
+    }
+    raw_index = json.dumps(index, sort_keys=True).encode('utf-8')
+
+    atomic_write(target, b''.join(
+        [HEADER.pack(MAGIC, len(raw_index)), raw_index] + chunks))
+    return index
+
+
+class MoldArchive(object):
+    """
+    A memory mapped archive produced by ``pack_molds``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ArchiveError('%s is not a mold archive' % path)
+        try:
+            magic, size = HEADER.unpack(self._mmap[:HEADER.size])
+            if magic != MAGIC:
+                raise ValueError('bad magic')
+            index = json.loads(
+                self._mmap[HEADER.size:HEADER.size + size].decode('utf-8'))
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise ArchiveError('%s is not a mold archive' % path)
+
+        self.registry_name = index['registry_name']
+        self.molds = index['molds']
+        self.entries = index['entries']
+        self._data_offset = HEADER.size + size
+        self._verified = set()
+        self._lock = Lock()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def read(self, name):
+        """
+        Return the contents for the mold_id path name, which will have
+        its hash checked on the first read.
+
+        Raises KeyError if there is no such entry, or ArchiveError if it
+        failed the integrity check.
+        """
+
+        offset, size, digest = self.entries[name]
+        start = self._data_offset + offset
+        with self._lock:
+            contents = self._mmap[start:start + size]
+        if name not in self._verified:
+            if (len(contents) != size or
+                    sha256(contents).hexdigest() != digest):
+                raise ArchiveError(
+                    'entry %s in %s failed integrity check' % (
+                        name, self.path))
+            self._verified.add(name)
+        return contents
+
+    def close(self):
+        self._mmap.close()
+
+
+class ArchiveLoader(BaseLoader):
+    """
+    Load templates from a ``MoldArchive``, or the path to one.  As the
+    archive is not expected to change, templates are always considered
+    to be up to date.
+    """
+
+    def __init__(self, archive):
+        if not isinstance(archive, MoldArchive):
+            archive = MoldArchive(archive)
+        self.archive = archive
+
+    def get_source(self, environment, template):
+        try:
+            contents = self.archive.read(template)
+        except KeyError:
+            raise TemplateNotFound(template)
+        filename = self.archive.path + '/' + template
+        return contents.decode('utf-8'), filename, lambda: True
+
+    def list_templates(self):
+        return sorted(self.archive.entries)
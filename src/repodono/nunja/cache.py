@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Caching support for the rendering of molds.
+"""
+
+import errno
+from hashlib import sha1
+from os import makedirs
+from collections import OrderedDict
+from logging import getLogger
+from threading import Lock
+
+from jinja2.bccache import FileSystemBytecodeCache
+
+from .utils import atomic_write
+
+logger = getLogger(__name__)
+
+# 16 MiB worth of template sources.
+DEFAULT_SOURCE_CACHE_SIZE = 16 * 1024 * 1024
+
+
+class NunjaBytecodeCache(FileSystemBytecodeCache):
+    """
+    A persistent bytecode cache for the templates provided by molds.
+
+    Entries are keyed by the mold_id path of the template along with
+    the filesystem path it was resolved to, and each entry records the
+    checksum of the source it was compiled from, such that a change to
+    the source or a mold_id registered against a different directory
+    will never load stale bytecode.
+
+    The directory may be shared by any number of processes, as entries
+    are written out to a temporary file before being atomically moved
+    into place, and any unreadable entry is simply treated as a miss.
+    """
+
+    def __init__(self, directory, pattern='__nunja_%s.cache'):
+        try:
+            makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        super(NunjaBytecodeCache, self).__init__(directory, pattern)
+
+    def get_cache_key(self, name, filename=None):
+        """
+        Return the key for the mold_id path `name` which resolved to the
+        given filename.
+        """
+
+        key = sha1(name.encode('utf-8'))
+        if filename is not None:
+            key.update(('|' + filename).encode('utf-8'))
+        return key.hexdigest()
+
+    def load_bytecode(self, bucket):
+        try:
+            with open(self._get_cache_filename(bucket), 'rb') as f:
+                bucket.load_bytecode(f)
+        except (IOError, OSError):
+            return
+        except Exception:
+            # A partially written or otherwise corrupted entry.
+            logger.debug('discarding unreadable bytecode for %s', bucket.key)
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        try:
+            atomic_write(filename, bucket.bytecode_to_string())
+        except Exception:
+            logger.warning(
+                'failed to write bytecode for %s to %s', bucket.key, filename)
+
+
+class SourceCache(object):
+    """
+    A least recently used cache of template sources, bounded by the
+    total size in bytes of the files the sources were read from.
+
+    Entries are keyed by the path, and are only returned if the
+    modification time and size provided for the lookup match the ones
+    recorded when the source was put into the cache.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SOURCE_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+        }
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, path, mtime, size):
+        """
+        Return the cached source for the path if it was cached with the
+        same mtime and size, otherwise None.
+        """
+
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[:2] != (mtime, size):
+                self.stats['misses'] += 1
+                return None
+            # mark as most recently used
+            del self.entries[path]
+            self.entries[path] = entry
+            self.stats['hits'] += 1
+            return entry[2]
+
+    def put(self, path, mtime, size, source):
+        """
+        Cache the source read from path, evicting the least recently
+        used entries until everything fits.  A source larger than the
+        whole cache is not cached.
+        """
+
+        with self._lock:
+            self._discard(path)
+            if size > self.max_bytes:
+                return
+            self.entries[path] = (mtime, size, source)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self.entries)))
+                self.stats['evictions'] += 1
+
+    def _discard(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def invalidate(self, path=None):
+        """
+        Drop the entry for path, or all entries if no path is provided.
+        """
+
+        with self._lock:
+            if path is None:
+                self.entries.clear()
+                self.size = 0
+            else:
+                self._discard(path)
@@ -1,6 +1,38 @@
+from os import environ
+
 from .registry import create_default_registry
 from .engine import Engine
+from .cache import NunjaBytecodeCache
+from .utils import LazyProxy
+
+BYTECODE_CACHE_ENV = 'REPODONO_NUNJA_BYTECODE_CACHE'
+
+
+def create_default_bytecode_cache():
+    """
+    Create the bytecode cache for the default engine, if a directory was
+    specified through the environment variable.
+    """
+
+    directory = environ.get(BYTECODE_CACHE_ENV)
+    if directory:
+        return NunjaBytecodeCache(directory)
+    return None
+
+
+def create_default_engine():
+    """
+    Create the default engine, with a default registry that has all the
+    entry points registered.
+    """
+
+    engine = Engine(
+        create_default_registry(__name__),
+        bytecode_cache=create_default_bytecode_cache(),
+    )
+    engine.registry.init_entrypoints()
+    return engine
 
 
-engine = Engine(create_default_registry(__name__))
-engine.registry.init_entrypoints()
+# The default engine will only be created upon first use.
+engine = LazyProxy(create_default_engine)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Discovery of the entry points that provide molds.
+
+The entry points are read through ``importlib.metadata`` where it is
+available, falling back to ``pkg_resources`` otherwise.  As reading the
+metadata of every installed distribution can be costly, the results may
+be kept in an index file, which is keyed on the modification times of
+the metadata of all the distributions found on ``sys.path`` so that it
+is discarded whenever anything gets installed, upgraded or removed.
+"""
+
+import json
+import sys
+from hashlib import sha1
+from os import listdir
+from os.path import getmtime
+from os.path import isdir
+from os.path import join
+from logging import getLogger
+
+from .utils import atomic_write
+
+logger = getLogger(__name__)
+
+METADATA_DIR_EXTS = ('.dist-info', '.egg-info')
+ENTRY_POINTS_TXT = 'entry_points.txt'
+
+
+class EntryPoint(object):
+    """
+    A minimal entry point, with the attributes that the registry make
+    use of from the ones provided by ``pkg_resources``.
+    """
+
+    def __init__(self, name, module_name, attrs=()):
+        self.name = name
+        self.module_name = module_name
+        self.attrs = tuple(attrs)
+
+    @classmethod
+    def parse(cls, name, value):
+        """
+        Create an entry point from its name and its value, in the form
+        of ``module.name:attr.subattr [extras]``.
+        """
+
+        value = value.split('[', 1)[0].strip()
+        module_name, _, attrs = value.partition(':')
+        return cls(
+            name.strip(), module_name.strip(),
+            tuple(a.strip() for a in attrs.split('.') if a.strip()),
+        )
+
+    @property
+    def value(self):
+        if self.attrs:
+            return self.module_name + ':' + '.'.join(self.attrs)
+        return self.module_name
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, EntryPoint) and
+            (self.name, self.value) == (other.name, other.value)
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, self.value))
+
+    def __repr__(self):
+        return 'EntryPoint(%r = %r)' % (self.name, self.value)
+
+
+def _iter_importlib_metadata(entry_points, group):
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=group)
+    else:  # pragma: no cover
+        eps = eps.get(group, ())
+
+    for ep in eps:
+        yield EntryPoint.parse(ep.name, ep.value)
+
+
+def _iter_pkg_resources(group):  # pragma: no cover
+    from pkg_resources import iter_entry_points
+    for ep in iter_entry_points(group):
+        yield EntryPoint(ep.name, ep.module_name, ep.attrs)
+
+
+def iter_entry_points(group):
+    """
+    Iterate through all the entry points for the group.
+    """
+
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # pragma: no cover
+        try:
+            from importlib_metadata import entry_points
+        except ImportError:
+            return _iter_pkg_resources(group)
+    return _iter_importlib_metadata(entry_points, group)
+
+
+def metadata_key(paths=None):
+    """
+    Return a key derived from the modification times of the metadata
+    of all distributions found on the paths, default to ``sys.path``.
+    """
+
+    if paths is None:
+        paths = sys.path
+
+    key = sha1()
+    for path in paths:
+        key.update(repr(path).encode('utf-8'))
+        if not isdir(path):
+            continue
+        try:
+            names = sorted(listdir(path))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith(METADATA_DIR_EXTS):
+                continue
+            metadata = join(path, name)
+            for target in (metadata, join(metadata, ENTRY_POINTS_TXT)):
+                try:
+                    mtime = getmtime(target)
+                except OSError:
+                    mtime = None
+                key.update(repr((target, mtime)).encode('utf-8'))
+    return key.hexdigest()
+
+
+def _read_index(index_file):
+    try:
+        with open(index_file) as fd:
+            index = json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+    # anything that is not in the expected form is treated as stale.
+    if not isinstance(index, dict) or not isinstance(
+            index.get('groups', {}), dict):
+        return {}
+    return index
+
+
+def _write_index(index_file, index):
+    try:
+        atomic_write(index_file, json.dumps(
+            index, indent=2, sort_keys=True).encode('utf-8'))
+    except (IOError, OSError) as e:
+        logger.warning(
+            'cannot write entry point index %s: %s', index_file, e)
+
+
+def load_entry_points(group, index_file=None):
+    """
+    Return a dict of entry point names to the entry points for group.
+
+    If an index_file is provided, the entry points recorded in it will
+    be returned if it is still valid for the installed distributions,
+    otherwise it will be (re)written with freshly discovered ones.
+    """
+
+    if index_file is None:
+        return dict((ep.name, ep) for ep in iter_entry_points(group))
+
+    key = metadata_key()
+    index = _read_index(index_file)
+    if index.get('key') == key and isinstance(
+            index.get('groups', {}).get(group), dict):
+        return dict(
+            (name, EntryPoint.parse(name, value))
+            for name, value in index['groups'][group].items()
+        )
+
+    logger.debug('rebuilding entry point index %s', index_file)
+    results = dict((ep.name, ep) for ep in iter_entry_points(group))
+    groups = index.get('groups', {}) if index.get('key') == key else {}
+    groups[group] = dict(
+        (name, ep.value) for name, ep in results.items())
+    _write_index(index_file, {'key': key, 'groups': groups})
+    return results
@@ -1,13 +1,54 @@
 # -*- coding: utf-8 -*-
+import weakref
+from logging import getLogger
 from os.path import join
+from threading import Lock
+from timeit import default_timer
 
 from jinja2 import Environment
+from jinja2 import ModuleLoader
+from jinja2 import TemplateNotFound
 
 from repodono.nunja.registry import registry as default_registry
 from repodono.nunja.registry import REQ_TMPL_NAME
 from repodono.nunja.registry import DEFAULT_WRAPPER_NAME
+from repodono.nunja.loader import FUSED_PREFIX
+from repodono.nunja.loader import FusedLoader
 from repodono.nunja.loader import NunjaLoader
 
+DEFAULT_BUFFER_SIZE = 8192
+
+logger = getLogger(__name__)
+
+
+def buffer_stream(chunks, buffer_size=DEFAULT_BUFFER_SIZE, encoding=None):
+    """
+    Regroup the chunks of text into chunks that are at least as long as
+    the buffer_size (except the last one), encoded with the encoding if
+    one is provided.  A falsy buffer_size yields every non-empty chunk
+    as is.
+    """
+
+    empty = b'' if encoding else u''
+    buf = []
+    size = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if encoding:
+            chunk = chunk.encode(encoding)
+        if not buffer_size:
+            yield chunk
+            continue
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            yield empty.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield empty.join(buf)
+
 
 class Engine(object):
     """
@@ -17,10 +58,19 @@ class Engine(object):
     rendering of templates through nunja identifiers.
     """
 
+    # additional keyword arguments for the environment to be created.
+    environment_options = {}
+
     def __init__(
             self,
             registry=default_registry,
             env=None,
+            frozen=False,
+            bytecode_cache=None,
+            fuse=None,
+            watcher=None,
+            loader=None,
+            compiled_path=None,
             _wrapper_name=DEFAULT_WRAPPER_NAME,
             _required_template_name=REQ_TMPL_NAME,
             ):
@@ -31,16 +81,90 @@ class Engine(object):
         It is possible to initialize using other arguments, but this is
         unsupported by the main system, and only useful for certain
         specialized implementations.
+
+        If ``frozen`` is set, templates for molds are cached by the
+        engine after the first load and never checked against the
+        filesystem again, which is the mode intended for production.
+        Otherwise the cached templates are revalidated on every use.
+
+        A jinja2 ``bytecode_cache`` may be provided for the environment
+        that will be created, such as the ``NunjaBytecodeCache`` which
+        persists the compiled templates across processes.
+
+        If ``fuse`` is enabled, which is the default when ``frozen`` is
+        set, the loader is wrapped by the ``FusedLoader``, such that
+        every mold template is rendered through a fused template that
+        has its source spliced into the source of the wrapper, rather
+        than having the wrapper dynamically include it.  As the errors
+        raised from within a fused template are reported against its
+        name and lines, it is not used by default during development.
+
+        A ``watcher`` (see ``repodono.nunja.watcher``) may be provided
+        for the loader, such that templates are invalidated by the
+        changes it detects rather than by checking the filesystem on
+        every use.  Starting and stopping it is up to the caller.
+
+        A jinja2 ``loader`` may be provided to be used in place of the
+        ``NunjaLoader`` for the registry, such as the ``ArchiveLoader``
+        for a packed mold archive.
+
+        If ``compiled_path`` is provided, templates will be loaded from
+        the Python modules that were compiled into that directory (or
+        zip file) by ``repodono.nunja.precompile.compile_molds``, rather
+        than being compiled from the sources.  As the sources are not
+        available, the molds will not be fused with the wrapper.  Nor
+        will they be if an ``env`` is provided, unless its loader is a
+        ``FusedLoader``.
         """
 
         self.registry = registry
+        self.frozen = frozen
+        if fuse is None:
+            fuse = frozen
+        self.fuse = fuse
+        if loader is None and compiled_path is not None:
+            loader = ModuleLoader(compiled_path)
+        if loader is None:
+            loader = NunjaLoader(registry, watcher=watcher)
+        if fuse and loader.has_source_access:
+            loader = FusedLoader(
+                loader, join(_wrapper_name, _required_template_name))
         self.env = env if env else Environment(
             autoescape=True,
-            loader=NunjaLoader(registry)
+            auto_reload=not frozen,
+            bytecode_cache=bytecode_cache,
+            loader=loader,
+            **self.environment_options
         )
         self._required_template_name = _required_template_name
+        self._wrapper_name = _wrapper_name
+        self._mold_cache = {}
+        self._mold_cache_stats = {
+            'hits': 0,
+            'misses': 0,
+            'lookup_time': 0.0,
+        }
+        # the stats may be updated from multiple threads.
+        self._stats_lock = Lock()
+        # mold_id to its template and the fused template for it.
+        self._fused_cache = {}
 
         self._core_template_ = self.load_mold(_wrapper_name)
+        self._add_invalidation_hook()
+
+    def _add_invalidation_hook(self):
+        # the registry must not keep the engine alive.
+        hooks = self.registry.invalidation_hooks
+        ref = weakref.ref(self)
+
+        def hook(mold_id):
+            engine = ref()
+            if engine is None:
+                hooks.remove(hook)
+            else:
+                engine.invalidate(mold_id)
+
+        hooks.append(hook)
 
     def lookup_path(self, name):
         """
@@ -64,6 +188,82 @@ class Engine(object):
 
         return self.load_template(join(mold_id, self._required_template_name))
 
+    def get_mold(self, mold_id):
+        """
+        Return the default template for the mold `mold_id` from the
+        engine's cache, loading it through ``load_mold`` if it is not
+        cached or, when not frozen, if the cached one is outdated.
+        """
+
+        stats = self._mold_cache_stats
+        start = default_timer()
+        template = self._mold_cache.get(mold_id)
+        hit = template is not None and (
+            self.frozen or template.is_up_to_date)
+        if not hit:
+            template = self._mold_cache[mold_id] = self.load_mold(mold_id)
+        with self._stats_lock:
+            stats['hits' if hit else 'misses'] += 1
+            stats['lookup_time'] += default_timer() - start
+        return template
+
+    def clear_cache(self):
+        """
+        Drop all cached templates, including the ones held by the
+        environment, such that the next use will load from the source.
+        """
+
+        self._mold_cache.clear()
+        self._fused_cache.clear()
+        if self.env.cache is not None:
+            self.env.cache.clear()
+        source_cache = getattr(self.env.loader, 'source_cache', None)
+        if source_cache is not None:
+            source_cache.invalidate()
+
+    def invalidate(self, mold_id=None):
+        """
+        Drop the cached templates for the mold_id, including the ones
+        held by the environment, or all of them if no mold_id is
+        provided or if it is the wrapper.  This is called whenever the
+        registry invalidates a mold, even if the engine is frozen.
+        """
+
+        if mold_id is None or mold_id == self._wrapper_name:
+            self.clear_cache()
+            try:
+                self._core_template_ = self.load_mold(self._wrapper_name)
+            except Exception:
+                logger.exception('failed to reload the wrapper template')
+            return
+
+        self._mold_cache.pop(mold_id, None)
+        self._fused_cache.pop(mold_id, None)
+        cache = self.env.cache
+        if cache is None:
+            return
+        prefixes = (mold_id + '/', FUSED_PREFIX + mold_id + '/')
+        for key in list(cache.keys()):
+            if key[1].startswith(prefixes):
+                try:
+                    del cache[key]
+                except KeyError:
+                    pass
+
+    def cache_stats(self):
+        """
+        Return a dict with the hit and miss counts of the mold cache,
+        along with the hit rate and the total time spent on lookups.
+        """
+
+        stats = dict(self._mold_cache_stats)
+        total = stats['hits'] + stats['misses']
+        stats['size'] = len(self._mold_cache)
+        stats['hit_rate'] = float(stats['hits']) / total if total else 0.0
+        stats['mean_lookup_time'] = (
+            stats['lookup_time'] / total if total else 0.0)
+        return stats
+
     def execute(self, mold_id, data, wrapper_tag='div'):
         """
         Execute a mold `mold_id` by rendering through ``env``.
@@ -74,12 +274,89 @@ class Engine(object):
         This returns the wrapped content.
         """
 
-        template = self.load_mold(mold_id)
+        template = self.get_mold(mold_id)
+        kwargs = self._execute_kwargs(mold_id, template, data, wrapper_tag)
+        return self.get_fused(mold_id, template, wrapper_tag).render(**kwargs)
+
+    def execute_stream(
+            self, mold_id, data, wrapper_tag='div',
+            buffer_size=DEFAULT_BUFFER_SIZE, encoding=None):
+        """
+        Execute a mold `mold_id` like ``execute``, but return an iterator
+        that produces the wrapped content in chunks of at least
+        buffer_size as it is being rendered, such that the complete
+        document is never held in memory.
+
+        The chunks will be text, unless an encoding (such as 'utf-8') is
+        specified, in which case they will be encoded bytes.
+
+        The template is resolved before this returns, so a missing mold
+        will be raised here rather than during the iteration.
+        """
+
+        template = self.get_mold(mold_id)
+        kwargs = self._execute_kwargs(mold_id, template, data, wrapper_tag)
+        return buffer_stream(
+            self.get_fused(mold_id, template, wrapper_tag).generate(**kwargs),
+            buffer_size, encoding)
+
+    def execute_many(self, mold_id, iterable, wrapper_tag='div'):
+        """
+        Execute a mold `mold_id` once for every dict of data provided by
+        the iterable, returning an iterator of the wrapped contents in
+        the same order.
+
+        The template and the mold specific arguments are only resolved
+        once, before this returns.
+        """
 
+        template = self.get_mold(mold_id)
+        base = self._execute_kwargs(mold_id, template, {}, wrapper_tag)
+        render = self.get_fused(mold_id, template, wrapper_tag).render
+
+        def execute_all():
+            for data in iterable:
+                kwargs = dict(data)
+                kwargs.update(base)
+                yield render(kwargs)
+
+        return execute_all()
+
+    def get_fused(self, mold_id, template, wrapper_tag):
+        """
+        Return the template that will render the mold `mold_id`, whose
+        template is the one provided, wrapped by the wrapper_tag.
+
+        This is the fused template for the mold, which is the same for
+        all wrapper tags and is kept for as long as the mold template
+        is the same, or the wrapper template if fusing is disabled or
+        not possible.
+        """
+
+        if not self.fuse or not isinstance(self.env.loader, FusedLoader):
+            return self._core_template_
+
+        cached = self._fused_cache.get(mold_id)
+        if cached is None or cached[0] is not template:
+            cached = self._fused_cache[mold_id] = (
+                template, self.load_fused(template))
+        return cached[1] or self._core_template_
+
+    def load_fused(self, template):
+        """
+        Load the fused template for the mold template through the
+        environment, or return None if it cannot be fused.
+        """
+
+        try:
+            return self.env.get_template(FUSED_PREFIX + template.name)
+        except TemplateNotFound:
+            return None
+
+    def _execute_kwargs(self, mold_id, template, data, wrapper_tag):
         kwargs = {}
         kwargs.update(data)
         kwargs['_nunja_data_'] = 'data-nunja="%s"' % mold_id
         kwargs['_template_'] = template
         kwargs['_wrapper_tag_'] = wrapper_tag
-
-        return self._core_template_.render(**kwargs)
+        return kwargs
@@ -7,3 +7,31 @@ except ImportError:
 
 class TemplateNotFoundError(FileNotFoundError):
     pass
+
+
+class RenderError(Exception):
+    """
+    Failure to render one or more jobs, with the details of the first
+    one (by position) that failed.
+    """
+
+    def __init__(self, index, mold_id, message, failures=()):
+        super(RenderError, self).__init__(
+            'job %d (mold_id %s) failed: %s' % (index, mold_id, message))
+        self.index = index
+        self.mold_id = mold_id
+        self.message = message
+        self.failures = list(failures)
+
+
+class ArchiveError(ValueError):
+    """
+    A mold archive that is malformed, or has an entry that failed its
+    integrity check.
+    """
+
+
+class NodeWorkerError(RuntimeError):
+    """
+    A request to the node worker that failed, or the worker went away.
+    """
@@ -1,5 +1,21 @@
 # -*- coding: utf-8 -*-
+import json
+import posixpath
+from hashlib import sha256
+from os import makedirs
+from os.path import basename
+from os.path import dirname
+from os.path import exists
+from os.path import isdir
+from os.path import join
+from os.path import sep
+
 from repodono.nunja.registry import registry
+from repodono.nunja.resources import read_bytes
+from repodono.nunja.utils import atomic_write
+
+FINGERPRINT_LENGTH = 16
+MANIFEST_NAME = 'manifest.json'
 
 umd_requirejs_tmpl = """\
 (function() {
@@ -36,3 +52,101 @@ def export_umd_requirejs():
 
 def export_umd_generic_json(json):
     return (umd_requirejs_tmpl % json)
+
+
+def fingerprint(contents):
+    """
+    Return the fingerprint for the contents.
+    """
+
+    return sha256(contents).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def fingerprinted_name(name, contents):
+    """
+    Return the name with the fingerprint of the contents inserted in
+    front of its extension, e.g. ``template.<fingerprint>.jinja``.
+    """
+
+    root, ext = posixpath.splitext(name)
+    return '%s.%s%s' % (root, fingerprint(contents), ext)
+
+
+def _write(target, name, contents):
+    path = join(target, *name.split('/'))
+    if exists(path):
+        # the name is derived from the contents, so it is identical.
+        return
+    if not isdir(dirname(path)):
+        makedirs(dirname(path))
+    atomic_write(path, contents)
+
+
+def _is_module(name):
+    return name.endswith('.js')
+
+
+def export_fingerprinted(target, base_url='', bundles=None,
+                         registry=registry):
+    """
+    Export every template of the molds in the registry along with the
+    bundles (a dict of module names to paths of their files) into the
+    target directory under fingerprinted names, such that they may be
+    served with far future cache headers.
+
+    The JavaScript modules within the molds (such as the
+    ``<mold_id>/index`` module that is required for every mold) are
+    exported in the same way.
+
+    The requirejs configuration and the template map exports are also
+    written out with fingerprinted names, with the former having a
+    path for every template, module and bundle (prefixed with
+    base_url), which the text plugin will resolve
+    ``text!<mold_id>/template.jinja`` to
+    ``<mold_id>/template.<fingerprint>.jinja``.
+
+    Finally, a manifest of the original names to the fingerprinted
+    names is written to the target, which is also returned as a dict.
+    """
+
+    prefix = base_url.rstrip('/') + '/' if base_url else ''
+    files = {}
+    paths = {}
+
+    def export(name, contents, module_name=None):
+        exported = fingerprinted_name(name, contents)
+        _write(target, exported, contents)
+        files[name] = exported
+        if module_name:
+            paths[module_name] = prefix + posixpath.splitext(exported)[0]
+
+    template_paths_json = registry.export_jinja_template_paths()
+    template_map = json.loads(template_paths_json)['template_map']
+    module_map = json.loads(registry.export_jinja_template_paths(
+        match_func=_is_module))['template_map']
+    for path_map in (template_map, module_map):
+        for mold_id in sorted(path_map):
+            root = registry.mold_id_to_path(mold_id)
+            for name in path_map[mold_id]:
+                contents = read_bytes(join(root, name))
+                name = mold_id + '/' + name.replace(sep, '/')
+                export(name, contents, posixpath.splitext(name)[0])
+
+    for module_name, path in sorted((bundles or {}).items()):
+        with open(path, 'rb') as fd:
+            export(basename(path), fd.read(), module_name)
+
+    requirejs_config = {'paths': paths}
+    export('nunja.generated.js', export_umd_generic_json(
+        json.dumps(requirejs_config, sort_keys=True)).encode('utf-8'))
+    export('nunja_id.exported.js', export_umd_generic_json(
+        template_paths_json).encode('utf-8'))
+
+    manifest = {
+        'base_url': base_url,
+        'files': files,
+        'requirejs': requirejs_config,
+    }
+    atomic_write(join(target, MANIFEST_NAME), json.dumps(
+        manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
@@ -27,16 +27,26 @@ import codecs
 import json
 import logging
 import shutil
+from hashlib import sha256
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from os import makedirs
+from os import remove
+from os import stat
+from os import walk
+from os.path import dirname
 from os.path import join
 from os.path import exists
 from os.path import isfile
 from os.path import isdir
-from subprocess import call
-from subprocess import Popen
-from subprocess import PIPE
+from os.path import relpath
+from os.path import sep
+from time import sleep
+from timeit import default_timer
 
+from repodono.nunja.nodeworker import default_worker
 from repodono.nunja.registry import registry
+from repodono.nunja.resources import read_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -170,21 +180,118 @@ def _opener(*a):
     return codecs.open(*a, encoding='utf-8')
 
 
+def _hash_file(path):
+    h = sha256()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _iter_files(root):
+    for r, d, files in walk(root):
+        for name in files:
+            yield join(r, name)
+
+
 class Toolchain(object):
     """
     For shared methods between all toolchains.
     """
 
-    def __init__(self):
+    # name of the file in the cache_dir that record the state of the
+    # previous build.
+    build_state_name = 'build_state.json'
+
+    def __init__(self, cache_dir=None, workers=None, worker=None):
+        """
+        If a cache_dir is provided, the build directory will be kept
+        there across builds along with the content hashes of the files
+        that were staged into it, such that only the sources that have
+        changed since the previous build get compiled or copied again,
+        and linking is skipped entirely if nothing has changed.
+
+        The sources are compiled and copied into the build directory by
+        a pool of threads, with the number of workers defaulting to the
+        number of CPUs; 1 will do everything in the calling thread.
+
+        The steps that require node are sent to the NodeWorker provided
+        as worker, default to the one shared by all toolchains, such
+        that node is only started once for any number of builds.
+        """
+
         self.build_dir = None
         self.bundle_export_path = None
         self.build_manifest_name = 'build.js'
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.worker = worker
+        self.build_state = {}
+        # the time spent on each phase of the most recent build.
+        self.timings = {}
+        self._staged = set()
+
+    def node_worker(self):
+        """
+        Return the NodeWorker for this toolchain.
+        """
+
+        return self.worker or default_worker()
 
     def compile(self, source, target):
         logger.info('Compiling %s to %s', source, target)
         with _opener(source, 'r') as reader, _opener(target, 'w') as writer:
             self.transpiler(reader, writer)
 
+    def copy(self, source, target):
+        logger.debug('Copying %s to %s', source, target)
+        shutil.copy(source, target)
+
+    def stage(self, source, target, func):
+        """
+        Produce the target in the build_dir from source using func,
+        unless the previous build already produced it from a source
+        with identical content.
+        """
+
+        key = relpath(target, self.build_dir)
+        digest = _hash_file(source)
+        staged = self.build_state.setdefault('staged', {})
+        self._staged.add(key)
+        if staged.get(key) == digest and exists(target):
+            logger.debug('%s unchanged; skipped', source)
+            return
+        if not isdir(dirname(target)):
+            try:
+                makedirs(dirname(target))
+            except OSError:
+                # another worker may have just created it.
+                if not isdir(dirname(target)):
+                    raise
+        func(source, target)
+        staged[key] = digest
+
+    def stage_all(self, tasks):
+        """
+        Stage all the (source, target, func) tasks through the pool of
+        workers.
+        """
+
+        self.build_state.setdefault('staged', {})
+        workers = self.workers or cpu_count()
+        if workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                self.stage(*task)
+            return
+
+        pool = ThreadPool(min(workers, len(tasks)))
+        try:
+            # map re-raises the first failure in the order of the tasks
+            pool.map(lambda task: self.stage(*task), tasks)
+        finally:
+            pool.close()
+            pool.join()
+
     def _gen_req_src_targets(self, d):
         # name = pythonic module name
         # reqold = the commonjs require format to the source
@@ -202,21 +309,37 @@ class Toolchain(object):
         compiled_paths = {}
         bundled_paths = {}
         module_names = []
+        tasks = []
+        self._staged = set()
 
         for reqold, name, reqnew, source, target in self._gen_req_src_targets(
                 self.transpile_source_map):
             compiled_paths[name] = reqnew
             module_names.append(name)
-            self.compile(source, join(self.build_dir, target))
+            tasks.append((source, join(self.build_dir, target), self.compile))
 
         for reqold, name, reqnew, source, target in self._gen_req_src_targets(
                 self.bundled_source_map):
             bundled_paths[name] = reqnew
             if isfile(source):
                 module_names.append(name)
-                shutil.copy(source, join(self.build_dir, target))
+                tasks.append((source, join(self.build_dir, target), self.copy))
             elif isdir(reqold):
-                shutil.copytree(reqold, join(self.build_dir, reqnew))
+                for path in _iter_files(reqold):
+                    tasks.append((path, join(
+                        self.build_dir, reqnew, relpath(path, reqold)),
+                        self.copy))
+
+        self.stage_all(tasks)
+
+        # remove what the previous build staged but no longer exists.
+        staged = self.build_state.setdefault('staged', {})
+        for key in set(staged) - self._staged:
+            del staged[key]
+            try:
+                remove(join(self.build_dir, key))
+            except OSError:
+                pass
 
         # return compiled targets for assembly
         return compiled_paths, bundled_paths, module_names
@@ -246,16 +369,86 @@ class Toolchain(object):
 
         pass
 
+    def finalize_key(self):
+        """
+        Return a string that identifies the inputs to finalize that are
+        not staged into the build_dir, for the link_key.
+        """
+
+        return ''
+
+    def link_key(self, manifest_path):
+        """
+        Return the hash of the manifest along with everything that was
+        staged for it, and the finalize_key.
+        """
+
+        h = sha256()
+        h.update(_hash_file(manifest_path).encode('ascii'))
+        h.update(json.dumps(
+            self.build_state.get('staged', {}), sort_keys=True
+        ).encode('utf-8'))
+        h.update(self.finalize_key().encode('utf-8'))
+        return h.hexdigest()
+
     def _calf(self):
         """
         The main call, assuming everything is prepared.
         """
 
+        timings = self.timings = {}
+
+        start = default_timer()
         compiled_paths, bundled_paths, module_names = self.compile_all()
+        timings['compile'] = default_timer() - start
+
+        start = default_timer()
         manifest_path = self.assemble(
             compiled_paths, bundled_paths, module_names)
+        timings['assemble'] = default_timer() - start
+
+        link_key = None
+        if self.cache_dir is not None:
+            link_key = self.link_key(manifest_path)
+            if (self.build_state.get('link') == link_key and
+                    exists(self.bundle_export_path)):
+                logger.info(
+                    '%s is up to date; link skipped', self.bundle_export_path)
+                timings['link'] = timings['finalize'] = 0.0
+                return
+            # in case link or finalize fails.
+            self.build_state.pop('link', None)
+
+        start = default_timer()
         self.link(manifest_path)
+        timings['link'] = default_timer() - start
+
+        start = default_timer()
         self.finalize()
+        timings['finalize'] = default_timer() - start
+
+        if link_key is not None:
+            self.build_state['link'] = link_key
+        logger.info(
+            'built %s; compile %.3fs, assemble %.3fs, link %.3fs, '
+            'finalize %.3fs', self.bundle_export_path, timings['compile'],
+            timings['assemble'], timings['link'], timings['finalize'],
+        )
+
+    def _load_build_state(self):
+        try:
+            with open(join(self.cache_dir, self.build_state_name)) as fd:
+                state = json.load(fd)
+        except (IOError, OSError, ValueError):
+            state = {}
+        if state.get('bundle_export_path') != self.bundle_export_path:
+            state.pop('link', None)
+        state['bundle_export_path'] = self.bundle_export_path
+        self.build_state = state
+
+    def _save_build_state(self):
+        with open(join(self.cache_dir, self.build_state_name), 'w') as fd:
+            json.dump(self.build_state, fd, indent=2, sort_keys=True)
 
     def calf(self, filename):
         """
@@ -267,14 +460,83 @@ class Toolchain(object):
 
         self.bundle_export_path = filename
 
+        if self.cache_dir is not None:
+            self.build_dir = join(self.cache_dir, 'build')
+            if not isdir(self.build_dir):
+                makedirs(self.build_dir)
+            self._load_build_state()
+            try:
+                self._calf()
+            finally:
+                self._save_build_state()
+            return
+
         try:
             tempdir = tempfile.mkdtemp()
             self.build_dir = join(tempdir, 'build')
             makedirs(self.build_dir)
+            self.build_state = {}
             self._calf()
         finally:
             shutil.rmtree(tempdir)
 
+    def watch_paths(self):
+        """
+        Return the paths to the sources that the build depend on.
+        """
+
+        paths = []
+        for reqold, name, reqnew, source, target in self._gen_req_src_targets(
+                self.transpile_source_map):
+            paths.append(source)
+        for reqold, name, reqnew, source, target in self._gen_req_src_targets(
+                self.bundled_source_map):
+            paths.append(source if isfile(source) else reqold)
+        return paths
+
+    def snapshot(self):
+        """
+        Return the modification times and sizes of all files found at
+        the watch_paths.
+        """
+
+        results = {}
+        for path in self.watch_paths():
+            files = _iter_files(path) if isdir(path) else [path]
+            for name in files:
+                try:
+                    st = stat(name)
+                except OSError:
+                    continue
+                results[name] = (st.st_mtime, st.st_size)
+        return results
+
+    def watch(self, filename, interval=1.0, iterations=None):
+        """
+        Build to filename, then build again whenever any of the files at
+        the watch_paths changed, checking every interval seconds, for
+        the number of iterations (default is to never stop).  Requires
+        a cache_dir so that only what was changed gets rebuilt.
+        """
+
+        if self.cache_dir is None:
+            raise ValueError('watch mode requires a cache_dir')
+
+        previous = None
+        count = 0
+        while iterations is None or count < iterations:
+            if count:
+                sleep(interval)
+            count += 1
+            current = self.snapshot()
+            if current == previous:
+                continue
+            previous = current
+            try:
+                self.calf(filename)
+            except Exception:
+                logger.exception('failed to build %s', filename)
+
     def __call__(self, target):
         """
         Alias, also make this callable directly.
@@ -288,10 +550,10 @@ class RJSToolchain(Toolchain):
     The toolchain that make use of r.js (from require.js).
     """
 
-    def __init__(self):
-        super(RJSToolchain, self).__init__()
+    def __init__(self, cache_dir=None, workers=None, worker=None):
+        super(RJSToolchain, self).__init__(
+            cache_dir=cache_dir, workers=workers, worker=worker)
         self.transpiler = _transpile_generic_to_umd_compat_rjs
-        self.rjs = join('.', 'node_modules', 'requirejs', 'bin', 'r.js')
 
     def assemble(self, compiled_paths, bundled_paths, module_names):
         """
@@ -340,7 +602,8 @@ class RJSToolchain(Toolchain):
         linking everything into "binary" file.
         """
 
-        call([self.rjs, '-o', manifest_path])
+        logger.info(self.node_worker().request(
+            'optimize', manifest=manifest_path))
 
 
 class NunjaRJSToolchain(RJSToolchain):
@@ -348,8 +611,12 @@ class NunjaRJSToolchain(RJSToolchain):
     Nunja specific toolchain.
     """
 
-    def __init__(self):
-        super(NunjaRJSToolchain, self).__init__()
+    def __init__(
+            self, registry=registry, cache_dir=None, workers=None,
+            worker=None):
+        super(NunjaRJSToolchain, self).__init__(
+            cache_dir=cache_dir, workers=workers, worker=worker)
+        self.registry = registry
 
         # XXX autogenerate this
         self.transpile_source_map = {
@@ -370,36 +637,43 @@ class NunjaRJSToolchain(RJSToolchain):
             'nunjucks': { 'exports': 'nunjucks' },
         }
 
-    def finalize(self):
-        # XXX this all could be done using the optimizer as node module
-        # and thus this following script could be run from within a
-        # customized link() definition to this class.
-
-        script = """
-        var nunjucks = require('nunjucks');
-        var requirejs = require('requirejs');
-        var config = require('%s');
-
-        requirejs.config(config);
-        requirejs.define('nunjucks', [], nunjucks);
-
-        var core = requirejs('repodono.nunja.core');
-        var tmpl = core.engine.env.getTemplate(
-            '_core_/_default_wrapper_/template.jinja');
-        var result = nunjucks.precompileString(tmpl.tmplStr, {
-            env: core.engine.env,
-            name: tmpl.path,
-        })
-        process.stdout.write(result);
-        """
-        
-        compiled_script = script % (
-            join(self.build_dir, 'config.js'),
-        )
+    def mold_templates(self):
+        """
+        Return a list of the name and source of every template of all
+        the molds in the registry, sorted by name.
+        """
 
-        # pass this into node
+        template_map = json.loads(
+            self.registry.export_jinja_template_paths())['template_map']
+        results = []
+        for mold_id, names in template_map.items():
+            path = self.registry.mold_id_to_path(mold_id)
+            for name in names:
+                results.append((
+                    mold_id + '/' + name.replace(sep, '/'),
+                    read_bytes(join(path, name)).decode('utf-8'),
+                ))
+        return sorted(results)
+
+    def finalize_key(self):
+        return json.dumps(self.mold_templates())
+
+    def watch_paths(self):
+        paths = super(NunjaRJSToolchain, self).watch_paths()
+        self.registry.init_lazy_entrypoints()
+        paths.extend(sorted(set(self.registry.molds.values())))
+        return paths
 
-        nodejs = Popen(['node'], stdin=PIPE, stdout=PIPE)
-        stdout, stderr = nodejs.communicate(compiled_script)
-        with open(self.bundle_export_path, 'a') as fd:
-            fd.write(stdout)
+    def finalize(self):
+        # Precompile every template of all registered molds into the
+        # bundle through the node worker, such that the client side
+        # loader will not need to fetch and compile them on page load.
+        results = self.node_worker().request(
+            'precompile',
+            config=join(self.build_dir, 'config.js'),
+            templates=self.mold_templates(),
+        )
+        with _opener(self.bundle_export_path, 'a') as fd:
+            for result in results:
+                fd.write(result)
+                fd.write('\n')
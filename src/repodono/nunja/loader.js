@@ -13,8 +13,28 @@ var RequireJSLoader = function(registry, async) {
     this.noCache = true;
 };
 
+// Templates precompiled into the bundle by the toolchain.
+var precompiled = function() {
+    return (typeof window !== 'undefined' && window.nunjucksPrecompiled) ||
+        {};
+};
+
 RequireJSLoader.prototype.getSource = function(name, callback) {
     var self = this;
+    var compiled = precompiled()[name];
+
+    if (compiled) {
+        var result = {
+            'src': {'type': 'code', 'obj': compiled},
+            'path': name,
+        };
+        if (this.async) {
+            callback(null, result);
+            return;
+        }
+        return result;
+    }
+
     var template_path = self.registry.lookup_path(name);
 
     if (this.async) {
@@ -1,17 +1,27 @@
 # -*- coding: utf-8 -*-
-import codecs
-
-from os.path import getmtime
-from os.path import exists
+import json
+import re
+from os.path import sep
 
 from jinja2.loaders import BaseLoader
 from jinja2.loaders import TemplateNotFound
 
+from .cache import DEFAULT_SOURCE_CACHE_SIZE
+from .cache import SourceCache
 from .exc import FileNotFoundError
+from .resources import getmtime
+from .resources import read_bytes
+from .resources import stat
+
+# the prefix to the name of a template for its fused template.
+FUSED_PREFIX = '_nunja_fused_/'
+# the variable through which the wrapper includes the mold template.
+WRAPPER_TEMPLATE_VARIABLE = '_template_'
 
 
-def uptodate_checker(filename):
-    mtime = getmtime(filename)
+def uptodate_checker(filename, mtime=None):
+    if mtime is None:
+        mtime = getmtime(filename)
     def checker():
         try:
             return getmtime(filename) == mtime
@@ -22,8 +32,24 @@ def uptodate_checker(filename):
 
 class NunjaLoader(BaseLoader):
 
-    def __init__(self, registry):
+    def __init__(
+            self, registry, watcher=None,
+            source_cache_size=DEFAULT_SOURCE_CACHE_SIZE):
+        """
+        If a watcher is provided, it will supply the uptodate checkers
+        for the templates rather than having their modification times
+        checked on every use.
+
+        Sources read are kept in a ``SourceCache`` of up to the
+        source_cache_size in bytes, such that templates evicted from the
+        environment are not read from disk again if they are unchanged;
+        a falsy size disables this cache.
+        """
+
         self.registry = registry
+        self.watcher = watcher
+        self.source_cache = (
+            SourceCache(source_cache_size) if source_cache_size else None)
 
     def get_source(self, environment, template):
         try:
@@ -31,7 +57,130 @@ class NunjaLoader(BaseLoader):
         except FileNotFoundError:
             raise TemplateNotFound(template)
 
-        mtime = getmtime(path)
-        with codecs.open(path, encoding='utf-8') as f:
-            source = f.read()
-        return source, path, uptodate_checker(path)
+        source_cache = self.source_cache
+        try:
+            mtime, size = stat(path)
+            if self.watcher is None:
+                checker = uptodate_checker(path, mtime)
+            else:
+                checker = self.watcher.checker(path)
+            source = None
+            if source_cache is not None:
+                source = source_cache.get(path, mtime, size)
+            if source is None:
+                source = read_bytes(path).decode('utf-8')
+                if source_cache is not None:
+                    source_cache.put(path, mtime, size, source)
+        except (IOError, OSError):
+            # the file went away after the registry last checked it.
+            self.registry.stat_cache.invalidate(path)
+            if source_cache is not None:
+                source_cache.invalidate(path)
+            raise TemplateNotFound(template)
+        return source, path, checker
+
+    def list_templates(self):
+        """
+        Return the mold_id paths of all the templates of all the molds
+        in the registry.
+        """
+
+        template_map = json.loads(
+            self.registry.export_jinja_template_paths())['template_map']
+        return sorted(
+            mold_id + '/' + name.replace(sep, '/')
+            for mold_id, names in template_map.items()
+            for name in names
+        )
+
+
+def fuse_source(environment, wrapper, source):
+    """
+    Return the source of the wrapper with its include of the template
+    provided through ``_template_`` replaced by the source of the mold
+    template, scoped such that the variables set by the mold template
+    do not leak into the wrapper, or None if that cannot be done.
+
+    The source must not extend another template, and the wrapper must
+    include ``_template_`` exactly once, with the context.
+    """
+
+    if environment.trim_blocks or environment.lstrip_blocks:
+        # the whitespace around the added tags would be changed.
+        return None
+
+    start = environment.block_start_string
+    end = environment.block_end_string
+    if re.search(re.escape(start) + r'[-+]?\s*extends\b', source):
+        return None
+
+    matches = list(re.finditer(
+        re.escape(start) + r'([-+]?)\s*include\s+' +
+        WRAPPER_TEMPLATE_VARIABLE +
+        r'\b\s*(?:ignore\s+missing\b\s*)?(?:with\s+context\b\s*)?' +
+        r'([-+]?)' + re.escape(end),
+        wrapper,
+    ))
+    if len(matches) != 1 or wrapper.count(WRAPPER_TEMPLATE_VARIABLE) != 1:
+        return None
+
+    if not environment.keep_trailing_newline:
+        # as that would have been dropped from the included template.
+        for newline in ('\r\n', '\n', '\r'):
+            if source.endswith(newline):
+                source = source[:-len(newline)]
+                break
+
+    match = matches[0]
+    return ''.join((
+        wrapper[:match.start()],
+        start, match.group(1), ' with ', end,
+        source,
+        start, ' endwith ', match.group(2), end,
+        wrapper[match.end():],
+    ))
+
+
+class FusedLoader(BaseLoader):
+    """
+    Wrap a loader such that every template it provides also has a fused
+    template, named by the ``FUSED_PREFIX`` followed by its name, with
+    its source spliced into the source of the wrapper (see
+    ``fuse_source``), such that rendering it does not require the
+    wrapper to dynamically include the template.
+
+    As the fused templates are provided through the loader, they are
+    compiled, cached and checked for changes by the environment like
+    any other template, including the use of its bytecode cache.  If a
+    template cannot be fused, TemplateNotFound is raised for its fused
+    template.
+    """
+
+    def __init__(self, loader, wrapper_name):
+        self.loader = loader
+        self.wrapper_name = wrapper_name
+        self.has_source_access = loader.has_source_access
+
+    @property
+    def source_cache(self):
+        return getattr(self.loader, 'source_cache', None)
+
+    def get_source(self, environment, template):
+        if not template.startswith(FUSED_PREFIX):
+            return self.loader.get_source(environment, template)
+
+        wrapper, _, wrapper_uptodate = self.loader.get_source(
+            environment, self.wrapper_name)
+        source, filename, uptodate = self.loader.get_source(
+            environment, template[len(FUSED_PREFIX):])
+        fused = fuse_source(environment, wrapper, source)
+        if fused is None:
+            raise TemplateNotFound(template)
+
+        def checker():
+            return all(check() for check in (wrapper_uptodate, uptodate)
+                       if check is not None)
+        return fused, filename, checker
+
+    def list_templates(self):
+        return self.loader.list_templates()
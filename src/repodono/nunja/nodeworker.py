@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+A long running node process for the work done by the toolchains.
+
+Rather than starting a new node process for every step of every build,
+a worker is started once and then sent requests as line delimited json
+through its stdin, with the responses written back as json lines to
+its stdout.  Every request is an object with an ``id`` and an ``op``
+along with the parameters for that op, and every response carries the
+same ``id`` along with either the ``result`` or the ``error``.
+
+The ops supported by the worker are:
+
+ping
+    Respond with ``pong``.
+precompile
+    Precompile the ``templates``, a list of name and source pairs, using
+    the environment of the core module loaded through the requirejs
+    ``config`` (a path), returning the list of the precompiled code.
+    The environment is kept for as long as the contents of the config
+    are unchanged, and every new one is loaded through a new requirejs
+    context, such that rebuilt modules at the same paths are used.
+optimize
+    Run the requirejs optimizer (r.js) with the build ``manifest`` (a
+    path), returning its output.
+"""
+
+import atexit
+import json
+from logging import getLogger
+from subprocess import PIPE
+from subprocess import Popen
+from threading import Lock
+from threading import Thread
+from timeit import default_timer
+
+try:
+    from queue import Empty
+    from queue import Queue
+except ImportError:  # pragma: no cover
+    from Queue import Empty
+    from Queue import Queue
+
+from .exc import NodeWorkerError
+
+logger = getLogger(__name__)
+
+# seconds to wait for the response to a request.
+DEFAULT_TIMEOUT = 300.0
+
+WORKER_SCRIPT = r"""
+'use strict';
+
+var crypto = require('crypto');
+var fs = require('fs');
+var path = require('path');
+var readline = require('readline');
+var util = require('util');
+
+// stdout is reserved for the responses.
+console.log = console.info = console.warn = function() {
+    process.stderr.write(util.format.apply(util, arguments) + '\n');
+};
+
+var environments = {};
+
+var ops = {
+    ping: function(request, done) {
+        done(null, 'pong');
+    },
+
+    precompile: function(request, done) {
+        var nunjucks = require('nunjucks');
+        var requirejs = require('requirejs');
+        var key = crypto.createHash('sha256').update(
+            fs.readFileSync(request.config)).digest('hex');
+        var cached = environments[request.config];
+        if (!cached || cached.key !== key) {
+            if (cached) {
+                delete requirejs.s.contexts[cached.context];
+            }
+            // the config may have been rebuilt at the same path.
+            var filename = require.resolve(path.resolve(request.config));
+            delete require.cache[filename];
+            var config = JSON.parse(JSON.stringify(require(filename)));
+            // a new context rather than the global one, such that the
+            // modules are loaded again.
+            config.context = 'nunja_' + key;
+            var contextRequire = requirejs.config(config);
+            requirejs.define('nunjucks', [], nunjucks);
+            cached = environments[request.config] = {
+                key: key,
+                context: config.context,
+                env: contextRequire('repodono.nunja.core').engine.env,
+            };
+        }
+        done(null, request.templates.map(function(template) {
+            return nunjucks.precompileString(template[1], {
+                env: cached.env,
+                name: template[0],
+            });
+        }));
+    },
+
+    optimize: function(request, done) {
+        var requirejs = require('requirejs');
+        var config = eval(fs.readFileSync(request.manifest, 'utf8'));
+        requirejs.optimize(config, function(output) {
+            done(null, output);
+        }, function(error) {
+            done(String(error));
+        });
+    },
+};
+
+var queue = [];
+var busy = false;
+
+function respond(id, error, result) {
+    process.stdout.write(JSON.stringify({
+        id: id, error: error || null, result: result,
+    }) + '\n');
+}
+
+function next() {
+    if (busy || !queue.length) {
+        return;
+    }
+    busy = true;
+    var request = queue.shift();
+    var finished = false;
+    var done = function(error, result) {
+        if (finished) {
+            return;
+        }
+        finished = true;
+        respond(request.id, error, result);
+        busy = false;
+        next();
+    };
+    try {
+        var op = ops[request.op];
+        if (!op) {
+            throw new Error('unknown op: ' + request.op);
+        }
+        op(request, done);
+    }
+    catch (e) {
+        done(String(e && e.stack || e));
+    }
+}
+
+readline.createInterface({input: process.stdin}).on('line', function(line) {
+    if (!line.trim()) {
+        return;
+    }
+    var request;
+    try {
+        request = JSON.parse(line);
+    }
+    catch (e) {
+        respond(null, 'invalid request: ' + e);
+        return;
+    }
+    queue.push(request);
+    next();
+});
+"""
+
+
+def _read_lines(stream, lines):
+    for line in iter(stream.readline, b''):
+        lines.put(line)
+    lines.put(None)
+
+
+class NodeWorker(object):
+    """
+    The client to a worker node process, which is started upon the
+    first request and restarted if it went away.  Requests are sent one
+    at a time, so an instance may be shared between threads.
+
+    If the response to a request is not received within timeout
+    seconds (never if None), the process is killed and NodeWorkerError
+    is raised; the next request will start a new process.
+    """
+
+    def __init__(self, node='node', cwd=None, env=None,
+                 timeout=DEFAULT_TIMEOUT):
+        self.node = node
+        self.cwd = cwd
+        self.env = env
+        self.timeout = timeout
+        self.requests = 0
+        self._process = None
+        self._lines = None
+        self._counter = 0
+        self._lock = Lock()
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        if self.running:
+            return
+        # clean up after a previous process that went away.
+        self._terminate()
+        logger.debug('starting node worker')
+        self._process = Popen(
+            [self.node, '-e', WORKER_SCRIPT],
+            stdin=PIPE, stdout=PIPE, cwd=self.cwd, env=self.env,
+        )
+        # the output is read from a thread, such that the waits for the
+        # responses may time out.
+        self._lines = Queue()
+        reader = Thread(
+            target=_read_lines, args=(self._process.stdout, self._lines),
+            name='nunja-node-worker-reader',
+        )
+        reader.daemon = True
+        reader.start()
+
+    def request(self, op, **params):
+        """
+        Send the op with the params to the worker and return the result,
+        or raise NodeWorkerError with the error reported by the worker.
+        """
+
+        with self._lock:
+            self.start()
+            self._counter += 1
+            params['id'] = self._counter
+            params['op'] = op
+            process = self._process
+            try:
+                process.stdin.write(json.dumps(params).encode('utf-8'))
+                process.stdin.write(b'\n')
+                process.stdin.flush()
+                response = self._read_response(self._lines, self._counter)
+            except (IOError, OSError) as e:
+                self._terminate()
+                raise NodeWorkerError('node worker failed: %s' % e)
+            self.requests += 1
+
+        if response.get('error'):
+            raise NodeWorkerError(response['error'])
+        return response.get('result')
+
+    def _read_response(self, lines, id_):
+        deadline = (
+            None if self.timeout is None else default_timer() + self.timeout)
+        while True:
+            try:
+                line = lines.get(timeout=(
+                    None if deadline is None else
+                    max(deadline - default_timer(), 0)))
+            except Empty:
+                self._terminate()
+                raise NodeWorkerError(
+                    'node worker timed out after %s seconds' % self.timeout)
+            if not line:
+                self._terminate()
+                raise NodeWorkerError('node worker exited unexpectedly')
+            try:
+                response = json.loads(line.decode('utf-8'))
+            except ValueError:
+                logger.warning('unexpected output from node worker: %r', line)
+                continue
+            if isinstance(response, dict) and response.get('id') == id_:
+                return response
+            logger.warning('unexpected response from node worker: %r', line)
+
+    def _terminate(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        for pipe in (process.stdin, process.stdout):
+            try:
+                pipe.close()
+            except (IOError, OSError):
+                pass
+
+    def close(self):
+        """
+        Stop the worker process, if it was started.
+        """
+
+        with self._lock:
+            process, self._process = self._process, None
+            if process is None:
+                return
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default_worker = None
+_default_worker_lock = Lock()
+
+
+def default_worker():
+    """
+    Return the worker that is shared by all toolchains that were not
+    provided with one, which is stopped when the interpreter exits.
+    """
+
+    global _default_worker
+    with _default_worker_lock:
+        if _default_worker is None:
+            _default_worker = NodeWorker()
+            atexit.register(_default_worker.close)
+    return _default_worker
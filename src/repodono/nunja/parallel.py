@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Rendering of large numbers of molds across a pool of processes.
+
+Every worker process builds its own engine from a description of the
+registry, which only consist of its name and its mapping of mold_ids to
+paths, such that it can be pickled and sent to workers regardless of
+how the registry was populated.
+"""
+
+from multiprocessing import Pool
+
+from repodono.nunja.engine import Engine
+from repodono.nunja.exc import RenderError
+from repodono.nunja.registry import Registry
+
+DEFAULT_CHUNKSIZE = 64
+
+# the engine within a worker process.
+_engine = None
+
+
+def describe_registry(registry):
+    """
+    Return a picklable description of the registry.
+    """
+
+    registry.init_lazy_entrypoints()
+    return {
+        'registry_name': registry.registry_name,
+        'molds': dict(registry.molds),
+    }
+
+
+def registry_from_description(description):
+    """
+    Create a registry from a description produced by describe_registry.
+    """
+
+    registry = Registry(description['registry_name'], {})
+    registry.molds.update(description['molds'])
+    return registry
+
+
+def _init_worker(description, engine_options):
+    global _engine
+    _engine = Engine(registry_from_description(description), **engine_options)
+
+
+def _render_chunk(chunk):
+    results = []
+    for index, mold_id, data in chunk:
+        try:
+            results.append((index, mold_id, True, _engine.execute(
+                mold_id, data)))
+        except Exception as e:
+            results.append((index, mold_id, False, '%s: %s' % (
+                type(e).__name__, e)))
+    return results
+
+
+def _chunk_jobs(jobs, chunksize):
+    chunk = []
+    for index, (mold_id, data) in enumerate(jobs):
+        chunk.append((index, mold_id, data))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ParallelRenderer(object):
+    """
+    Render (mold_id, data) jobs across a pool of worker processes.
+
+    The pool is started upon first use and is kept until ``close`` is
+    called; instances may also be used as a context manager.
+    """
+
+    def __init__(
+            self, registry, processes=None, chunksize=DEFAULT_CHUNKSIZE,
+            frozen=True):
+        """
+        Arguments:
+
+        registry
+            The registry that the engine of every worker will be built
+            from.
+        processes
+            The number of worker processes, default to the number of
+            CPUs available.
+        chunksize
+            The number of jobs sent to a worker at a time.
+        frozen
+            Whether the engines in the workers are frozen.
+        """
+
+        self.description = describe_registry(registry)
+        self.processes = processes
+        self.chunksize = chunksize
+        self.engine_options = {'frozen': frozen}
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = Pool(
+                self.processes, _init_worker,
+                (self.description, self.engine_options),
+            )
+        return self._pool
+
+    def render(self, jobs):
+        """
+        Render all the jobs, which are (mold_id, data) tuples, and return
+        the list of results in the same order.
+
+        If any of the jobs failed, a RenderError will be raised for the
+        first failed job in the order provided, with the details of all
+        the failures in its ``failures`` attribute.
+        """
+
+        results = []
+        failures = []
+        for chunk in self.pool.imap(
+                _render_chunk, _chunk_jobs(jobs, self.chunksize)):
+            for index, mold_id, success, result in chunk:
+                if success:
+                    results.append(result)
+                else:
+                    failures.append((index, mold_id, result))
+                    results.append(None)
+
+        if failures:
+            raise RenderError(*failures[0], failures=failures)
+        return results
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Ahead of time compilation of the templates of molds.
+
+The templates of every mold in a registry may be compiled into Python
+modules once (e.g. as part of a release), which the engine can then be
+instructed to load through its ``compiled_path`` option such that no
+jinja2 compilation will happen within the processes that render them.
+"""
+
+from logging import getLogger
+
+from repodono.nunja.engine import Engine
+
+logger = getLogger(__name__)
+
+
+def compile_molds(registry, target, zip=None, engine_cls=Engine):
+    """
+    Compile all templates of the molds in the registry into Python
+    modules in the target directory, or into a zip file at target with
+    the given zip compression method (i.e. 'deflated' or 'stored').
+
+    The templates are compiled through the environment of an instance
+    of engine_cls for the registry, so that the compiled templates are
+    produced with the same environment options as the ones that will
+    be used for rendering.  Any template that fails to compile will
+    raise the exception.
+
+    Returns the list of the mold_id paths of the compiled templates.
+    """
+
+    env = engine_cls(registry).env
+    names = env.loader.list_templates()
+    env.compile_templates(
+        target, zip=zip, ignore_errors=False, log_function=logger.debug)
+    logger.info('compiled %d templates into %s', len(names), target)
+    return names
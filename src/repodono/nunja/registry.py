@@ -38,8 +38,8 @@ jinja loader and to facilitate the generation of requirejs configuration
 in typical JavaScript environments.
 
 For general usage, a default registry that include the entry points is
-instantiated, however users are able to create their own registry class
-that omit this like so::
+provided (it is only instantiated upon first use), however users are
+able to create their own registry class that omit this like so::
 
     custom_registry = Registry('namespace.custom_registry', entry_points={})
 
@@ -48,28 +48,42 @@ methods will not make use of them.
 """
 
 import json
-from os import listdir
-from os import walk
+from collections import OrderedDict
+from functools import partial
+from hashlib import sha256
+from os import environ
 
 from os.path import altsep
 from os.path import sep
 from os.path import pardir
 
 from os.path import basename
+from os.path import commonprefix
 from os.path import dirname
-from os.path import exists
-from os.path import isdir
 from os.path import join
+from os.path import normpath
 from os.path import relpath
 from logging import getLogger
+from time import time
+from timeit import default_timer
 from types import ModuleType
 
+from .discovery import load_entry_points
 from .exc import FileNotFoundError
 from .exc import TemplateNotFoundError
+from .resources import exists
+from .resources import getmtime
+from .resources import isdir
+from .resources import listdir
+from .resources import read_bytes
+from .resources import stat
+from .resources import walk
+from .utils import LazyProxy
 
 TMPL_FN_EXT = '.jinja'
 REQ_TMPL_NAME = 'template' + TMPL_FN_EXT
 ENTRY_POINT_NAME = 'repodono.nunja.mold'
+ENTRY_POINT_INDEX_ENV = 'REPODONO_NUNJA_ENTRY_POINT_INDEX'
 
 # I supposed this can all be hardcoded, but eating ones dogfood can be
 # useful as a litmus test while this keeps the naming scheme consistent,
@@ -79,16 +93,165 @@ DEFAULT_MOLDS = {
     DEFAULT_WRAPPER_NAME: join(dirname(__file__), DEFAULT_WRAPPER_NAME)
 }
 
+# the limits on the number of entries kept by the indexes.
+DEFAULT_MAX_ENTRIES = 65536
+DEFAULT_MAX_NEGATIVE_ENTRIES = 4096
+
+# the coarsest modification time resolution of the filesystems that may
+# be in use (i.e. FAT), in seconds.
+MTIME_RESOLUTION = 2.0
+
 logger = getLogger(__name__)
 _marker = object()
 
 
+class BoundedIndex(object):
+    """
+    A mapping of keys to (value, expiry) entries, where the expiry is
+    the time after which the entry is no longer valid (never if None).
+
+    Entries with a true value and entries with a false value (i.e. the
+    negative results) are limited to max_entries and to
+    max_negative_entries respectively, with the least recently used
+    entries dropped first, such that lookups of arbitrary names cannot
+    grow the index without bound.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_negative_entries=DEFAULT_MAX_NEGATIVE_ENTRIES):
+        self.max_entries = max_entries
+        self.max_negative_entries = max_negative_entries
+        self.evictions = 0
+        self._positive = OrderedDict()
+        self._negative = OrderedDict()
+
+    def lookup(self, key, now):
+        """
+        Return the entry for the key if it has not expired, otherwise
+        None, with the expired entry dropped.
+        """
+
+        for entries in (self._positive, self._negative):
+            entry = entries.pop(key, None)
+            if entry is None:
+                continue
+            if entry[1] is None or now < entry[1]:
+                # reinsert as the most recently used.
+                entries[key] = entry
+                return entry
+            return None
+        return None
+
+    def __setitem__(self, key, entry):
+        if entry[0]:
+            entries, limit = self._positive, self.max_entries
+            self._negative.pop(key, None)
+        else:
+            entries, limit = self._negative, self.max_negative_entries
+            self._positive.pop(key, None)
+        entries.pop(key, None)
+        entries[key] = entry
+        while len(entries) > limit:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        try:
+            return self._positive[key]
+        except KeyError:
+            return self._negative[key]
+
+    def __delitem__(self, key):
+        if self._positive.pop(key, None) is None:
+            del self._negative[key]
+
+    def __contains__(self, key):
+        return key in self._positive or key in self._negative
+
+    def __iter__(self):
+        for entries in (self._positive, self._negative):
+            for key in list(entries):
+                yield key
+
+    def __len__(self):
+        return len(self._positive) + len(self._negative)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        self._positive.clear()
+        self._negative.clear()
+
+
+class StatCache(object):
+    """
+    Memoized results of existence checks of filesystem paths.
+
+    Positive results are kept for ``ttl`` seconds (forever if None) and
+    negative results for ``negative_ttl`` seconds, unless they are
+    dropped earlier through ``invalidate`` or evicted as the limits on
+    the number of results were reached.
+    """
+
+    def __init__(self, ttl=None, negative_ttl=1.0, timer=default_timer,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 max_negative_entries=DEFAULT_MAX_NEGATIVE_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timer = timer
+        self.results = BoundedIndex(max_entries, max_negative_entries)
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+        }
+
+    def exists(self, path):
+        """
+        Return whether the path exists, only checking the filesystem if
+        there is no unexpired result for it.
+        """
+
+        now = self.timer()
+        entry = self.results.lookup(path, now)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry[0]
+
+        self.stats['misses'] += 1
+        result = exists(path)
+        ttl = self.ttl if result else self.negative_ttl
+        self.results[path] = (result, None if ttl is None else now + ttl)
+        return result
+
+    def invalidate(self, path=None):
+        """
+        Drop the result for the path and everything underneath it, or
+        all results if no path is provided.
+        """
+
+        if path is None:
+            self.results.clear()
+            return
+
+        prefix = join(path, '')
+        for key in list(self.results):
+            if key == path or key.startswith(prefix):
+                del self.results[key]
+
+
 class Registry(object):
     """
     Default registry implementation.
     """
 
-    def __init__(self, registry_name, entry_points=None, default_prefix='_'):
+    def __init__(self, registry_name, entry_points=None, default_prefix='_',
+                 ttl=None, negative_ttl=1.0,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 max_negative_entries=DEFAULT_MAX_NEGATIVE_ENTRIES):
         """
         Arguments:
 
@@ -100,15 +263,58 @@ class Registry(object):
         default_prefix
             The default prefix to use for registration if no mold_id was
             provided.
+        ttl
+            The number of seconds that resolved paths and the results of
+            existence checks will be remembered for.  Default is to keep
+            them until they are invalidated.
+        negative_ttl
+            The number of seconds that failed lookups and paths found to
+            be missing will be remembered for.
+        max_entries
+            The maximum number of resolved paths, and of paths found to
+            exist, that will be remembered.
+        max_negative_entries
+            The maximum number of failed lookups, and of paths found to
+            be missing, that will be remembered.
         """
 
         self.entry_points = {} if entry_points is None else entry_points
         self.registry_name = registry_name
         self.default_prefix = default_prefix
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stat_cache = StatCache(
+            ttl=ttl, negative_ttl=negative_ttl, max_entries=max_entries,
+            max_negative_entries=max_negative_entries,
+        )
+        # callables that will be invoked with the mold_id (or None for
+        # all) that got invalidated.
+        self.invalidation_hooks = []
+        self._path_index = BoundedIndex(max_entries, max_negative_entries)
+        # entry point name to the list of candidate mold directories.
+        self._entry_point_paths = {}
+        # entry points to be registered on first use of their name.
+        self._lazy_entry_points = {}
+        self._path_index_stats = {
+            'hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+        }
+        # mold_id to the list of templates as recorded by a manifest.
+        self._manifest_templates = {}
+        # template paths recorded by a manifest to the mold_id and the
+        # recorded size, until they are verified upon first use.
+        self._manifest_sizes = {}
+        # mold_id to the path, the directory mtimes and the templates
+        # that were found by the last walk through the mold.
+        self._template_paths = {}
         self.molds = {}
         # Forcibly register the default one here as the core rendering
         # need this wrapper.
         self.molds.update(DEFAULT_MOLDS)
+        # mold_id to the path of the molds that were found through the
+        # entry points by mold_id_to_path, which are not registered.
+        self._resolved_molds = {}
 
     def mold_id_to_path(self, mold_id, default=_marker):
         """
@@ -123,7 +329,7 @@ class Registry(object):
                     'Failed to lookup mold_id %s to a path' % mold_id)
             return default
 
-        result = self.molds.get(mold_id)
+        result = self.molds.get(mold_id) or self._resolved_molds.get(mold_id)
         if result:
             return result
 
@@ -133,51 +339,109 @@ class Registry(object):
             return handle_default(
                 'mold_id %s not found and not in standard format')
 
+        if prefix in self._lazy_entry_points:
+            self.register_entry_point(self._lazy_entry_points.pop(prefix))
+            result = self.molds.get(mold_id)
+            if result:
+                return result
+
         try:
-            ep = self.entry_points[prefix]
+            paths = self.entry_point_paths(prefix)
         except KeyError:
             return handle_default(
                 'mold_id %s not found in self.entry_points.')
 
-        try:
-            module = __import__(ep.module_name, fromlist=['__name__'], level=0)
-        except ImportError:
+        if paths is None:
             return handle_default(
                 'mold_id %s resolves to entry point that failed to import')
 
-        for path in module.__path__:
-            full_path = join(path, ep.attrs[0], mold_basename)
+        for path in paths:
+            full_path = join(path, mold_basename)
             try:
                 self.verify_mold_path(full_path)
             except TemplateNotFoundError:
                 continue
             else:
+                # kept so that the next lookup is immediate.
+                self._resolved_molds[mold_id] = full_path
                 return full_path
 
         return handle_default(
             'mold_id %s does not lead to a valid template.jinja')
 
+    def entry_point_paths(self, name):
+        """
+        Return the list of candidate directories for the molds provided
+        by the entry point with name, or None if its module cannot be
+        imported.  The result is resolved once and then cached.
+
+        Raises KeyError if there is no such entry point.
+        """
+
+        try:
+            return self._entry_point_paths[name]
+        except KeyError:
+            pass
+
+        ep = self.entry_points[name]
+        try:
+            module = __import__(ep.module_name, fromlist=['__name__'], level=0)
+        except ImportError:
+            paths = None
+        else:
+            paths = [join(path, ep.attrs[0]) for path in module.__path__]
+        self._entry_point_paths[name] = paths
+        return paths
+
     def lookup_path(self, mold_id_path, default=_marker):
         """
         Lookup the filesystem path from a mold_id compatible path.
+
+        Results are kept in the path index of this registry.
         """
 
-        fragments = mold_id_path.split('/')
-        mold_id = '/'.join(fragments[:2])
+        stats = self._path_index_stats
+        now = self.stat_cache.timer()
+        entry = self._path_index.lookup(mold_id_path, now)
+        if entry is not None:
+            path = entry[0]
+            if path is not None:
+                stats['hits'] += 1
+                return path
+            stats['negative_hits'] += 1
+            if default is _marker:
+                raise KeyError(
+                    'Failed to lookup mold_id path %s' % mold_id_path)
+            return default
+
+        stats['misses'] += 1
         try:
-            subpath = []
-            for piece in fragments[2:]:
-                if (sep in piece or (altsep and altsep in piece) or
-                        piece == pardir):
-                    raise KeyError
-                elif piece and piece != '.':
-                    subpath.append(piece)
-            path = self.mold_id_to_path(mold_id)
+            path = self._lookup_path(mold_id_path)
         except KeyError:
+            self._index_path(mold_id_path, None, now, self.negative_ttl)
             if default is _marker:
                 raise
             return default
 
+        self._index_path(mold_id_path, path, now, self.ttl)
+        return path
+
+    def _index_path(self, mold_id_path, path, now, ttl):
+        self._path_index[mold_id_path] = (
+            path, None if ttl is None else now + ttl)
+
+    def _lookup_path(self, mold_id_path):
+        fragments = mold_id_path.split('/')
+        mold_id = '/'.join(fragments[:2])
+        subpath = []
+        for piece in fragments[2:]:
+            if (sep in piece or (altsep and altsep in piece) or
+                    piece == pardir):
+                raise KeyError(
+                    'Invalid fragment in mold_id path %s' % mold_id_path)
+            elif piece and piece != '.':
+                subpath.append(piece)
+        path = self.mold_id_to_path(mold_id)
         return join(path, *subpath)
         # TODO Should a lookup_template be implemented?
 
@@ -188,19 +452,47 @@ class Registry(object):
 
         try:
             path = self.lookup_path(mold_id_path)
-            if not exists(path):
+            if (path in self._manifest_sizes and
+                    not self._verify_manifest_entry(path)):
+                # the mold is to be found again without the manifest.
+                path = self.lookup_path(mold_id_path)
+            if not self.stat_cache.exists(path):
                 raise KeyError
         except KeyError:
             raise FileNotFoundError(mold_id_path)
         return path
 
+    def _verify_manifest_entry(self, path):
+        # return whether the entry for the path may still be used.
+        entry = self._manifest_sizes.pop(path, None)
+        if entry is None:
+            return True
+        mold_id, size = entry
+        try:
+            actual = stat(path)[1]
+        except OSError:
+            actual = None
+        if actual == size:
+            return True
+
+        logger.warning(
+            '%s does not match the manifest; discarding the manifest '
+            'entries for mold %s', path, mold_id)
+        self._manifest_templates.pop(mold_id, None)
+        for key, value in list(self._manifest_sizes.items()):
+            if value[0] == mold_id:
+                self._manifest_sizes.pop(key, None)
+        self.invalidate(mold_id)
+        self.molds.pop(mold_id, None)
+        return False
+
     def verify_mold_path(self, path):
         """
         Verify that this base path (resolved from a mold_id) will lead
         to a working template file.
         """
 
-        if not exists(join(path, REQ_TMPL_NAME)):
+        if not self.stat_cache.exists(join(path, REQ_TMPL_NAME)):
             raise TemplateNotFoundError(
                 'required template not found at `%s`' % path)
         return True
@@ -246,6 +538,58 @@ class Registry(object):
         self.verify_mold_path(path)
         self.verify_mold_path_with_mold_id(path, mold_id)
         self.molds[mold_id] = path
+        # the existence checks for the path were just done.
+        self.invalidate(mold_id, stat_cache=False)
+
+    def invalidate(self, mold_id=None, stat_cache=True):
+        """
+        Invalidate the cached path lookups for the mold_id, or all of
+        them if no mold_id is provided, along with the existence checks
+        underneath the associated path unless stat_cache is False, then
+        notify all the registered invalidation hooks.
+        """
+
+        if mold_id is None:
+            self._path_index.clear()
+            self._entry_point_paths.clear()
+            self._resolved_molds.clear()
+            self._template_paths.clear()
+            if stat_cache:
+                self.stat_cache.invalidate()
+        else:
+            prefix = mold_id + '/'
+            for key in list(self._path_index):
+                if key == mold_id or key.startswith(prefix):
+                    del self._path_index[key]
+            self._template_paths.pop(mold_id, None)
+            resolved = self._resolved_molds.pop(mold_id, None)
+            path = self.molds.get(mold_id) or resolved
+            if path and stat_cache:
+                self.stat_cache.invalidate(path)
+
+        # hooks may remove themselves.
+        for hook in list(self.invalidation_hooks):
+            hook(mold_id)
+
+    def cache_stats(self):
+        """
+        Return a dict with the counters for the path index and the stat
+        cache of this registry.  The number of filesystem checks that
+        were saved is reported as ``stat_calls_saved``, and the number
+        of entries dropped as the limits were reached as the evictions.
+        """
+
+        index = self._path_index_stats
+        stat = self.stat_cache.stats
+        return {
+            'lookup_hits': index['hits'],
+            'lookup_negative_hits': index['negative_hits'],
+            'lookup_misses': index['misses'],
+            'lookup_evictions': self._path_index.evictions,
+            'stat_calls': stat['misses'],
+            'stat_calls_saved': stat['hits'],
+            'stat_evictions': self.stat_cache.results.evictions,
+        }
 
     def register_module(self, module, subdir=None, prefix=None, paths=None):
         """
@@ -293,7 +637,6 @@ class Registry(object):
                     continue
 
                 mold_id = prefix + '/' + target
-
                 try:
                     self.register_mold(target_path, mold_id=mold_id)
                 except TemplateNotFoundError:
@@ -311,28 +654,51 @@ class Registry(object):
             mc, pc, subdir, module.__name__
         )
 
-    def init_entrypoints(self, entry_points=None):
+    def init_entrypoints(self, entry_points=None, lazy=False):
         """
         Register all the local entry points.  By default entry points
         recorded here will be loaded into the mold cache which will
         speed up lookups but disables to dynamic loading of all mock_ids
         that are prefixed with the entry point names.
+
+        If lazy is set, the registration of each entry point will be
+        deferred until a mold_id with its name as the prefix is looked
+        up, or until the molds are exported.
         """
 
         if entry_points is None:
             entry_points = self.entry_points
 
+        if lazy:
+            self._lazy_entry_points.update(entry_points)
+            return
+
         for ep in entry_points.values():
-            try:
-                module = __import__(
-                    ep.module_name, fromlist=['__name__'], level=0)
-            except ImportError:
-                logger.warning(
-                    'ImportError: %s; cannot register as mold', ep.module_name)
-                continue
+            self.register_entry_point(ep)
+
+    def init_lazy_entrypoints(self):
+        """
+        Register all the entry points that were deferred.
+        """
+
+        while self._lazy_entry_points:
+            self.register_entry_point(self._lazy_entry_points.popitem()[1])
+
+    def register_entry_point(self, ep):
+        """
+        Register all the molds provided by the entry point.
+        """
+
+        try:
+            module = __import__(
+                ep.module_name, fromlist=['__name__'], level=0)
+        except ImportError:
+            logger.warning(
+                'ImportError: %s; cannot register as mold', ep.module_name)
+            return
 
-            subdir = ep.attrs[0]
-            self.register_module(module, subdir, ep.name)
+        subdir = ep.attrs[0]
+        self.register_module(module, subdir, ep.name)
 
     def export_nunja_requirejs_json(self):
         """
@@ -340,6 +706,7 @@ class Registry(object):
         as a json encoded string.
         """
 
+        self.init_lazy_entrypoints()
         return json.dumps({
             'paths': self.molds,
         })
@@ -350,17 +717,15 @@ class Registry(object):
         from the nunja/nunjucks environment as json encoded string.
         """
 
-        if match_func is None:
-            match_func = lambda p: p.endswith(TMPL_FN_EXT)
+        self.init_lazy_entrypoints()
 
-        def generate_paths(path):
-            for r, d, files in walk(path):
-                for name in files:
-                    if match_func(name):
-                        yield relpath(join(r, name), path)
+        def template_paths(name, path):
+            if match_func is None:
+                return self.template_paths(name)
+            return sorted(self._walk_mold(path, match_func))
 
         results = {
-            name: sorted(generate_paths(path))
+            name: template_paths(name, path)
             for name, path in self.molds.items()
         }
 
@@ -368,31 +733,196 @@ class Registry(object):
             'template_map': results
         })
 
+    def export_requirejs_and_template_paths(self):
+        """
+        Return the results of ``export_nunja_requirejs_json`` and of
+        ``export_jinja_template_paths`` together, such that all molds
+        are only visited once.
+        """
+
+        self.init_lazy_entrypoints()
+        template_map = {}
+        for name in self.molds:
+            template_map[name] = self.template_paths(name)
+        return json.dumps({
+            'paths': self.molds,
+        }), json.dumps({
+            'template_map': template_map
+        })
+
+    def template_paths(self, mold_id):
+        """
+        Return the sorted list of the paths of all templates within the
+        mold, relative to it.
+
+        The result is kept until the mold is invalidated, or until the
+        modification time of any directory within the mold changed, as
+        adding, removing or renaming a template will have changed that
+        of the directory that contained it.  As a change within the
+        resolution of the modification time of the filesystem may not
+        change it, a result is not kept if any of the directories was
+        modified within that resolution of the walk.
+        """
 
-def create_default_registry(name):
+        if mold_id in self._manifest_templates:
+            return list(self._manifest_templates[mold_id])
+
+        path = self.mold_id_to_path(mold_id)
+        cached = self._template_paths.get(mold_id)
+        if cached is not None and cached[0] == path:
+            try:
+                if all(getmtime(join(path, d)) == mtime
+                        for d, mtime in cached[1].items()):
+                    return list(cached[2])
+            except OSError:
+                pass
+
+        started = time()
+        dirs = {}
+        names = []
+        for r, d, files in walk(path):
+            rel = relpath(r, path)
+            try:
+                dirs[rel] = getmtime(r)
+            except OSError:
+                continue
+            names.extend(
+                join(rel, name) if rel != '.' else name
+                for name in files if self._match_template(name)
+            )
+        names.sort()
+        if all(mtime < started - MTIME_RESOLUTION for mtime in dirs.values()):
+            self._template_paths[mold_id] = (path, dirs, tuple(names))
+        else:
+            self._template_paths.pop(mold_id, None)
+        return names
+
+    @staticmethod
+    def _match_template(name):
+        return name.endswith(TMPL_FN_EXT)
+
+    @staticmethod
+    def _walk_mold(path, match_func):
+        for r, d, files in walk(path):
+            for name in files:
+                if match_func(name):
+                    yield relpath(join(r, name), path)
+
+    def export_manifest(self, root=None):
+        """
+        Export the complete registry, with the path of every mold along
+        with the size and sha256 hash of every template file within, as
+        a json encoded string for the ``from_manifest`` constructor.
+
+        The paths of the molds are recorded relative to the root, which
+        defaults to the deepest directory that contains all of them,
+        such that the manifest may be used with the molds relocated to
+        another root.  The default molds (i.e. the wrapper) are always
+        provided by this package, so they are not exported.
+        """
+
+        self.init_lazy_entrypoints()
+        paths = dict(
+            (mold_id, path) for mold_id, path in self.molds.items()
+            if mold_id not in DEFAULT_MOLDS
+        )
+        if root is None:
+            prefix = commonprefix([
+                normpath(path) + sep for path in paths.values()])
+            root = prefix[:prefix.rfind(sep) + 1] or sep
+        molds = {}
+        for mold_id, path in paths.items():
+            templates = {}
+            for name in sorted(self._walk_mold(path, self._match_template)):
+                contents = read_bytes(join(path, name))
+                templates[name] = {
+                    'size': len(contents),
+                    'sha256': sha256(contents).hexdigest(),
+                }
+            molds[mold_id] = {
+                'path': relpath(path, root).replace(sep, '/'),
+                'templates': templates,
+            }
+
+        return json.dumps({
+            'registry_name': self.registry_name,
+            'root': root,
+            'molds': molds,
+        }, indent=2, sort_keys=True)
+
+    @classmethod
+    def from_manifest(cls, manifest, registry_name=None, root=None, **kw):
+        """
+        Construct a registry from a manifest produced by the method
+        ``export_manifest``, which may be provided as the json encoded
+        string or the decoded dict.  The paths of the molds are resolved
+        against the root, which defaults to the root they were exported
+        from.
+
+        No filesystem access will be done up front, as all the molds
+        and their templates recorded within the manifest are assumed to
+        exist for the ttl of the registry.  The size of each template
+        is checked against the manifest upon its first verification,
+        and a mismatch will discard the manifest entries for its mold
+        along with the mold itself, such that it will be looked up
+        through the entry points as if it was never in the manifest.
+        The keyword arguments are passed to the constructor, which by
+        default will not have any entry points.
+        """
+
+        if not isinstance(manifest, dict):
+            manifest = json.loads(manifest)
+
+        kw.setdefault('entry_points', {})
+        registry = cls(registry_name or manifest['registry_name'], **kw)
+        if root is None:
+            root = manifest.get('root', '')
+        results = registry.stat_cache.results
+        ttl = registry.stat_cache.ttl
+        expiry = None if ttl is None else registry.stat_cache.timer() + ttl
+        for mold_id, mold in manifest['molds'].items():
+            if mold_id in DEFAULT_MOLDS:
+                # always provided by this package, wherever it is.
+                continue
+            path = normpath(join(root, mold['path']))
+            registry.molds[mold_id] = path
+            registry._manifest_templates[mold_id] = sorted(mold['templates'])
+            results[path] = (True, expiry)
+            for name, info in mold['templates'].items():
+                template_path = join(path, name)
+                results[template_path] = (True, expiry)
+                registry._manifest_sizes[template_path] = (
+                    mold_id, info.get('size'))
+        return registry
+
+
+def create_default_registry(name, index_file=None):
     """
     Default registry constructor that will load all the entry points
     then add that to the returned Registry.
+
+    The entry points may be read from (and recorded to) an index file,
+    which default to the one specified by the environment variable
+    ``REPODONO_NUNJA_ENTRY_POINT_INDEX``.
     """
 
-    _entry_points = {}
+    if index_file is None:
+        index_file = environ.get(ENTRY_POINT_INDEX_ENV)
 
     try:
-        from pkg_resources import iter_entry_points
+        _entry_points = load_entry_points(ENTRY_POINT_NAME, index_file)
     except ImportError:  # pragma: no cover
         logger.error(
-            'The `repodono.nunja` registry is disabled as the setuptools '
-            'package is missing the `pkg_resources` module'
+            'The `repodono.nunja` registry is disabled as neither the '
+            '`importlib.metadata` module nor the `pkg_resources` module '
+            'from the setuptools package are available'
         )
-    else:  # pragma: no cover
-        # First just dump all the relevant bits from the entry point into
-        # the _source dict.
-        for ep in iter_entry_points(ENTRY_POINT_NAME):
-            _entry_points[ep.name] = ep
+        _entry_points = {}
 
     # Then create the default registry based on that.
     return Registry(name, _entry_points)
 
 
-# Create a default, uninitialized instance.
-registry = create_default_registry(__name__)
+# Create a default, uninitialized instance, which will only be created
+# upon first use so that importing this module remains cheap.
+registry = LazyProxy(partial(create_default_registry, __name__))
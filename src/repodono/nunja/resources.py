@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Access to the files of molds, including the ones within zip archives.
+
+Packages imported from a zip archive (e.g. a zipped egg or wheel) will
+have paths such as ``/site/package.zip/example/molds``, which are used
+as is by the registry.  The functions here will first try the path on
+the filesystem, and then fall back to the member inside the archive
+that the path lead into.
+
+Every archive is opened once, with its central directory read and kept
+in an index such that the existence checks and listings of its members
+require no further access to the filesystem.  As archives are expected
+to be immutable during the lifetime of the process, they stay open
+until ``close_archives`` is called.  Likewise, the paths that were
+found to not be archives are remembered, such that a missing file
+under a regular directory only costs the one failed check.
+"""
+
+from os import listdir as _listdir
+from os import stat as _stat
+from os import walk as _walk
+from os.path import dirname
+from os.path import exists as _exists
+from os.path import isdir as _isdir
+from os.path import isfile
+from os.path import join
+from os.path import normpath
+from os.path import sep
+from threading import Lock
+from zipfile import ZipFile
+from zipfile import is_zipfile
+
+_archives = {}
+# existing paths that are known to not be archives.
+_not_archives = set()
+_lock = Lock()
+
+
+class ZipArchive(object):
+    """
+    An opened zip archive along with the index of its members.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zipfile = ZipFile(path)
+        self.mtime = _stat(path).st_mtime
+        # member name of files to their ZipInfo
+        self.files = {}
+        # member name of directories to their subdirectories and files
+        self.dirs = {'': (set(), set())}
+        self._lock = Lock()
+        for info in self.zipfile.infolist():
+            parts = info.filename.rstrip('/').split('/')
+            is_dir = info.filename.endswith('/')
+            for i in range(1, len(parts) + 1):
+                name = '/'.join(parts[:i])
+                parent = self.dirs['/'.join(parts[:i - 1])]
+                if i == len(parts) and not is_dir:
+                    self.files[name] = info
+                    parent[1].add(parts[i - 1])
+                else:
+                    self.dirs.setdefault(name, (set(), set()))
+                    parent[0].add(parts[i - 1])
+
+    def read(self, name):
+        with self._lock:
+            return self.zipfile.read(self.files[name])
+
+    def walk(self, name):
+        """
+        Yield the same 3-tuples as ``os.walk`` for the member name.
+        """
+
+        subdirs, files = self.dirs[name]
+        root = join(self.path, *name.split('/')) if name else self.path
+        dirs = sorted(subdirs)
+        yield root, dirs, sorted(files)
+        for subdir in dirs:
+            for result in self.walk(name + '/' + subdir if name else subdir):
+                yield result
+
+    def close(self):
+        self.zipfile.close()
+
+
+def open_archive(path):
+    """
+    Return the ZipArchive for the zip file at path, opening it and
+    indexing its members if that was not already done.
+    """
+
+    path = normpath(path)
+    archive = _archives.get(path)
+    if archive is None:
+        with _lock:
+            archive = _archives.get(path)
+            if archive is None:
+                archive = _archives[path] = ZipArchive(path)
+    return archive
+
+
+def close_archives():
+    """
+    Close all the opened archives.
+    """
+
+    with _lock:
+        while _archives:
+            _archives.popitem()[1].close()
+        _not_archives.clear()
+
+
+def split_archive(path, missing=False):
+    """
+    Return the ZipArchive that path lead into, along with the name of
+    the member within; (None, None) if path is not within an archive.
+    If the path is already known to be missing from the filesystem,
+    missing may be set to skip checking it again.
+    """
+
+    path = normpath(path)
+    for archive_path, archive in list(_archives.items()):
+        if path == archive_path:
+            return archive, ''
+        if path.startswith(archive_path + sep):
+            return archive, path[len(archive_path) + 1:].replace(sep, '/')
+
+    # find the closest ancestor that exist, which must be a zip file.
+    current = dirname(path) if missing else path
+    while current not in _not_archives and not _exists(current):
+        parent = dirname(current)
+        if parent == current:
+            return None, None
+        current = parent
+
+    if current in _not_archives:
+        return None, None
+    if not isfile(current) or not is_zipfile(current):
+        _not_archives.add(current)
+        return None, None
+    return open_archive(current), path[len(current) + 1:].replace(sep, '/')
+
+
+def exists(path):
+    if _exists(path):
+        return True
+    archive, name = split_archive(path, missing=True)
+    return archive is not None and (
+        name in archive.files or name in archive.dirs)
+
+
+def isdir(path):
+    if _isdir(path):
+        return True
+    archive, name = split_archive(path)
+    return archive is not None and name in archive.dirs
+
+
+def listdir(path):
+    try:
+        return _listdir(path)
+    except OSError:
+        archive, name = split_archive(path)
+        if archive is None or name not in archive.dirs:
+            raise
+    subdirs, files = archive.dirs[name]
+    return sorted(subdirs | files)
+
+
+def walk(path):
+    if _isdir(path):
+        return _walk(path)
+    archive, name = split_archive(path)
+    if archive is None or name not in archive.dirs:
+        return iter(())
+    return archive.walk(name)
+
+
+def stat(path):
+    """
+    Return the modification time and the size of the file at path; for
+    members of an archive the modification time of the archive is used,
+    and directories within have a size of 0.
+    """
+
+    try:
+        st = _stat(path)
+    except OSError:
+        archive, name = split_archive(path)
+        if archive is None:
+            raise
+        if name in archive.files:
+            return archive.mtime, archive.files[name].file_size
+        if name in archive.dirs:
+            return archive.mtime, 0
+        raise
+    return st.st_mtime, st.st_size
+
+
+def getmtime(path):
+    return stat(path)[0]
+
+
+def read_bytes(path):
+    try:
+        with open(path, 'rb') as fd:
+            return fd.read()
+    except (IOError, OSError):
+        archive, name = split_archive(path)
+        if archive is None or name not in archive.files:
+            raise
+    return archive.read(name)
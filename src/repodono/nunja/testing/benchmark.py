@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the repodono.nunja framework.
+
+The render suite may be run from the command line, with the results
+written out as json such that they may be kept as a baseline for later
+runs to be compared against::
+
+    python -m repodono.nunja.testing.benchmark run -o baseline.json
+    python -m repodono.nunja.testing.benchmark run -o current.json
+    python -m repodono.nunja.testing.benchmark compare \\
+        baseline.json current.json
+
+The compare command exits with a non-zero status if any of the cases
+got slower than the threshold.  The cases that are only found in one
+of the runs are listed as added or removed.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+from subprocess import check_output
+from subprocess import STDOUT
+from timeit import default_timer
+
+
+def _subprocess_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    return env
+
+
+def import_time(module, python=None):
+    """
+    Import the module in a fresh interpreter and return the cumulative
+    time in seconds that it took, as reported by ``-X importtime``.
+    """
+
+    output = check_output(
+        [python or sys.executable, '-X', 'importtime', '-c',
+            'import ' + module],
+        stderr=STDOUT, env=_subprocess_env(),
+    ).decode('utf-8')
+
+    for line in output.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1].strip()) / 1e6
+
+    raise ValueError('no import time reported for module %s' % module)
+
+
+def best_of(func, repeat=5):
+    """
+    Call func repeat times and return the shortest time taken in seconds.
+    """
+
+    results = []
+    for i in range(repeat):
+        start = default_timer()
+        func()
+        results.append(default_timer() - start)
+    return min(results)
+
+
+def execute_many_speedup(engine, mold_id, datasets, repeat=5):
+    """
+    Compare rendering the mold for every data in datasets through a loop
+    of ``Engine.execute`` calls against ``Engine.execute_many``.
+    """
+
+    def loop():
+        return [engine.execute(mold_id, data) for data in datasets]
+
+    def many():
+        return list(engine.execute_many(mold_id, datasets))
+
+    results = {
+        'execute': best_of(loop, repeat),
+        'execute_many': best_of(many, repeat),
+    }
+    results['speedup'] = results['execute'] / results['execute_many']
+    return results
+
+
+def parallel_scaling(registry, jobs, processes=None, chunksize=None):
+    """
+    Render all the jobs, which are (mold_id, data) tuples, through a
+    ParallelRenderer with each of the number of processes (default from
+    1 up to the number of CPUs), and return a list of dicts with the
+    time taken and the speedup relative to the first entry.
+
+    The startup of the pools is not included in the measurements.
+    """
+
+    from multiprocessing import cpu_count
+    from repodono.nunja.parallel import DEFAULT_CHUNKSIZE
+    from repodono.nunja.parallel import ParallelRenderer
+
+    jobs = list(jobs)
+    if processes is None:
+        processes = range(1, cpu_count() + 1)
+
+    results = []
+    for count in processes:
+        with ParallelRenderer(
+                registry, processes=count,
+                chunksize=chunksize or DEFAULT_CHUNKSIZE) as renderer:
+            # warm up the pool and the templates in its workers.
+            renderer.render(jobs[:count * renderer.chunksize])
+            start = default_timer()
+            renderer.render(jobs)
+            elapsed = default_timer() - start
+        results.append({
+            'processes': count,
+            'elapsed': elapsed,
+            'speedup': results[0]['elapsed'] / elapsed if results else 1.0,
+        })
+    return results
+
+
+# larger tables (e.g. 1000000 rows) may be selected through --rows.
+DEFAULT_ROWS = (10, 100, 1000, 10000, 100000)
+DEFAULT_NUMBER = 100
+# the total number of rows rendered for each case is capped to this, so
+# that the larger tables are rendered fewer times, but never fewer than
+# the minimum number of times such that the percentiles mean something.
+DEFAULT_ROW_BUDGET = 1000000
+DEFAULT_MIN_NUMBER = 5
+DEFAULT_THRESHOLD = 0.1
+PERCENTILES = (50, 90, 99)
+
+TABLE_MOLD_IDS = (
+    'repodono.nunja.molds/table',
+    'repodono.nunja.molds/navtable',
+)
+INCLUDE_MOLD_IDS = (
+    'repodono.nunja.testing.mold/include_by_name',
+    'repodono.nunja.testing.mold/include_by_value',
+)
+
+
+def percentile(samples, point):
+    """
+    Return the nearest rank percentile of the samples, which must be
+    sorted.
+    """
+
+    return samples[max(0, int(math.ceil(len(samples) * point / 100.0)) - 1)]
+
+
+def measure(func, number, setup=None):
+    """
+    Call func number times, with setup called before each untimed, and
+    return a dict with the throughput in calls per second along with
+    the mean, the percentiles and the maximum of the latencies.
+    """
+
+    samples = []
+    for i in range(number):
+        if setup is not None:
+            setup()
+        start = default_timer()
+        func()
+        samples.append(default_timer() - start)
+
+    total = sum(samples)
+    samples.sort()
+    results = {
+        'number': number,
+        'throughput': number / total if total else 0.0,
+        'mean': total / number,
+        'max': samples[-1],
+    }
+    for point in PERCENTILES:
+        results['p%d' % point] = percentile(samples, point)
+    return results
+
+
+def benchmark_registry():
+    """
+    Return a registry with the bundled molds and the testing molds, as
+    the bundled molds are not registered by default.
+    """
+
+    import repodono.nunja
+    import repodono.nunja.testing
+    from repodono.nunja.registry import Registry
+
+    registry = Registry('repodono.nunja.benchmark', {})
+    registry.register_module(repodono.nunja, subdir='molds')
+    registry.register_module(repodono.nunja.testing, subdir='mold')
+    return registry
+
+
+def table_data(rows):
+    """
+    Return the data for the table molds with the number of rows.
+    """
+
+    from repodono.nunja.testing.model import DummyTableData
+
+    return DummyTableData([
+        ['@id', ''],
+        ['name', 'Name'],
+        ['desc', 'Description'],
+        ['size', 'Size'],
+    ], [
+        ['http://example.com/%d' % i, 'item%d' % i, '<Item %d>' % i, str(i)]
+        for i in range(rows)
+    ]).to_jsonable()
+
+
+def itemlists_data(engine, lists=10, items=10):
+    """
+    Return the data for the include_by_name and include_by_value molds.
+    """
+
+    return {
+        'list_id': 'root_id',
+        'list_template': engine.load_mold(
+            'repodono.nunja.testing.mold/itemlist'),
+        'itemlists': [
+            ['list_%d' % i, ['Item %d' % j for j in range(items)]]
+            for i in range(lists)
+        ],
+    }
+
+
+def execute_cases(engine, mold_id, data, number):
+    """
+    Return the results of rendering the mold with the data with a warm
+    cache, and with a cold cache where the caches of the engine are
+    cleared before every render.
+    """
+
+    def execute():
+        engine.execute(mold_id, data)
+
+    # warm up the caches for the warm case.
+    execute()
+    return {
+        'cold': measure(execute, number, setup=engine.clear_cache),
+        'warm': measure(execute, number),
+    }
+
+
+def path_cases(registry, number):
+    """
+    Return the results of the path lookups of the registry with the
+    results cached, and with a cold cache where the registry is
+    invalidated before every lookup.
+    """
+
+    found = 'repodono.nunja.molds/table/template.jinja'
+    missing = 'repodono.nunja.molds/table/missing.jinja'
+
+    def lookup_path():
+        registry.lookup_path(found)
+
+    def lookup_missing():
+        registry.lookup_path(missing, None)
+
+    def verify_path():
+        registry.verify_path(found)
+
+    results = {
+        'lookup_path/cold': measure(
+            lookup_path, number, setup=registry.invalidate),
+        'verify_path/cold': measure(
+            verify_path, number, setup=registry.invalidate),
+    }
+    lookup_path()
+    lookup_missing()
+    results.update({
+        'lookup_path': measure(lookup_path, number),
+        'lookup_path/missing': measure(lookup_missing, number),
+        'verify_path': measure(verify_path, number),
+    })
+    return results
+
+
+def run_suite(rows=DEFAULT_ROWS, number=DEFAULT_NUMBER,
+              row_budget=DEFAULT_ROW_BUDGET, min_number=DEFAULT_MIN_NUMBER):
+    """
+    Run the render suite and return the results, which are keyed by
+    the name of each case, along with the environment it was run in.
+    """
+
+    import jinja2
+    from repodono.nunja.engine import Engine
+
+    registry = benchmark_registry()
+    engine = Engine(registry)
+    results = {}
+
+    for mold_id in TABLE_MOLD_IDS:
+        for count in rows:
+            data = table_data(count)
+            cases = execute_cases(
+                engine, mold_id, data, max(
+                    1, min(number, min_number),
+                    min(number, row_budget // max(count, 1)),
+                ),
+            )
+            for cache, result in cases.items():
+                results['execute/%s/rows=%d/%s' % (
+                    mold_id, count, cache)] = result
+
+    data = itemlists_data(engine)
+    for mold_id in INCLUDE_MOLD_IDS:
+        for cache, result in execute_cases(
+                engine, mold_id, data, number).items():
+            results['execute/%s/%s' % (mold_id, cache)] = result
+
+    # a registry of its own, such that invalidating it for the cold
+    # lookups does not also clear the caches of the engine.
+    for name, result in path_cases(
+            benchmark_registry(), number * 100).items():
+        results['registry/' + name] = result
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'jinja2': jinja2.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, metric='p50'):
+    """
+    Compare the results of two runs of the suite, and return a sorted
+    list of (name, baseline, current, ratio) for the metric of every
+    case found in both.
+    """
+
+    baseline = baseline['results']
+    current = current['results']
+    report = []
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name][metric]
+        after = current[name][metric]
+        ratio = after / before if before else 1.0
+        report.append((name, before, after, ratio))
+    return report
+
+
+def unmatched(baseline, current):
+    """
+    Return the sorted lists of the names of the cases that were added
+    in the current run, and of those removed since the baseline.
+    """
+
+    baseline = set(baseline['results'])
+    current = set(current['results'])
+    return sorted(current - baseline), sorted(baseline - current)
+
+
+def regressions(report, threshold=DEFAULT_THRESHOLD):
+    """
+    Return the entries of the report that got slower than the threshold.
+    """
+
+    return [entry for entry in report if entry[3] > 1 + threshold]
+
+
+def main(argv=None, stdout=sys.stdout):
+    parser = argparse.ArgumentParser(
+        prog='repodono.nunja.testing.benchmark',
+        description='render benchmark suite for repodono.nunja',
+    )
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help='run the suite')
+    run.add_argument(
+        '-o', '--output', help='write the json results to this file')
+    run.add_argument(
+        '--rows', type=int, nargs='+', default=list(DEFAULT_ROWS),
+        help='row counts for the table molds')
+    run.add_argument(
+        '--max-rows', type=int, default=None,
+        help='skip the row counts above this')
+    run.add_argument(
+        '-n', '--number', type=int, default=DEFAULT_NUMBER,
+        help='renders for every case')
+
+    cmp_ = commands.add_parser(
+        'compare', help='compare results against a baseline')
+    cmp_.add_argument('baseline', help='json results of the baseline')
+    cmp_.add_argument('current', help='json results to be compared')
+    cmp_.add_argument(
+        '-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='the relative slowdown that is a regression')
+    cmp_.add_argument(
+        '-m', '--metric', default='p50',
+        help='the latency metric to compare')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        rows = [r for r in args.rows
+                if args.max_rows is None or r <= args.max_rows]
+        results = json.dumps(
+            run_suite(rows=rows, number=args.number),
+            indent=2, sort_keys=True,
+        )
+        if args.output:
+            with open(args.output, 'w') as fd:
+                fd.write(results)
+        else:
+            stdout.write(results + '\n')
+        return 0
+
+    if args.command == 'compare':
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)
+        with open(args.current) as fd:
+            current = json.load(fd)
+        report = compare(baseline, current, args.metric)
+        failed = regressions(report, args.threshold)
+        for entry in report:
+            stdout.write('%-64s %10.6f %10.6f %6.2fx%s\n' % (
+                entry + (' REGRESSION' if entry in failed else '',)))
+        added, removed = unmatched(baseline, current)
+        for label, names in (('ADDED', added), ('REMOVED', removed)):
+            for name in names:
+                stdout.write('%-64s %s\n' % (name, label))
+        return 1 if failed else 0
+
+    parser.print_help(stdout)
+    return 2
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the asyncio support, which requires Python 3.5 or later.
+"""
+
+import asyncio
+from timeit import default_timer
+
+
+async def _ticker(interval, lags, done):
+    while not done.is_set():
+        start = default_timer()
+        await asyncio.sleep(interval)
+        lags.append(default_timer() - start - interval)
+
+
+async def _loop_latency(render, jobs, concurrency, interval):
+    lags = []
+    done = asyncio.Event()
+    ticker = asyncio.ensure_future(_ticker(interval, lags, done))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await render(*job)
+
+    start = default_timer()
+    await asyncio.gather(*(run(job) for job in jobs))
+    elapsed = default_timer() - start
+    done.set()
+    await ticker
+
+    lags = sorted(lags) or [0.0]
+    return {
+        'elapsed': elapsed,
+        'ticks': len(lags),
+        'lag_mean': sum(lags) / len(lags),
+        'lag_p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+        'lag_max': lags[-1],
+    }
+
+
+def loop_latency(engine, jobs, concurrency=16, interval=0.001):
+    """
+    Render all the jobs, which are (mold_id, data) tuples, with up to
+    concurrency renders in flight through ``engine.execute_async``, and
+    report how late a ticker that sleeps for the interval was woken up
+    by the event loop while the renders were in progress.
+
+    If the engine is not an ``AsyncEngine``, the blocking ``execute``
+    will be called from within the coroutines instead, as a baseline.
+    """
+
+    execute_async = getattr(engine, 'execute_async', None)
+    if execute_async is None:
+        async def execute_async(mold_id, data):
+            return engine.execute(mold_id, data)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_loop_latency(
+            execute_async, jobs, concurrency, interval))
+    finally:
+        loop.close()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import unittest
+import sys
+
+import repodono.nunja.testing
+from repodono.nunja.registry import Registry
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from repodono.nunja.aio import AsyncEngine
+    from repodono.nunja.aio import referenced_templates
+    from repodono.nunja.testing.benchmark_aio import loop_latency
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "py3.5 async/await")
+class AsyncEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry(__name__, {})
+        self.registry.register_module(repodono.nunja.testing, subdir='mold')
+        self.engine = AsyncEngine(self.registry)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_execute_async(self):
+        result = self.run_async(self.engine.execute_async(
+            'repodono.nunja.testing.mold/basic',
+            data={'value': 'Hello World!'}))
+        self.assertEqual(
+            result,
+            '<div data-nunja="repodono.nunja.testing.mold/basic">\n'
+            '<span>Hello World!</span>\n'
+            '</div>'
+        )
+        # from the cache
+        self.run_async(self.engine.execute_async(
+            'repodono.nunja.testing.mold/basic', data={'value': ''}))
+        self.assertEqual(self.engine.cache_stats()['hits'], 1)
+
+    def test_execute_async_generator(self):
+        async def items(*values):
+            for value in values:
+                await asyncio.sleep(0)
+                yield value
+
+        async def itemlists():
+            yield ['list_1', items('Item 1', 'Item 2')]
+            yield ['list_2', items('Item 3')]
+
+        result = self.run_async(self.engine.execute_async(
+            'repodono.nunja.testing.mold/include_by_name', data={
+                'list_id': 'root_id',
+                'itemlists': itemlists(),
+            }))
+
+        self.assertEqual(
+            result,
+            '<div data-nunja="repodono.nunja.testing.mold/include_by_name">\n'
+            '<dl id="root_id">\n\n'
+            '  <dt>list_1</dt>\n'
+            '  <dd><ul id="list_1">\n\n'
+            '  <li>Item 1</li>\n'
+            '  <li>Item 2</li>\n'
+            '</ul></dd>\n'
+            '  <dt>list_2</dt>\n'
+            '  <dd><ul id="list_2">\n\n'
+            '  <li>Item 3</li>\n'
+            '</ul></dd>\n'
+            '</dl>\n'
+            '</div>'
+        )
+
+    def test_load_mold_tree(self):
+        self.engine.load_mold_tree(
+            'repodono.nunja.testing.mold/include_by_name')
+        # the included template was loaded too.
+        names = [key[1] for key in self.engine.env.cache.keys()]
+        self.assertIn(
+            'repodono.nunja.testing.mold/itemlist/template.jinja', names)
+
+    def test_load_mold_tree_reads_once(self):
+        loader = self.engine.env.loader
+        sources = []
+        get_source = loader.get_source
+
+        def recording_get_source(environment, template):
+            sources.append(template)
+            return get_source(environment, template)
+
+        loader.get_source = recording_get_source
+        self.engine.load_mold_tree(
+            'repodono.nunja.testing.mold/include_by_name')
+        self.assertEqual(sorted(sources), [
+            'repodono.nunja.testing.mold/include_by_name/template.jinja',
+            'repodono.nunja.testing.mold/itemlist/template.jinja',
+        ])
+
+    def test_referenced_templates(self):
+        template = self.engine.load_mold(
+            'repodono.nunja.testing.mold/include_by_name')
+        self.assertEqual(referenced_templates(template), set([
+            'repodono.nunja.testing.mold/itemlist/template.jinja']))
+        template = self.engine.load_mold(
+            'repodono.nunja.testing.mold/include_by_value')
+        self.assertEqual(referenced_templates(template), set())
+
+    def test_cache_stats_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(
+                lambda i: self.engine.get_mold(
+                    'repodono.nunja.testing.mold/basic'), range(400)))
+        stats = self.engine.cache_stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 400)
+
+    def test_frozen_no_executor(self):
+        engine = AsyncEngine(self.registry, frozen=True)
+        self.run_async(engine.execute_async(
+            'repodono.nunja.testing.mold/basic', data={'value': ''}))
+        # a frozen cached mold is returned without awaiting on anything.
+        coro = engine.get_mold_async('repodono.nunja.testing.mold/basic')
+        with self.assertRaises(StopIteration):
+            coro.send(None)
+
+    def test_loop_latency(self):
+        jobs = [
+            ('repodono.nunja.testing.mold/basic', {'value': str(i)})
+            for i in range(20)
+        ]
+        result = loop_latency(self.engine, jobs, concurrency=4)
+        self.assertEqual(
+            sorted(result),
+            ['elapsed', 'lag_max', 'lag_mean', 'lag_p99', 'ticks'])
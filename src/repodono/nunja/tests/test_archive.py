@@ -0,0 +1,91 @@
+import unittest
+from os import mkdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from jinja2 import TemplateNotFound
+
+from repodono.nunja.archive import ArchiveLoader
+from repodono.nunja.archive import MoldArchive
+from repodono.nunja.archive import pack_molds
+from repodono.nunja.engine import Engine
+from repodono.nunja.exc import ArchiveError
+from repodono.nunja.registry import Registry
+
+
+class MoldArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        molddir = join(self.tempdir, 'mold')
+        mkdir(molddir)
+        mkdir(join(molddir, 'sub'))
+        with open(join(molddir, 'template.jinja'), 'w') as fd:
+            fd.write('<div>{% include "tmp/mold/sub/item.jinja" %}</div>')
+        with open(join(molddir, 'sub', 'item.jinja'), 'w') as fd:
+            fd.write('<span>{{ data }}</span>')
+        with open(join(molddir, 'readme.txt'), 'w') as fd:
+            fd.write('not a template')
+        self.registry = Registry('tmp', {})
+        self.registry.register_mold(molddir, 'tmp/mold')
+        self.target = join(self.tempdir, 'molds.pack')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_pack_and_read(self):
+        index = pack_molds(self.registry, self.target)
+        self.assertEqual(index['molds']['tmp/mold'], [
+            'sub/item.jinja', 'template.jinja'])
+        archive = MoldArchive(self.target)
+        self.assertEqual(archive.registry_name, 'tmp')
+        self.assertEqual(sorted(archive.entries), [
+            '_core_/_default_wrapper_/template.jinja',
+            'tmp/mold/sub/item.jinja',
+            'tmp/mold/template.jinja',
+        ])
+        self.assertIn('tmp/mold/template.jinja', archive)
+        self.assertNotIn('tmp/mold/readme.txt', archive)
+        self.assertEqual(
+            archive.read('tmp/mold/sub/item.jinja'),
+            b'<span>{{ data }}</span>')
+        archive.close()
+
+    def test_engine(self):
+        pack_molds(self.registry, self.target)
+        # the source directories are no longer needed.
+        rmtree(join(self.tempdir, 'mold'))
+        loader = ArchiveLoader(self.target)
+        engine = Engine(Registry('empty', {}), loader=loader)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n'
+            '<div><span>Hello</span></div>\n</div>'
+        )
+        self.assertEqual(len(loader.list_templates()), 3)
+        with self.assertRaises(TemplateNotFound):
+            engine.load_mold('tmp/nothing')
+
+    def test_integrity(self):
+        pack_molds(self.registry, self.target)
+        with open(self.target, 'rb') as fd:
+            contents = fd.read()
+        with open(self.target, 'wb') as fd:
+            # corrupt the last entry.
+            fd.write(contents[:-1] + b'?')
+        archive = MoldArchive(self.target)
+        last = max(archive.entries, key=lambda n: archive.entries[n][0])
+        with self.assertRaises(ArchiveError):
+            archive.read(last)
+        archive.close()
+
+    def test_not_archive(self):
+        with open(self.target, 'wb') as fd:
+            fd.write(b'not an archive at all')
+        with self.assertRaises(ArchiveError):
+            MoldArchive(self.target)
+        with open(self.target, 'wb') as fd:
+            pass
+        with self.assertRaises(ArchiveError):
+            MoldArchive(self.target)
@@ -0,0 +1,212 @@
+import unittest
+from os import listdir
+from os import mkdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from jinja2 import Environment
+
+from repodono.nunja.cache import NunjaBytecodeCache
+from repodono.nunja.cache import SourceCache
+from repodono.nunja.engine import Engine
+from repodono.nunja.loader import NunjaLoader
+from repodono.nunja.registry import Registry
+
+
+class NunjaBytecodeCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.cachedir = join(self.tempdir, 'cache')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def make_mold(self, root, contents):
+        molddir = join(self.tempdir, root, 'mold')
+        mkdir(join(self.tempdir, root))
+        mkdir(molddir)
+        with open(join(molddir, 'template.jinja'), 'w') as fd:
+            fd.write(contents)
+        registry = Registry(root, {})
+        registry.register_mold(molddir, 'tmp/mold')
+        return registry
+
+    def cache_entries(self):
+        return sorted(
+            name for name in listdir(self.cachedir)
+            if not name.endswith('.tmp')
+        )
+
+    def test_cache_key(self):
+        cache = NunjaBytecodeCache(self.cachedir)
+        name = 'tmp/mold/template.jinja'
+        self.assertEqual(
+            cache.get_cache_key(name, '/a/template.jinja'),
+            cache.get_cache_key(name, '/a/template.jinja'),
+        )
+        self.assertNotEqual(
+            cache.get_cache_key(name, '/a/template.jinja'),
+            cache.get_cache_key(name, '/b/template.jinja'),
+        )
+
+    def test_persisted_across_engines(self):
+        registry = self.make_mold('r1', '<span>{{ data }}</span>')
+        engine = Engine(registry, fuse=True, bytecode_cache=NunjaBytecodeCache(
+            self.cachedir))
+        engine.execute('tmp/mold', data={'data': 'Hello'})
+        # wrapper, the mold and the fused template for it.
+        entries = self.cache_entries()
+        self.assertEqual(len(entries), 3)
+
+        engine = Engine(registry, fuse=True, bytecode_cache=NunjaBytecodeCache(
+            self.cachedir))
+        compiled = []
+        compile_ = engine.env.compile
+
+        def recording_compile(source, name=None, *a, **kw):
+            compiled.append(name)
+            return compile_(source, name, *a, **kw)
+
+        engine.env.compile = recording_compile
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        self.assertEqual(self.cache_entries(), entries)
+        # nothing, including the fused template, was compiled again.
+        self.assertEqual(compiled, [])
+
+    def test_mold_id_remapped(self):
+        r1 = self.make_mold('r1', '<span>{{ data }}</span>')
+        r2 = self.make_mold('r2', '<p>{{ data }}</p>')
+        e1 = Engine(r1, fuse=True, bytecode_cache=NunjaBytecodeCache(
+            self.cachedir))
+        e2 = Engine(r2, fuse=True, bytecode_cache=NunjaBytecodeCache(
+            self.cachedir))
+        self.assertEqual(
+            e1.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        self.assertEqual(
+            e2.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<p>Hello</p>\n</div>'
+        )
+        # one for each of the mold templates and for their fused
+        # templates, the wrapper is shared.
+        self.assertEqual(len(self.cache_entries()), 5)
+
+    def test_corrupted_entry(self):
+        registry = self.make_mold('r1', '<span>{{ data }}</span>')
+        engine = Engine(registry, bytecode_cache=NunjaBytecodeCache(
+            self.cachedir))
+        engine.execute('tmp/mold', data={'data': 'Hello'})
+
+        for name in self.cache_entries():
+            with open(join(self.cachedir, name), 'rb') as fd:
+                contents = fd.read()
+            with open(join(self.cachedir, name), 'wb') as fd:
+                fd.write(contents[:len(contents) // 2])
+
+        engine = Engine(registry, bytecode_cache=NunjaBytecodeCache(
+            self.cachedir))
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+
+
+class SourceCacheTestCase(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = SourceCache(10)
+        self.assertIsNone(cache.get('/a', 1, 3))
+        cache.put('/a', 1, 3, u'abc')
+        self.assertEqual(cache.get('/a', 1, 3), u'abc')
+        # changed mtime or size is a miss.
+        self.assertIsNone(cache.get('/a', 2, 3))
+        self.assertIsNone(cache.get('/a', 1, 4))
+        self.assertEqual(cache.stats, {
+            'hits': 1, 'misses': 3, 'evictions': 0})
+
+    def test_eviction(self):
+        cache = SourceCache(10)
+        cache.put('/a', 1, 4, u'aaaa')
+        cache.put('/b', 1, 4, u'bbbb')
+        # use /a, so /b becomes the least recently used.
+        cache.get('/a', 1, 4)
+        cache.put('/c', 1, 4, u'cccc')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 8)
+        self.assertIsNone(cache.get('/b', 1, 4))
+        self.assertEqual(cache.get('/a', 1, 4), u'aaaa')
+        self.assertEqual(cache.stats['evictions'], 1)
+
+        # too large to be cached at all.
+        cache.put('/d', 1, 11, u'd' * 11)
+        self.assertIsNone(cache.get('/d', 1, 11))
+        self.assertEqual(len(cache), 2)
+
+        # replacing an entry does not count it twice.
+        cache.put('/a', 2, 2, u'aa')
+        self.assertEqual(cache.size, 6)
+
+    def test_invalidate(self):
+        cache = SourceCache(10)
+        cache.put('/a', 1, 4, u'aaaa')
+        cache.put('/b', 1, 4, u'bbbb')
+        cache.invalidate('/a')
+        self.assertEqual(cache.size, 4)
+        cache.invalidate()
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(len(cache), 0)
+
+
+class LoaderSourceCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        molddir = join(self.tempdir, 'mold')
+        mkdir(molddir)
+        self.template = join(molddir, 'template.jinja')
+        with open(self.template, 'w') as fd:
+            fd.write('<span>{{ data }}</span>')
+        self.registry = Registry('tmp', {})
+        self.registry.register_mold(molddir, 'tmp/mold')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_environment_cache_churn(self):
+        loader = NunjaLoader(self.registry)
+        env = Environment(loader=loader, cache_size=0)
+        for i in range(3):
+            self.assertEqual(
+                env.get_template('tmp/mold/template.jinja').render(
+                    data='Hello'),
+                '<span>Hello</span>',
+            )
+        self.assertEqual(loader.source_cache.stats, {
+            'hits': 2, 'misses': 1, 'evictions': 0})
+
+    def test_modified(self):
+        loader = NunjaLoader(self.registry)
+        env = Environment(loader=loader, cache_size=0)
+        env.get_template('tmp/mold/template.jinja')
+        with open(self.template, 'w') as fd:
+            fd.write('<p>{{ data }}</p>')
+        self.assertEqual(
+            env.get_template('tmp/mold/template.jinja').render(data='Hi'),
+            '<p>Hi</p>',
+        )
+        self.assertEqual(loader.source_cache.stats['misses'], 2)
+
+    def test_disabled(self):
+        loader = NunjaLoader(self.registry, source_cache_size=0)
+        self.assertIsNone(loader.source_cache)
+        env = Environment(loader=loader, cache_size=0)
+        self.assertEqual(
+            env.get_template('tmp/mold/template.jinja').render(data='Hi'),
+            '<span>Hi</span>',
+        )
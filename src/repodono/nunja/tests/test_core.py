@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import unittest
+import os
+import sys
 from os.path import join
+from subprocess import check_output
 from os.path import dirname
 
 from repodono.nunja.core import engine
@@ -71,3 +74,19 @@ class DefaultCoreEngineTestCase(unittest.TestCase):
             '</table>\n'
             '</div>'
         )
+
+
+class DefaultCoreImportTestCase(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        script = (
+            'import repodono.nunja.core as core\n'
+            'from repodono.nunja.registry import registry\n'
+            'from repodono.nunja.utils import is_initialized\n'
+            'print(is_initialized(core.engine), is_initialized(registry))\n'
+        )
+        output = check_output(
+            [sys.executable, '-c', script],
+            env={'PYTHONPATH': os.pathsep.join(p for p in sys.path if p)},
+        )
+        self.assertEqual(output.decode('utf-8').strip(), 'False False')
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import sys
+from os import mkdir
+from os import utime
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from repodono.nunja import discovery
+from repodono.nunja.discovery import EntryPoint
+from repodono.nunja.registry import ENTRY_POINT_NAME
+from repodono.nunja.registry import create_default_registry
+
+entry_points_txt = """\
+[repodono.nunja.mold]
+repodono.nunja.testmold = repodono.nunja.testing:mold
+"""
+
+
+class EntryPointTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        ep = EntryPoint.parse(
+            'repodono.nunja.testmold', 'repodono.nunja.testing:mold')
+        self.assertEqual(ep.name, 'repodono.nunja.testmold')
+        self.assertEqual(ep.module_name, 'repodono.nunja.testing')
+        self.assertEqual(ep.attrs, ('mold',))
+        self.assertEqual(ep.value, 'repodono.nunja.testing:mold')
+        self.assertEqual(ep, EntryPoint(
+            'repodono.nunja.testmold', 'repodono.nunja.testing', ['mold']))
+
+    def test_parse_extras_and_no_attrs(self):
+        ep = EntryPoint.parse('name', ' some.module [extra] ')
+        self.assertEqual(ep.module_name, 'some.module')
+        self.assertEqual(ep.attrs, ())
+        self.assertEqual(ep.value, 'some.module')
+
+
+class DiscoveryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.sitedir = join(self.tempdir, 'site')
+        self.index_file = join(self.tempdir, 'index.json')
+        mkdir(self.sitedir)
+        distinfo = join(self.sitedir, 'dummy_molds-1.0.dist-info')
+        mkdir(distinfo)
+        with open(join(distinfo, 'METADATA'), 'w') as fd:
+            fd.write('Metadata-Version: 2.1\nName: dummy-molds\n'
+                     'Version: 1.0\n')
+        self.entry_points_txt = join(distinfo, 'entry_points.txt')
+        with open(self.entry_points_txt, 'w') as fd:
+            fd.write(entry_points_txt)
+        utime(self.entry_points_txt, (1, 1))
+        sys.path.insert(0, self.sitedir)
+
+    def tearDown(self):
+        sys.path.remove(self.sitedir)
+        rmtree(self.tempdir)
+
+    def test_load_entry_points(self):
+        results = discovery.load_entry_points(ENTRY_POINT_NAME)
+        self.assertEqual(
+            results['repodono.nunja.testmold'].value,
+            'repodono.nunja.testing:mold',
+        )
+
+    def test_metadata_key(self):
+        key = discovery.metadata_key([self.sitedir])
+        self.assertEqual(key, discovery.metadata_key([self.sitedir]))
+        utime(self.entry_points_txt, (2, 2))
+        self.assertNotEqual(key, discovery.metadata_key([self.sitedir]))
+
+    def test_load_entry_points_index(self):
+        results = discovery.load_entry_points(
+            ENTRY_POINT_NAME, self.index_file)
+        with open(self.index_file) as fd:
+            index = json.load(fd)
+        self.assertEqual(
+            index['groups'][ENTRY_POINT_NAME]['repodono.nunja.testmold'],
+            'repodono.nunja.testing:mold',
+        )
+
+        # index is now used, as demonstrated by modifying its contents
+        index['groups'][ENTRY_POINT_NAME]['other'] = 'some.module:molds'
+        with open(self.index_file, 'w') as fd:
+            json.dump(index, fd)
+        indexed = discovery.load_entry_points(
+            ENTRY_POINT_NAME, self.index_file)
+        self.assertEqual(indexed['other'].module_name, 'some.module')
+        self.assertEqual(
+            indexed['repodono.nunja.testmold'],
+            results['repodono.nunja.testmold'],
+        )
+
+        # until the installed metadata is changed.
+        utime(self.entry_points_txt, (2, 2))
+        refreshed = discovery.load_entry_points(
+            ENTRY_POINT_NAME, self.index_file)
+        self.assertNotIn('other', refreshed)
+
+    def test_load_entry_points_index_invalid(self):
+        for contents in ('[]', '{"groups": []}', 'null', '{', (
+                '{"key": null, "groups": {"%s": []}}' % ENTRY_POINT_NAME)):
+            with open(self.index_file, 'w') as fd:
+                fd.write(contents)
+            results = discovery.load_entry_points(
+                ENTRY_POINT_NAME, self.index_file)
+            self.assertIn('repodono.nunja.testmold', results)
+            # the stale index was rewritten.
+            with open(self.index_file) as fd:
+                index = json.load(fd)
+            self.assertIn(ENTRY_POINT_NAME, index['groups'])
+
+        # a current key with a group that is not in the expected form.
+        index['groups'][ENTRY_POINT_NAME] = []
+        with open(self.index_file, 'w') as fd:
+            json.dump(index, fd)
+        results = discovery.load_entry_points(
+            ENTRY_POINT_NAME, self.index_file)
+        self.assertIn('repodono.nunja.testmold', results)
+
+    def test_load_entry_points_index_unwritable(self):
+        index_file = join(self.tempdir, 'no', 'such', 'index.json')
+        results = discovery.load_entry_points(ENTRY_POINT_NAME, index_file)
+        self.assertIn('repodono.nunja.testmold', results)
+
+    def test_create_default_registry(self):
+        registry = create_default_registry(__name__, self.index_file)
+        path = registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.assertTrue(path.endswith(join('testing', 'mold', 'basic')))
@@ -0,0 +1,253 @@
+import sys
+import traceback
+import unittest
+from os.path import join
+from os import mkdir
+from os import remove
+from os import utime
+from tempfile import mkdtemp
+from shutil import rmtree
+
+import repodono.nunja
+import repodono.nunja.testing
+from repodono.nunja.engine import Engine
+from repodono.nunja.registry import Registry
+from repodono.nunja.testing import model
+
+
+class EngineMoldCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry(__name__, {})
+        self.tempdir = mkdtemp()
+        self.molddir = join(self.tempdir, 'mold')
+        mkdir(self.molddir)
+        self.main_template = join(self.molddir, 'template.jinja')
+
+        with open(self.main_template, 'w') as fd:
+            fd.write('<span>{{ data }}</span>')
+
+        # force the mtime to some time way in the past
+        utime(self.main_template, (-1, 1))
+        self.registry.register_mold(self.molddir, 'tmp/mold')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_mold_cache_stats(self):
+        engine = Engine(self.registry)
+        self.assertEqual(engine.cache_stats()['hit_rate'], 0.0)
+        engine.execute('tmp/mold', data={'data': 1})
+        engine.execute('tmp/mold', data={'data': 2})
+        engine.execute('tmp/mold', data={'data': 3})
+        stats = engine.cache_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2.0 / 3)
+        self.assertTrue(stats['lookup_time'] >= 0)
+
+    def test_mold_cache_development_revalidates(self):
+        engine = Engine(self.registry)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+
+        with open(self.main_template, 'w') as fd:
+            fd.write('<p>{{ data }}</p>')
+
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<p>Hello</p>\n</div>'
+        )
+        self.assertEqual(engine.cache_stats()['misses'], 2)
+
+    def test_mold_cache_frozen_no_filesystem_access(self):
+        engine = Engine(self.registry, frozen=True)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+
+        # Neither modifications nor the complete removal of the source
+        # will be noticed, as the frozen engine never looks again.
+        remove(self.main_template)
+        rmtree(self.molddir)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        self.assertEqual(engine.cache_stats()['hits'], 1)
+
+    def test_mold_cache_clear(self):
+        engine = Engine(self.registry, frozen=True)
+        engine.execute('tmp/mold', data={'data': 'Hello'})
+
+        with open(self.main_template, 'w') as fd:
+            fd.write('<p>{{ data }}</p>')
+
+        engine.clear_cache()
+        self.assertEqual(engine.cache_stats()['size'], 0)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<p>Hello</p>\n</div>'
+        )
+
+
+class EngineFusedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry(__name__, {})
+        self.registry.register_module(repodono.nunja, subdir='molds')
+        self.registry.register_module(repodono.nunja.testing, subdir='mold')
+        self.tempdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def make_mold(self, name, contents):
+        molddir = join(self.tempdir, name)
+        mkdir(molddir)
+        with open(join(molddir, 'template.jinja'), 'w') as fd:
+            fd.write(contents)
+        utime(join(molddir, 'template.jinja'), (-1, 1))
+        self.registry.register_mold(molddir, 'tmp/' + name)
+        return join(molddir, 'template.jinja')
+
+    def test_fused_matches_include(self):
+        fused = Engine(self.registry, fuse=True)
+        dynamic = Engine(self.registry, fuse=False)
+        table = model.DummyTableData([
+            ['@id', ''],
+            ['name', 'Name'],
+        ], [
+            ['http://example.com/1', '<One>'],
+            ['http://example.com/2', 'Two'],
+        ]).to_jsonable()
+        itemlists = {
+            'list_id': 'root_id',
+            'list_template': fused.load_mold(
+                'repodono.nunja.testing.mold/itemlist'),
+            'itemlists': [['list_1', ['Item 1', 'Item 2']]],
+        }
+        jobs = [
+            ('repodono.nunja.molds/table', table),
+            ('repodono.nunja.molds/navtable', table),
+            ('repodono.nunja.testing.mold/basic', {'value': '<xss>'}),
+            ('repodono.nunja.testing.mold/include_by_name', itemlists),
+            ('repodono.nunja.testing.mold/include_by_value', itemlists),
+        ]
+        for mold_id, data in jobs:
+            for tag in ('div', 'section'):
+                self.assertEqual(
+                    fused.execute(mold_id, data, wrapper_tag=tag),
+                    dynamic.execute(mold_id, data, wrapper_tag=tag),
+                )
+        # one for each mold, shared by the wrapper tags.
+        self.assertEqual(len(fused._fused_cache), 5)
+        self.assertEqual(len(dynamic._fused_cache), 0)
+        fused.clear_cache()
+        self.assertEqual(len(fused._fused_cache), 0)
+
+    def test_fused_template_reused(self):
+        engine = Engine(self.registry, fuse=True)
+        mold_id = 'repodono.nunja.testing.mold/basic'
+        template = engine.get_mold(mold_id)
+        fused = engine.get_fused(mold_id, template, 'div')
+        self.assertIsNot(fused, engine._core_template_)
+        self.assertIs(engine.get_fused(mold_id, template, 'div'), fused)
+        self.assertIs(engine.get_fused(mold_id, template, 'p'), fused)
+        # loaded through the environment under its fused name.
+        self.assertIs(engine.env.get_template(
+            '_nunja_fused_/' + template.name), fused)
+        self.assertEqual(
+            fused.render(engine._execute_kwargs(
+                mold_id, template, {'value': 'Hi'}, 'p')),
+            '<p data-nunja="repodono.nunja.testing.mold/basic">\n'
+            '<span>Hi</span>\n'
+            '</p>'
+        )
+
+    def test_fused_reloaded(self):
+        path = self.make_mold('mold', '<span>{{ data }}</span>\n')
+        engine = Engine(self.registry, fuse=True)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        with open(path, 'w') as fd:
+            fd.write('<p>{{ data }}</p>\n\n')
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<p>Hello</p>\n\n</div>'
+        )
+
+    def test_fused_wrapper_data(self):
+        self.make_mold('wrapper', (
+            '<{{ _wrapper_tag_ }} title="{{ title }}">'
+            '{%- include _template_ -%}'
+            '</{{ _wrapper_tag_ }}>\n'
+        ))
+        self.make_mold('mold', (
+            '{% set title = "inner" %}\n<b>{{ title }}</b>\n'))
+        fused = Engine(
+            self.registry, _wrapper_name='tmp/wrapper', fuse=True)
+        dynamic = Engine(
+            self.registry, _wrapper_name='tmp/wrapper', fuse=False)
+        result = fused.execute('tmp/mold', data={'title': 'Hello'})
+        self.assertEqual(
+            result, '<div title="Hello">\n<b>inner</b></div>')
+        self.assertEqual(
+            result, dynamic.execute('tmp/mold', data={'title': 'Hello'}))
+        self.assertIsNot(fused.get_fused(
+            'tmp/mold', fused.get_mold('tmp/mold'), 'div'),
+            fused._core_template_)
+
+    def test_fused_wrapper_not_fusable(self):
+        self.make_mold('wrapper', (
+            '{% include _template_ without context %}'))
+        self.make_mold('mold', '<b>{{ title }}</b>')
+        engine = Engine(
+            self.registry, _wrapper_name='tmp/wrapper', fuse=True)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'title': 'Hello'}),
+            '<b></b>')
+        self.assertIs(engine.get_fused(
+            'tmp/mold', engine.get_mold('tmp/mold'), 'div'),
+            engine._core_template_)
+
+    def test_fuse_default(self):
+        self.assertFalse(Engine(self.registry).fuse)
+        self.assertTrue(Engine(self.registry, frozen=True).fuse)
+        self.assertFalse(Engine(self.registry, frozen=True, fuse=False).fuse)
+
+    def test_not_fused_error_line(self):
+        path = self.make_mold('error', '<b>\n</b>\n{{ data.missing() }}\n')
+        engine = Engine(self.registry)
+        try:
+            engine.execute('tmp/error', data={'data': {}})
+        except Exception:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        else:
+            self.fail('the mold should have failed to render')
+        # reported against the mold template and its own line.
+        self.assertEqual(
+            [frame[1] for frame in frames if frame[0] == path], [3])
+
+    def test_fused_extends_fallback(self):
+        self.make_mold('base', '<b>{% block body %}{% endblock %}</b>')
+        self.make_mold('child', (
+            '{% extends "tmp/base/template.jinja" %}'
+            '{% block body %}{{ data }}{% endblock %}'
+        ))
+        engine = Engine(self.registry, fuse=True)
+        self.assertEqual(
+            engine.execute('tmp/child', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/child">\n<b>Hello</b>\n</div>'
+        )
+        template = engine.get_mold('tmp/child')
+        self.assertIs(
+            engine.get_fused('tmp/child', template, 'div'),
+            engine._core_template_,
+        )
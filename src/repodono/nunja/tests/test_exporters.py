@@ -0,0 +1,124 @@
+import unittest
+import json
+import re
+from os import listdir
+from os.path import exists
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from repodono.nunja import exporters
+from repodono.nunja import utils
+from repodono.nunja.registry import Registry
+
+import repodono.nunja.testing
+
+
+class FingerprintTestCase(unittest.TestCase):
+
+    def test_fingerprinted_name(self):
+        name = exporters.fingerprinted_name('a/template.jinja', b'abc')
+        self.assertEqual(name, 'a/template.%s.jinja' % (
+            exporters.fingerprint(b'abc')))
+        self.assertEqual(len(exporters.fingerprint(b'abc')), 16)
+        self.assertNotEqual(
+            name, exporters.fingerprinted_name('a/template.jinja', b'abd'))
+
+
+class ExportFingerprintedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.target = join(self.tempdir, 'export')
+        self.registry = Registry('tmp', {})
+        self.registry.register_module(
+            repodono.nunja.testing, subdir='mold')
+        self.bundle = join(self.tempdir, 'bundle.js')
+        with open(self.bundle, 'w') as fd:
+            fd.write('var bundle;\n')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_export(self):
+        manifest = exporters.export_fingerprinted(
+            self.target, base_url='https://cdn.example.com/nunja/',
+            bundles={'repodono.nunja': self.bundle}, registry=self.registry,
+        )
+        with open(join(self.target, exporters.MANIFEST_NAME)) as fd:
+            self.assertEqual(json.load(fd), manifest)
+
+        files = manifest['files']
+        name = 'repodono.nunja.testing.mold/basic/template.jinja'
+        exported = files[name]
+        self.assertTrue(re.match(
+            r'^repodono\.nunja\.testing\.mold/basic/'
+            r'template\.[0-9a-f]{16}\.jinja$', exported))
+        with open(join(self.target, *exported.split('/'))) as fd:
+            self.assertEqual(fd.read(), '<span>{{ value }}</span>\n')
+
+        paths = manifest['requirejs']['paths']
+        self.assertEqual(
+            paths['repodono.nunja.testing.mold/basic/template'],
+            'https://cdn.example.com/nunja/' + exported[:-len('.jinja')],
+        )
+        self.assertEqual(
+            paths['repodono.nunja'],
+            'https://cdn.example.com/nunja/' + files['bundle.js'][:-3],
+        )
+        for name in ('nunja.generated.js', 'nunja_id.exported.js'):
+            self.assertTrue(exists(join(self.target, files[name])))
+        with open(join(self.target, files['nunja.generated.js'])) as fd:
+            self.assertIn(json.dumps(
+                manifest['requirejs'], sort_keys=True), fd.read())
+
+    def test_export_stable(self):
+        first = exporters.export_fingerprinted(
+            self.target, registry=self.registry)
+        second = exporters.export_fingerprinted(
+            self.target, registry=self.registry)
+        self.assertEqual(first, second)
+        self.assertEqual(
+            first['requirejs']['paths'][
+                'repodono.nunja.testing.mold/basic/template'],
+            first['files'][
+                'repodono.nunja.testing.mold/basic/template.jinja'
+            ][:-len('.jinja')],
+        )
+
+        with open(self.bundle, 'w') as fd:
+            fd.write('var bundle = 2;\n')
+        third = exporters.export_fingerprinted(
+            self.target, bundles={'bundle': self.bundle},
+            registry=self.registry)
+        self.assertNotEqual(
+            third['files']['nunja.generated.js'],
+            first['files']['nunja.generated.js'],
+        )
+
+    def test_export_modules(self):
+        manifest = exporters.export_fingerprinted(
+            self.target, base_url='/static', registry=self.registry)
+        name = 'repodono.nunja.testing.mold/itemlist/index.js'
+        exported = manifest['files'][name]
+        self.assertTrue(re.match(
+            r'^repodono\.nunja\.testing\.mold/itemlist/'
+            r'index\.[0-9a-f]{16}\.js$', exported))
+        self.assertTrue(exists(join(self.target, *exported.split('/'))))
+        # as required by the engine for every mold.
+        self.assertEqual(
+            manifest['requirejs']['paths'][
+                'repodono.nunja.testing.mold/itemlist/index'],
+            '/static/' + exported[:-len('.js')],
+        )
+
+    def test_write_failure(self):
+        def failing_replace(src, dst):
+            raise OSError('failed')
+
+        self.addCleanup(setattr, utils, 'replace', utils.replace)
+        utils.replace = failing_replace
+        with self.assertRaises(OSError):
+            exporters._write(self.target, 'a/b.js', b'var b;\n')
+        # neither the file nor the temporary file were left behind.
+        self.assertEqual(listdir(join(self.target, 'a')), [])
@@ -0,0 +1,219 @@
+import unittest
+import json
+from os import listdir
+from os import makedirs
+from os import remove
+from os.path import exists
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from repodono.nunja.js import NunjaRJSToolchain
+from repodono.nunja.js import Toolchain
+from repodono.nunja.js import _transpile_generic_to_umd_compat_rjs
+from repodono.nunja.registry import Registry
+
+import repodono.nunja.testing
+
+
+class DummyToolchain(Toolchain):
+    """
+    A toolchain that links by concatenating everything in the manifest.
+    """
+
+    def __init__(self, root, cache_dir=None, workers=1):
+        super(DummyToolchain, self).__init__(
+            cache_dir=cache_dir, workers=workers)
+        self.transpiler = _transpile_generic_to_umd_compat_rjs
+        self.transpile_source_map = {
+            'mod.a': join(root, 'a'),
+            'mod.b': join(root, 'b'),
+        }
+        self.bundled_source_map = {
+            'vendor': join(root, 'vendor'),
+            'tree': join(root, 'tree'),
+        }
+        self.compiled = []
+        self.linked = 0
+
+    def compile(self, source, target):
+        self.compiled.append(source)
+        super(DummyToolchain, self).compile(source, target)
+
+    def assemble(self, compiled_paths, bundled_paths, module_names):
+        manifest_path = join(self.build_dir, self.build_manifest_name)
+        with open(manifest_path, 'w') as fd:
+            json.dump(sorted(module_names), fd)
+        return manifest_path
+
+    def link(self, manifest_path):
+        self.linked += 1
+        with open(manifest_path) as fd:
+            names = json.load(fd)
+        with open(self.bundle_export_path, 'w') as fd:
+            for name in names:
+                with open(join(self.build_dir, name + '.js')) as f:
+                    fd.write(f.read())
+
+
+class ToolchainTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.root = join(self.tempdir, 'src')
+        self.cache_dir = join(self.tempdir, 'cache')
+        self.bundle = join(self.tempdir, 'bundle.js')
+        makedirs(join(self.root, 'tree'))
+        self.write('a.js', 'var a = 1;\n')
+        self.write('b.js', 'var b = 2;\n')
+        self.write('vendor.js', 'var vendor = 3;\n')
+        self.write(join('tree', 'template.jinja'), '<div></div>')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def write(self, name, contents):
+        with open(join(self.root, name), 'w') as fd:
+            fd.write(contents)
+
+    def test_uncached(self):
+        toolchain = DummyToolchain(self.root)
+        toolchain(self.bundle)
+        toolchain(self.bundle)
+        self.assertEqual(len(toolchain.compiled), 4)
+        self.assertEqual(toolchain.linked, 2)
+        with open(self.bundle) as fd:
+            self.assertIn('var vendor = 3;', fd.read())
+
+    def test_incremental(self):
+        toolchain = DummyToolchain(self.root, cache_dir=self.cache_dir)
+        toolchain(self.bundle)
+        self.assertEqual(len(toolchain.compiled), 2)
+        self.assertEqual(toolchain.linked, 1)
+        self.assertTrue(exists(join(
+            self.cache_dir, 'build', 'tree', 'template.jinja')))
+
+        # nothing changed.
+        toolchain = DummyToolchain(self.root, cache_dir=self.cache_dir)
+        toolchain(self.bundle)
+        self.assertEqual(toolchain.compiled, [])
+        self.assertEqual(toolchain.linked, 0)
+
+        # only the changed module is compiled again.
+        self.write('a.js', 'var a = 10;\n')
+        toolchain(self.bundle)
+        self.assertEqual(toolchain.compiled, [join(self.root, 'a.js')])
+        self.assertEqual(toolchain.linked, 1)
+        with open(self.bundle) as fd:
+            self.assertIn('var a = 10;', fd.read())
+
+        # files removed from a bundled tree are removed from the build.
+        remove(join(self.root, 'tree', 'template.jinja'))
+        toolchain(self.bundle)
+        self.assertEqual(listdir(join(self.cache_dir, 'build', 'tree')), [])
+        self.assertEqual(toolchain.linked, 2)
+
+        # missing bundle is linked again.
+        remove(self.bundle)
+        toolchain(self.bundle)
+        self.assertEqual(toolchain.linked, 3)
+
+    def test_workers(self):
+        for i in range(8):
+            self.write(join('tree', 'item%d.jinja' % i), '<p>%d</p>' % i)
+        serial = DummyToolchain(self.root, cache_dir=self.cache_dir)
+        serial(self.bundle)
+        with open(self.bundle) as fd:
+            expected = fd.read()
+        with open(join(self.cache_dir, 'build_state.json')) as fd:
+            expected_state = json.load(fd)
+
+        rmtree(self.cache_dir)
+        remove(self.bundle)
+        parallel = DummyToolchain(
+            self.root, cache_dir=self.cache_dir, workers=4)
+        parallel(self.bundle)
+        with open(self.bundle) as fd:
+            self.assertEqual(fd.read(), expected)
+        with open(join(self.cache_dir, 'build_state.json')) as fd:
+            self.assertEqual(json.load(fd), expected_state)
+        self.assertEqual(sorted(parallel.compiled), sorted(serial.compiled))
+        self.assertEqual(len(listdir(join(
+            self.cache_dir, 'build', 'tree'))), 9)
+
+    def test_workers_failure(self):
+        remove(join(self.root, 'b.js'))
+        toolchain = DummyToolchain(self.root, workers=4)
+        with self.assertRaises(IOError):
+            toolchain(self.bundle)
+
+    def test_timings(self):
+        toolchain = DummyToolchain(self.root, cache_dir=self.cache_dir)
+        toolchain(self.bundle)
+        self.assertEqual(sorted(toolchain.timings), [
+            'assemble', 'compile', 'finalize', 'link'])
+        toolchain(self.bundle)
+        self.assertEqual(toolchain.timings['link'], 0.0)
+
+    def test_watch(self):
+        toolchain = DummyToolchain(self.root)
+        with self.assertRaises(ValueError):
+            toolchain.watch(self.bundle, interval=0, iterations=1)
+
+        toolchain = DummyToolchain(self.root, cache_dir=self.cache_dir)
+        toolchain.watch(self.bundle, interval=0, iterations=3)
+        self.assertEqual(toolchain.linked, 1)
+        self.assertIn(join(self.root, 'a.js'), toolchain.snapshot())
+        self.assertIn(
+            join(self.root, 'tree', 'template.jinja'), toolchain.snapshot())
+
+
+class RecordingWorker(object):
+
+    def __init__(self, result):
+        self.result = result
+        self.requests = []
+
+    def request(self, op, **params):
+        self.requests.append((op, params))
+        return self.result
+
+
+class NunjaRJSToolchainTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry('tmp', {})
+        self.registry.register_module(
+            repodono.nunja.testing, subdir='mold')
+        self.toolchain = NunjaRJSToolchain(registry=self.registry)
+
+    def test_mold_templates(self):
+        templates = self.toolchain.mold_templates()
+        names = [name for name, source in templates]
+        self.assertEqual(names, sorted(names))
+        self.assertIn('_core_/_default_wrapper_/template.jinja', names)
+        self.assertIn(
+            'repodono.nunja.testing.mold/include_by_name/empty.jinja',
+            names)
+        self.assertIn(
+            '<span>{{ value }}</span>',
+            dict(templates)['repodono.nunja.testing.mold/basic/'
+                            'template.jinja'],
+        )
+
+    def test_finalize(self):
+        tempdir = mkdtemp()
+        self.addCleanup(rmtree, tempdir)
+        worker = RecordingWorker(['a();', 'b();'])
+        toolchain = NunjaRJSToolchain(registry=self.registry, worker=worker)
+        toolchain.build_dir = tempdir
+        toolchain.bundle_export_path = join(tempdir, 'bundle.js')
+        with open(toolchain.bundle_export_path, 'w') as fd:
+            fd.write('bundle();\n')
+        toolchain.finalize()
+        self.assertEqual(worker.requests, [('precompile', {
+            'config': join(tempdir, 'config.js'),
+            'templates': toolchain.mold_templates(),
+        })])
+        with open(toolchain.bundle_export_path) as fd:
+            self.assertEqual(fd.read(), 'bundle();\na();\nb();\n')
@@ -7,10 +7,12 @@ from os import utime
 from tempfile import mkdtemp
 from shutil import rmtree
 
+from jinja2 import Environment
 from jinja2 import TemplateNotFound
 
 from repodono.nunja.engine import Engine
 from repodono.nunja.loader import NunjaLoader
+from repodono.nunja.loader import fuse_source
 from repodono.nunja.registry import Registry
 
 
@@ -109,3 +111,43 @@ class LoaderTestCase(unittest.TestCase):
 
         with self.assertRaises(TemplateNotFound):
             loader.get_source(None, 'tmp/mold/../bad.jinja')
+
+
+class FuseSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.env = Environment()
+
+    def test_fuse(self):
+        self.assertEqual(fuse_source(
+            self.env, '<div>\n{% include _template_ %}\n</div>',
+            '<b></b>\n',
+        ), '<div>\n{% with %}<b></b>{% endwith %}\n</div>')
+
+    def test_fuse_whitespace_control(self):
+        self.assertEqual(fuse_source(
+            self.env, '<div>{%- include _template_ with context -%}</div>',
+            '<b></b>',
+        ), '<div>{%- with %}<b></b>{% endwith -%}</div>')
+        self.assertEqual(fuse_source(
+            self.env, '{%+ include _template_ ignore missing%}', 'x',
+        ), '{%+ with %}x{% endwith %}')
+
+    def test_fuse_keep_trailing_newline(self):
+        env = Environment(keep_trailing_newline=True)
+        self.assertEqual(fuse_source(
+            env, '{% include _template_ %}', 'x\n',
+        ), '{% with %}x\n{% endwith %}')
+
+    def test_not_fusable(self):
+        for wrapper in (
+                '',
+                '{% include "x.jinja" %}',
+                '{% include _template_ without context %}',
+                '{% include _template_ %}{% include _template_ %}',
+                '{% include _template_ %}{{ _template_.name }}'):
+            self.assertIsNone(fuse_source(self.env, wrapper, 'x'))
+        self.assertIsNone(fuse_source(
+            self.env, '{% include _template_ %}', '{% extends "x" %}'))
+        self.assertIsNone(fuse_source(
+            Environment(trim_blocks=True), '{% include _template_ %}', 'x'))
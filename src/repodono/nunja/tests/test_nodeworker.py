@@ -0,0 +1,87 @@
+import os
+import stat
+import unittest
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+try:
+    from shutil import which
+except ImportError:  # pragma: no cover
+    from distutils.spawn import find_executable as which
+
+from repodono.nunja.exc import NodeWorkerError
+from repodono.nunja.nodeworker import NodeWorker
+from repodono.nunja.nodeworker import default_worker
+
+
+@unittest.skipIf(which('node') is None, 'node is not available')
+class NodeWorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = NodeWorker()
+
+    def tearDown(self):
+        self.worker.close()
+
+    def test_reused(self):
+        self.assertFalse(self.worker.running)
+        self.assertEqual(self.worker.request('ping'), 'pong')
+        process = self.worker._process
+        self.assertEqual(self.worker.request('ping'), 'pong')
+        self.assertIs(self.worker._process, process)
+        self.assertEqual(self.worker.requests, 2)
+
+    def test_error(self):
+        with self.assertRaises(NodeWorkerError) as e:
+            self.worker.request('no_such_op')
+        self.assertIn('unknown op: no_such_op', str(e.exception))
+        # the worker remains usable.
+        self.assertEqual(self.worker.request('ping'), 'pong')
+
+    def test_restart(self):
+        self.worker.request('ping')
+        self.worker._process.kill()
+        self.worker._process.wait()
+        self.assertEqual(self.worker.request('ping'), 'pong')
+        self.assertTrue(self.worker.running)
+
+    def test_close(self):
+        self.worker.close()
+        with NodeWorker() as worker:
+            worker.request('ping')
+            process = worker._process
+        self.assertFalse(worker.running)
+        self.assertEqual(process.returncode, 0)
+
+    def test_default_worker(self):
+        self.assertIs(default_worker(), default_worker())
+
+
+@unittest.skipIf(os.name != 'posix', 'requires a posix shell')
+class NodeWorkerTimeoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        # a stand-in for node that never responds.
+        self.node = join(self.tempdir, 'node')
+        with open(self.node, 'w') as fd:
+            fd.write('#!/bin/sh\nexec sleep 60\n')
+        os.chmod(self.node, stat.S_IRWXU)
+        self.worker = NodeWorker(node=self.node, timeout=0.2)
+
+    def tearDown(self):
+        self.worker.close()
+        rmtree(self.tempdir)
+
+    def test_timeout(self):
+        with self.assertRaises(NodeWorkerError) as e:
+            self.worker.request('ping')
+        self.assertIn('timed out', str(e.exception))
+        self.assertFalse(self.worker.running)
+
+        # started again for the next request.
+        with self.assertRaises(NodeWorkerError) as e:
+            self.worker.request('ping')
+        self.assertIn('timed out', str(e.exception))
+        self.assertEqual(self.worker.requests, 0)
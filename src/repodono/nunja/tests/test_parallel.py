@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import unittest
+import pickle
+
+import repodono.nunja.testing
+from repodono.nunja.engine import Engine
+from repodono.nunja.exc import RenderError
+from repodono.nunja.parallel import ParallelRenderer
+from repodono.nunja.parallel import describe_registry
+from repodono.nunja.parallel import registry_from_description
+from repodono.nunja.registry import Registry
+from repodono.nunja.testing import benchmark
+
+
+class ParallelRendererTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry(__name__, {})
+        self.registry.register_module(repodono.nunja.testing, subdir='mold')
+        self.jobs = [
+            ('repodono.nunja.testing.mold/basic', {'value': i})
+            for i in range(25)
+        ]
+
+    def test_describe_registry(self):
+        description = pickle.loads(pickle.dumps(
+            describe_registry(self.registry)))
+        registry = registry_from_description(description)
+        self.assertEqual(registry.registry_name, __name__)
+        self.assertEqual(registry.molds, self.registry.molds)
+
+    def test_render(self):
+        engine = Engine(self.registry)
+        with ParallelRenderer(
+                self.registry, processes=2, chunksize=4) as renderer:
+            results = renderer.render(self.jobs)
+            # pool is reused.
+            self.assertEqual(renderer.render(self.jobs[:2]), results[:2])
+        self.assertEqual(results, [
+            engine.execute(mold_id, data) for mold_id, data in self.jobs])
+
+    def test_render_errors(self):
+        jobs = list(self.jobs)
+        jobs[7] = ('repodono.nunja.testing.mold/missing', {})
+        jobs[3] = ('repodono.nunja.testing.mold/missing', {})
+        with ParallelRenderer(
+                self.registry, processes=2, chunksize=2) as renderer:
+            with self.assertRaises(RenderError) as e:
+                renderer.render(jobs)
+
+        self.assertEqual(e.exception.index, 3)
+        self.assertEqual(
+            e.exception.mold_id, 'repodono.nunja.testing.mold/missing')
+        self.assertIn('TemplateNotFound', e.exception.message)
+        self.assertEqual([f[0] for f in e.exception.failures], [3, 7])
+
+    def test_parallel_scaling(self):
+        results = benchmark.parallel_scaling(
+            self.registry, self.jobs, processes=[1, 2], chunksize=4)
+        self.assertEqual([r['processes'] for r in results], [1, 2])
+        self.assertEqual(results[0]['speedup'], 1.0)
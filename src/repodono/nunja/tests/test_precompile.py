@@ -0,0 +1,66 @@
+import unittest
+from os import listdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from jinja2 import ModuleLoader
+
+from repodono.nunja.engine import Engine
+from repodono.nunja.loader import NunjaLoader
+from repodono.nunja.precompile import compile_molds
+from repodono.nunja.registry import Registry
+
+import repodono.nunja.testing
+
+
+class PrecompileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.registry = Registry('tmp', {})
+        self.registry.register_module(
+            repodono.nunja.testing, subdir='mold')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_list_templates(self):
+        names = NunjaLoader(self.registry).list_templates()
+        self.assertIn('_core_/_default_wrapper_/template.jinja', names)
+        self.assertIn(
+            'repodono.nunja.testing.mold/include_by_name/empty.jinja',
+            names)
+        self.assertEqual(names, sorted(names))
+
+    def test_compile_directory(self):
+        target = join(self.tempdir, 'compiled')
+        names = compile_molds(self.registry, target)
+        self.assertEqual(len(listdir(target)), len(names))
+
+        engine = Engine(self.registry, compiled_path=target)
+        self.assertTrue(isinstance(engine.env.loader, ModuleLoader))
+        self.assertEqual(
+            engine.execute(
+                'repodono.nunja.testing.mold/basic', data={'value': '<v>'}),
+            '<div data-nunja="repodono.nunja.testing.mold/basic">\n'
+            '<span>&lt;v&gt;</span>\n'
+            '</div>'
+        )
+        # not fused as there are no sources.
+        self.assertIs(engine.get_fused(
+            'repodono.nunja.testing.mold/basic',
+            engine.get_mold('repodono.nunja.testing.mold/basic'), 'div',
+        ), engine._core_template_)
+
+    def test_compile_zip(self):
+        target = join(self.tempdir, 'compiled.zip')
+        compile_molds(self.registry, target, zip='deflated')
+        engine = Engine(self.registry, compiled_path=target)
+        data = {'list_id': 'root', 'itemlists': [('a', ['x', 'y'])]}
+        self.assertEqual(
+            engine.execute('repodono.nunja.testing.mold/include_by_name',
+                           data=data),
+            Engine(self.registry).execute(
+                'repodono.nunja.testing.mold/include_by_name', data=data),
+        )
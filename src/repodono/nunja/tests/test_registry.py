@@ -1,14 +1,24 @@
 import unittest
 
 import json
+from hashlib import sha256
 from pkg_resources import EntryPoint
+from os import mkdir
+from os import utime
 from os.path import join
 from os.path import dirname
+from tempfile import mkdtemp
+from shutil import copytree
+from shutil import rmtree
 import sys
 
 import repodono.nunja
 from repodono.nunja import exc
+from repodono.nunja import registry as registry_module
+from repodono.nunja.engine import Engine
 from repodono.nunja.registry import Registry
+from repodono.nunja.registry import BoundedIndex
+from repodono.nunja.registry import StatCache
 import repodono.nunja.testing
 
 basic_tmpl_str = '<span>{{ value }}</span>\n'
@@ -298,6 +308,244 @@ class RegistryTestCase(unittest.TestCase):
             [u'empty.jinja', u'template.jinja'],
         )
 
+    def test_mold_id_to_path_from_entrypoint_promoted(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        paths = self.registry.entry_point_paths('repodono.nunja.testmold')
+        self.assertEqual(paths, [
+            join(p, 'mold') for p in repodono.nunja.testing.__path__])
+        # resolved only once.
+        self.assertIs(
+            self.registry.entry_point_paths('repodono.nunja.testmold'), paths)
+
+        path = self.registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.assertEqual(self.registry._resolved_molds, {
+            'repodono.nunja.testmold/basic': path})
+        # but not registered.
+        self.assertNotIn('repodono.nunja.testmold/basic', self.registry.molds)
+        # later registration of the same molds is not an issue.
+        self.registry.init_entrypoints()
+        self.assertEqual(
+            self.registry.molds['repodono.nunja.testmold/basic'], path)
+
+    def test_register_mold_after_lookup(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        path = self.registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.registry.register_mold(path, 'repodono.nunja.testmold/basic')
+        self.assertEqual(
+            self.registry.molds['repodono.nunja.testmold/basic'], path)
+        self.assertEqual(self.registry._resolved_molds, {})
+
+    def test_exports_independent_of_lookups(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        exports = (
+            self.registry.export_nunja_requirejs_json(),
+            self.registry.export_jinja_template_paths(),
+        )
+        self.registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.assertEqual(exports, (
+            self.registry.export_nunja_requirejs_json(),
+            self.registry.export_jinja_template_paths(),
+        ))
+
+    def test_entry_point_paths_import_error(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.no.such.module = repodono.nunja.no:mold')
+        self.assertIsNone(
+            self.registry.entry_point_paths('repodono.nunja.no.such.module'))
+        with self.assertRaises(KeyError):
+            self.registry.entry_point_paths('no.such.entry_point')
+
+    def test_init_entrypoints_lazy(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testing.badmold = repodono.nunja.testing:badmold')
+        self.registry.init_entrypoints(lazy=True)
+        self.assertEqual(len(self.registry.molds), 1)
+
+        # first touch registers every mold under the prefix.
+        path = self.registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.assertEqual(sorted(self.registry.molds.keys()), [
+            '_core_/_default_wrapper_',
+            'repodono.nunja.testmold/basic',
+            'repodono.nunja.testmold/include_by_name',
+            'repodono.nunja.testmold/include_by_value',
+            'repodono.nunja.testmold/itemlist',
+        ])
+        self.assertEqual(
+            self.registry.molds['repodono.nunja.testmold/basic'], path)
+
+        with self.assertRaises(KeyError):
+            self.registry.mold_id_to_path(
+                'repodono.nunja.testing.badmold/nomold')
+
+    def test_init_entrypoints_lazy_export(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        self.registry.init_entrypoints(lazy=True)
+        result = json.loads(self.registry.export_nunja_requirejs_json())
+        self.assertEqual(len(result['paths']), 5)
+
+    def test_export_manifest(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        self.registry.init_entrypoints()
+        manifest = json.loads(self.registry.export_manifest())
+        self.assertEqual(
+            manifest['registry_name'], 'repodono.nunja.testing.registry')
+        mold = manifest['molds']['repodono.nunja.testmold/basic']
+        # relative to the directory with all the molds.
+        self.assertEqual(mold['path'], 'basic')
+        self.assertEqual(
+            join(manifest['root'], mold['path']),
+            self.registry.mold_id_to_path('repodono.nunja.testmold/basic'),
+        )
+        # the wrapper is always provided by this package.
+        self.assertNotIn('_core_/_default_wrapper_', manifest['molds'])
+        manifest = json.loads(self.registry.export_manifest(
+            root=dirname(repodono.nunja.testing.__file__)))
+        self.assertEqual(manifest['molds'][
+            'repodono.nunja.testmold/basic']['path'], 'mold/basic')
+        self.assertEqual(mold['templates'], {'template.jinja': {
+            'size': len(basic_tmpl_str),
+            'sha256': sha256(basic_tmpl_str.encode('utf-8')).hexdigest(),
+        }})
+        self.assertEqual(sorted(manifest['molds'][
+            'repodono.nunja.testmold/include_by_name']['templates']), [
+            'empty.jinja', 'template.jinja'])
+
+    def test_from_manifest(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        self.registry.init_entrypoints()
+        manifest = self.registry.export_manifest()
+
+        registry = Registry.from_manifest(manifest)
+        self.assertEqual(registry.molds, self.registry.molds)
+        self.assertEqual(registry.entry_points, {})
+        self.assertEqual(
+            json.loads(registry.export_jinja_template_paths()),
+            json.loads(self.registry.export_jinja_template_paths()),
+        )
+        path = registry.verify_path(
+            'repodono.nunja.testmold/include_by_name/empty.jinja')
+        self.assertTrue(path.endswith('empty.jinja'))
+        self.assertEqual(registry.cache_stats()['stat_calls'], 0)
+        self.assertNotIn(path, registry._manifest_sizes)
+
+    def test_from_manifest_ttl(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        self.registry.init_entrypoints()
+        now = [10]
+        registry = Registry.from_manifest(
+            self.registry.export_manifest(), ttl=5)
+        registry.stat_cache.timer = lambda: now[0]
+        path = self.registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.assertEqual(registry.stat_cache.results.get(path)[0], True)
+        self.assertIsNotNone(registry.stat_cache.results.get(path)[1])
+        registry.verify_path('repodono.nunja.testmold/basic/template.jinja')
+        self.assertEqual(registry.cache_stats()['stat_calls'], 0)
+        # the seeded entries expire as per the ttl.
+        now[0] = 10 ** 12
+        registry.verify_path('repodono.nunja.testmold/basic/template.jinja')
+        self.assertEqual(registry.cache_stats()['stat_calls'], 1)
+
+    def test_from_manifest_size_mismatch(self):
+        tempdir = mkdtemp()
+        self.addCleanup(rmtree, tempdir)
+        molddir = join(tempdir, 'basic')
+        mkdir(molddir)
+        with open(join(molddir, 'template.jinja'), 'w') as fd:
+            fd.write('changed')
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        invalidated = []
+        registry = Registry.from_manifest({
+            'registry_name': 'manifest',
+            'root': tempdir,
+            'molds': {
+                'repodono.nunja.testmold/basic': {
+                    'path': 'basic',
+                    'templates': {
+                        'template.jinja': {'size': 1, 'sha256': ''},
+                        'gone.jinja': {'size': 1, 'sha256': ''},
+                    },
+                },
+            },
+        }, entry_points=self.registry.entry_points)
+        registry.invalidation_hooks.append(invalidated.append)
+        self.assertEqual(
+            registry.template_paths('repodono.nunja.testmold/basic'),
+            ['gone.jinja', 'template.jinja'])
+        # the mold is found through its entry point instead.
+        path = self.registry.mold_id_to_path('repodono.nunja.testmold/basic')
+        self.assertEqual(registry.verify_path(
+            'repodono.nunja.testmold/basic/template.jinja'),
+            join(path, 'template.jinja'))
+        self.assertEqual(invalidated, ['repodono.nunja.testmold/basic'])
+        # the manifest entries for the mold were discarded.
+        self.assertEqual(
+            registry.template_paths('repodono.nunja.testmold/basic'),
+            ['template.jinja'])
+        with self.assertRaises(exc.FileNotFoundError):
+            registry.verify_path('repodono.nunja.testmold/basic/gone.jinja')
+
+    def test_from_manifest_relocated(self):
+        self.emulate_register_entrypoint(
+            'repodono.nunja.testmold = repodono.nunja.testing:mold')
+        self.registry.init_entrypoints()
+        manifest = self.registry.export_manifest()
+        tempdir = mkdtemp()
+        self.addCleanup(rmtree, tempdir)
+        root = join(tempdir, 'srv', 'app')
+        copytree(json.loads(manifest)['root'], root)
+
+        registry = Registry.from_manifest(manifest, root=root)
+        self.assertEqual(
+            registry.molds['repodono.nunja.testmold/basic'],
+            join(root, 'basic'))
+        self.assertEqual(
+            registry.molds['_core_/_default_wrapper_'],
+            self.registry.molds['_core_/_default_wrapper_'])
+        engine = Engine(registry)
+        self.assertEqual(
+            engine.execute('repodono.nunja.testmold/basic', {'value': 'v'}),
+            '<div data-nunja="repodono.nunja.testmold/basic">\n'
+            '<span>v</span>\n'
+            '</div>'
+        )
+        self.assertEqual(engine.get_mold(
+            'repodono.nunja.testmold/basic').filename,
+            join(root, 'basic', 'template.jinja'))
+
+    def test_from_manifest_no_scanning(self):
+        registry = Registry.from_manifest({
+            'registry_name': 'manifest',
+            'molds': {
+                'not/real': {
+                    'path': '/no/such/path/real',
+                    'templates': {
+                        'template.jinja': {'size': 0, 'sha256': ''},
+                    },
+                },
+            },
+        })
+        self.assertEqual(registry.registry_name, 'manifest')
+        result = json.loads(registry.export_jinja_template_paths())
+        self.assertEqual(
+            result['template_map']['not/real'], ['template.jinja'])
+        self.assertEqual(
+            registry.lookup_path('not/real/template.jinja'),
+            join('/no/such/path/real', 'template.jinja'),
+        )
+        # until the template is verified upon first use.
+        with self.assertRaises(exc.FileNotFoundError):
+            registry.verify_path('not/real/template.jinja')
+
     # Test cases for ensuring no failures done by register_module
 
     def test_registry_register_module_not_module(self):
@@ -311,3 +559,244 @@ class RegistryTestCase(unittest.TestCase):
     def test_registry_register_module_baddir(self):
         self.registry.register_module(repodono.nunja.testing, subdir='badmold')
         self.assertEqual(len(self.registry.molds), 1)
+
+
+class RegistryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.registry = Registry('repodono.nunja.testing.registry', {})
+        self.registry.stat_cache.timer = lambda: self.now
+        self.registry.register_module(repodono.nunja.testing, subdir='mold')
+
+    def test_stat_cache(self):
+        cache = StatCache(timer=lambda: self.now)
+        target = join(
+            dirname(repodono.nunja.testing.__file__), 'mold', 'basic')
+        self.assertTrue(cache.exists(target))
+        self.assertTrue(cache.exists(target))
+        self.assertFalse(cache.exists(join(target, 'missing')))
+        self.assertFalse(cache.exists(join(target, 'missing')))
+        self.assertEqual(cache.stats, {'hits': 2, 'misses': 2})
+
+        # negative entries expire.
+        self.now = 2
+        self.assertFalse(cache.exists(join(target, 'missing')))
+        self.assertEqual(cache.stats, {'hits': 2, 'misses': 3})
+
+        cache.invalidate(target)
+        self.assertEqual(len(cache.results), 0)
+
+    def test_stat_cache_bounded(self):
+        cache = StatCache(
+            timer=lambda: self.now, max_entries=2, max_negative_entries=3)
+        target = join(
+            dirname(repodono.nunja.testing.__file__), 'mold', 'basic')
+        for i in range(10):
+            self.assertFalse(cache.exists(join(target, 'missing%d' % i)))
+        self.assertTrue(cache.exists(target))
+        self.assertTrue(cache.exists(join(target, 'template.jinja')))
+        self.assertTrue(cache.exists(join(target, 'template.jinja')))
+        self.assertTrue(cache.exists(target))
+        self.assertTrue(cache.exists(dirname(target)))
+        self.assertEqual(len(cache.results), 5)
+        self.assertEqual(cache.results.evictions, 8)
+        # the least recently used one was evicted.
+        self.assertNotIn(join(target, 'template.jinja'), cache.results)
+        self.assertIn(target, cache.results)
+        self.assertIn(join(target, 'missing9'), cache.results)
+        self.assertNotIn(join(target, 'missing6'), cache.results)
+
+    def test_bounded_index(self):
+        index = BoundedIndex(max_entries=2, max_negative_entries=1)
+        index['a'] = ('/a', None)
+        index['b'] = (None, 1)
+        index['c'] = (None, 1)
+        self.assertEqual(sorted(index), ['a', 'c'])
+        self.assertEqual(index.lookup('a', 0), ('/a', None))
+        self.assertEqual(index.lookup('c', 0), (None, 1))
+        # expired entries are dropped upon lookup.
+        self.assertIsNone(index.lookup('c', 1))
+        self.assertNotIn('c', index)
+        # a positive entry replaces the negative one.
+        index['b'] = (None, 1)
+        index['b'] = ('/b', None)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.get('b'), ('/b', None))
+        del index['b']
+        self.assertIsNone(index.get('b'))
+        index.clear()
+        self.assertEqual(len(index), 0)
+
+    def test_path_index_bounded(self):
+        registry = Registry(
+            'repodono.nunja.testing.registry', {},
+            max_entries=50, max_negative_entries=10)
+        registry.register_module(repodono.nunja.testing, subdir='mold')
+        for i in range(100):
+            self.assertIsNone(registry.lookup_path(
+                'some/app/url/%d' % i, default=None))
+            with self.assertRaises(exc.FileNotFoundError):
+                registry.verify_path(
+                    'repodono.nunja.testing.mold/basic/%d.jinja' % i)
+        # paths within a mold resolve, but are missing.
+        self.assertEqual(len(registry._path_index), 60)
+        self.assertEqual(registry.cache_stats()['lookup_evictions'], 140)
+        self.assertTrue(len(registry.stat_cache.results) <= 60)
+
+    def test_verify_path_stat_calls_saved(self):
+        mold_id_path = 'repodono.nunja.testing.mold/basic/template.jinja'
+        path1 = self.registry.verify_path(mold_id_path)
+        path2 = self.registry.verify_path(mold_id_path)
+        self.assertEqual(path1, path2)
+        stats = self.registry.cache_stats()
+        self.assertEqual(stats['lookup_hits'], 1)
+        self.assertEqual(stats['lookup_misses'], 1)
+        # the first check on the template already happened while the
+        # registration of the module was done.
+        self.assertEqual(stats['stat_calls_saved'], 2)
+
+    def test_negative_lookup_ttl(self):
+        mold_id_path = 'repodono.nunja.testing.mold/basic/missing.jinja'
+        with self.assertRaises(exc.FileNotFoundError):
+            self.registry.verify_path(mold_id_path)
+        calls = self.registry.cache_stats()['stat_calls']
+        with self.assertRaises(exc.FileNotFoundError):
+            self.registry.verify_path(mold_id_path)
+        self.assertEqual(self.registry.cache_stats()['stat_calls'], calls)
+
+        self.now = 2
+        with self.assertRaises(exc.FileNotFoundError):
+            self.registry.verify_path(mold_id_path)
+        self.assertEqual(
+            self.registry.cache_stats()['stat_calls'], calls + 1)
+
+        with self.assertRaises(KeyError):
+            self.registry.lookup_path('no/such/path.jinja')
+        with self.assertRaises(KeyError):
+            self.registry.lookup_path('no/such/path.jinja')
+        self.assertEqual(self.registry.lookup_path(
+            'no/such/path.jinja', default=None), None)
+        self.assertEqual(
+            self.registry.cache_stats()['lookup_negative_hits'], 2)
+
+    def test_invalidate_hooks(self):
+        invalidated = []
+        self.registry.invalidation_hooks.append(invalidated.append)
+        self.registry.lookup_path('_/basic/template.jinja', default=None)
+        target = join(
+            dirname(repodono.nunja.testing.__file__), 'mold', 'basic')
+        # registration drops the negative entry.
+        self.registry.register_mold(target)
+        self.assertEqual(invalidated, ['_/basic'])
+        self.assertEqual(
+            self.registry.lookup_path('_/basic/template.jinja'),
+            join(target, 'template.jinja'),
+        )
+
+        self.registry.invalidate()
+        self.assertEqual(invalidated, ['_/basic', None])
+        self.assertEqual(len(self.registry.stat_cache.results), 0)
+
+
+class RegistryTemplatePathsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.molddir = join(self.tempdir, 'mold')
+        mkdir(self.molddir)
+        mkdir(join(self.molddir, 'sub'))
+        self.write('template.jinja')
+        self.write(join('sub', 'row.jinja'))
+        self.registry = Registry('tmp', {})
+        self.registry.register_mold(self.molddir, 'tmp/mold')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def write(self, name, contents=''):
+        with open(join(self.molddir, name), 'w') as fd:
+            fd.write(contents)
+
+    def age_dirs(self):
+        # directories last modified well before the walk.
+        for name in ('', 'sub'):
+            utime(join(self.molddir, name), (1, 1))
+
+    def count_walks(self):
+        walks = []
+        walk = registry_module.walk
+
+        def counting_walk(path):
+            walks.append(path)
+            return walk(path)
+
+        registry_module.walk = counting_walk
+        self.addCleanup(setattr, registry_module, 'walk', walk)
+        return walks
+
+    def test_cached(self):
+        self.age_dirs()
+        walks = self.count_walks()
+        self.assertEqual(self.registry.template_paths('tmp/mold'), [
+            join('sub', 'row.jinja'), 'template.jinja'])
+        self.assertEqual(self.registry.template_paths('tmp/mold'), [
+            join('sub', 'row.jinja'), 'template.jinja'])
+        self.assertEqual(len(walks), 1)
+
+        # modifying the contents of a template changes nothing.
+        self.write('template.jinja', 'changed')
+        self.registry.template_paths('tmp/mold')
+        self.assertEqual(len(walks), 1)
+
+    def test_cached_copy(self):
+        self.age_dirs()
+        paths = self.registry.template_paths('tmp/mold')
+        paths.append('bogus.jinja')
+        self.assertEqual(self.registry.template_paths('tmp/mold'), [
+            join('sub', 'row.jinja'), 'template.jinja'])
+
+    def test_directory_changed(self):
+        self.age_dirs()
+        self.registry.template_paths('tmp/mold')
+        self.write(join('sub', 'item.jinja'))
+        self.assertEqual(self.registry.template_paths('tmp/mold'), [
+            join('sub', 'item.jinja'), join('sub', 'row.jinja'),
+            'template.jinja',
+        ])
+
+    def test_directory_recently_changed(self):
+        # the directories were modified within the resolution of their
+        # modification time, so a change that may not be reflected in
+        # it must still be picked up by the next call.
+        walks = self.count_walks()
+        self.registry.template_paths('tmp/mold')
+        self.write(join('sub', 'item.jinja'))
+        self.assertEqual(self.registry.template_paths('tmp/mold'), [
+            join('sub', 'item.jinja'), join('sub', 'row.jinja'),
+            'template.jinja',
+        ])
+        self.assertEqual(len(walks), 2)
+
+    def test_invalidated(self):
+        self.age_dirs()
+        walks = self.count_walks()
+        self.registry.template_paths('tmp/mold')
+        self.registry.invalidate('tmp/mold')
+        self.registry.template_paths('tmp/mold')
+        self.assertEqual(len(walks), 2)
+        self.registry.invalidate()
+        self.registry.template_paths('tmp/mold')
+        self.assertEqual(len(walks), 3)
+
+    def test_export_requirejs_and_template_paths(self):
+        requirejs_json, template_paths_json = (
+            self.registry.export_requirejs_and_template_paths())
+        self.assertEqual(
+            json.loads(requirejs_json),
+            json.loads(self.registry.export_nunja_requirejs_json()),
+        )
+        self.assertEqual(
+            json.loads(template_paths_json),
+            json.loads(self.registry.export_jinja_template_paths()),
+        )
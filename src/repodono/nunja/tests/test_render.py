@@ -152,3 +152,73 @@ class BaseTestCase(unittest.TestCase):
             '</dl>\n'
             '</div>'
         )
+
+    def test_execute_stream(self):
+        data = {
+            'list_id': 'root_id',
+            'itemlists': [
+                ['list_%d' % i, ['Item %d' % i]] for i in range(100)
+            ],
+        }
+        mold_id = 'repodono.nunja.testing.mold/include_by_name'
+        result = self.engine.execute(mold_id, data=data)
+
+        chunks = list(self.engine.execute_stream(
+            mold_id, data=data, buffer_size=256))
+        self.assertEqual(''.join(chunks), result)
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) >= 256 for chunk in chunks[:-1]))
+        self.assertTrue(chunks[0].startswith(
+            '<div data-nunja="repodono.nunja.testing.mold/include_by_name">'))
+        self.assertTrue(chunks[-1].endswith('</div>'))
+
+        # unbuffered
+        chunks = list(self.engine.execute_stream(
+            mold_id, data=data, buffer_size=0))
+        self.assertEqual(''.join(chunks), result)
+        self.assertTrue(all(chunks))
+
+    def test_execute_stream_encoded(self):
+        chunks = list(self.engine.execute_stream(
+            'repodono.nunja.testing.mold/basic',
+            data={'value': u'\u201cHello\u201d'}, wrapper_tag='section',
+            encoding='utf-8'))
+        self.assertEqual(b''.join(chunks), (
+            u'<section data-nunja="repodono.nunja.testing.mold/basic">\n'
+            u'<span>\u201cHello\u201d</span>\n'
+            u'</section>'
+        ).encode('utf-8'))
+
+    def test_execute_stream_not_found(self):
+        with self.assertRaises(TemplateNotFound):
+            self.engine.execute_stream(
+                'repodono.nunja.testing.mold/no_such_mold', data={})
+
+    def test_execute_many(self):
+        datasets = [{'value': 'Hello %d' % i} for i in range(3)]
+        results = self.engine.execute_many(
+            'repodono.nunja.testing.mold/basic', iter(datasets),
+            wrapper_tag='p')
+        self.assertEqual(list(results), [
+            self.engine.execute(
+                'repodono.nunja.testing.mold/basic', data, wrapper_tag='p')
+            for data in datasets
+        ])
+        # the template was only looked up once by execute_many.
+        self.assertEqual(self.engine.cache_stats()['misses'], 1)
+        self.assertEqual(self.engine.cache_stats()['hits'], 3)
+
+    def test_execute_many_reserved_names(self):
+        results = self.engine.execute_many(
+            'repodono.nunja.testing.mold/basic', [
+                {'value': 1, '_wrapper_tag_': 'bad'}])
+        self.assertEqual(list(results), [
+            '<div data-nunja="repodono.nunja.testing.mold/basic">\n'
+            '<span>1</span>\n'
+            '</div>'
+        ])
+
+    def test_execute_many_not_found(self):
+        with self.assertRaises(TemplateNotFound):
+            self.engine.execute_many(
+                'repodono.nunja.testing.mold/no_such_mold', [])
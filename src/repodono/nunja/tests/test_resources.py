@@ -0,0 +1,114 @@
+import unittest
+import sys
+from os import mkdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+from zipfile import ZipFile
+
+from repodono.nunja import resources
+from repodono.nunja.engine import Engine
+from repodono.nunja.registry import Registry
+
+
+class ZipResourcesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.archive = join(self.tempdir, 'molds.zip')
+        with ZipFile(self.archive, 'w') as zf:
+            zf.writestr('zipped_molds/__init__.py', '')
+            zf.writestr(
+                'zipped_molds/molds/item/template.jinja',
+                '<span>{{ data }}</span>')
+            zf.writestr(
+                'zipped_molds/molds/item/sub/row.jinja', '<td></td>')
+            zf.writestr('zipped_molds/molds/notmold/readme.txt', '')
+        sys.path.insert(0, self.archive)
+
+    def tearDown(self):
+        sys.path.remove(self.archive)
+        sys.modules.pop('zipped_molds', None)
+        resources.close_archives()
+        rmtree(self.tempdir)
+
+    def test_helpers(self):
+        root = join(self.archive, 'zipped_molds', 'molds')
+        template = join(root, 'item', 'template.jinja')
+        self.assertTrue(resources.exists(template))
+        self.assertTrue(resources.exists(root))
+        self.assertFalse(resources.exists(join(root, 'nothing')))
+        self.assertTrue(resources.isdir(root))
+        self.assertFalse(resources.isdir(template))
+        self.assertEqual(resources.listdir(root), ['item', 'notmold'])
+        self.assertEqual(resources.read_bytes(template),
+                         b'<span>{{ data }}</span>')
+        self.assertEqual(resources.stat(template)[1], 23)
+        self.assertEqual(list(resources.walk(join(root, 'item'))), [
+            (join(root, 'item'), ['sub'], ['template.jinja']),
+            (join(root, 'item', 'sub'), [], ['row.jinja']),
+        ])
+
+        # the archive is only opened once.
+        archive, name = resources.split_archive(template)
+        self.assertEqual(name, 'zipped_molds/molds/item/template.jinja')
+        self.assertIs(resources.split_archive(root)[0], archive)
+        self.assertEqual(resources.split_archive(self.tempdir), (None, None))
+
+        with self.assertRaises(OSError):
+            resources.listdir(join(root, 'nothing'))
+        with self.assertRaises(IOError):
+            resources.read_bytes(join(root, 'item', 'nothing.jinja'))
+
+    def test_registry_engine(self):
+        import zipped_molds
+        registry = Registry('zipped', {})
+        registry.register_module(zipped_molds, 'molds')
+        self.assertEqual(sorted(registry.molds), [
+            '_core_/_default_wrapper_', 'zipped_molds.molds/item'])
+        engine = Engine(registry)
+        self.assertEqual(
+            engine.execute('zipped_molds.molds/item', data={'data': 'Hi'}),
+            '<div data-nunja="zipped_molds.molds/item">\n'
+            '<span>Hi</span>\n</div>'
+        )
+        self.assertIn('sub/row.jinja', registry.export_jinja_template_paths())
+
+
+class SplitArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.calls = []
+        self.original = resources._exists
+
+        def exists(path):
+            self.calls.append(path)
+            return self.original(path)
+
+        resources._exists = exists
+
+    def tearDown(self):
+        resources._exists = self.original
+        resources.close_archives()
+        rmtree(self.tempdir)
+
+    def test_not_archive_remembered(self):
+        molddir = join(self.tempdir, 'mold')
+        mkdir(molddir)
+        missing = join(molddir, 'missing.jinja')
+        self.assertFalse(resources.exists(missing))
+        self.assertEqual(self.calls, [missing, molddir])
+        self.assertIn(molddir, resources._not_archives)
+        self.calls[:] = []
+        self.assertFalse(resources.exists(missing))
+        self.assertFalse(resources.exists(join(molddir, 'other')))
+        # only the failed checks of the paths themselves.
+        self.assertEqual(self.calls, [missing, join(molddir, 'other')])
+        # missing directories are walked through up to a known one.
+        self.calls[:] = []
+        self.assertFalse(resources.exists(join(molddir, 'sub', 'x')))
+        self.assertEqual(self.calls, [
+            join(molddir, 'sub', 'x'), join(molddir, 'sub')])
+        resources.close_archives()
+        self.assertEqual(resources._not_archives, set())
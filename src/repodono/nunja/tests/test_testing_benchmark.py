@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import sys
+from io import StringIO
+from subprocess import CalledProcessError
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import repodono.nunja.testing
+from repodono.nunja.engine import Engine
+from repodono.nunja.registry import Registry
+from repodono.nunja.testing import benchmark
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    @unittest.skipIf(sys.version_info < (3, 7), "py3.7 -X importtime")
+    def test_import_time(self):
+        result = benchmark.import_time('repodono.nunja.core')
+        self.assertTrue(result > 0)
+
+    @unittest.skipIf(sys.version_info < (3, 7), "py3.7 -X importtime")
+    def test_import_time_missing(self):
+        with self.assertRaises(CalledProcessError):
+            benchmark.import_time('repodono.nunja.no_such_module')
+
+
+class ExecuteManyTestCase(unittest.TestCase):
+
+    def test_execute_many_speedup(self):
+        registry = Registry(__name__, {})
+        registry.register_module(repodono.nunja.testing, subdir='mold')
+        engine = Engine(registry)
+        result = benchmark.execute_many_speedup(
+            engine, 'repodono.nunja.testing.mold/basic',
+            [{'value': i} for i in range(10)], repeat=1)
+        self.assertEqual(
+            sorted(result), ['execute', 'execute_many', 'speedup'])
+
+
+class MeasureTestCase(unittest.TestCase):
+
+    def test_percentile(self):
+        samples = list(range(100))
+        self.assertEqual(benchmark.percentile(samples, 50), 49)
+        self.assertEqual(benchmark.percentile(samples, 99), 98)
+        self.assertEqual(benchmark.percentile(samples, 100), 99)
+        self.assertEqual(benchmark.percentile(samples, 0), 0)
+        self.assertEqual(benchmark.percentile([1], 99), 1)
+        self.assertEqual(benchmark.percentile([1, 2, 3], 50), 2)
+
+    def test_measure(self):
+        calls = []
+        result = benchmark.measure(
+            lambda: calls.append('func'), 3,
+            setup=lambda: calls.append('setup'))
+        self.assertEqual(calls, ['setup', 'func'] * 3)
+        self.assertEqual(sorted(result), [
+            'max', 'mean', 'number', 'p50', 'p90', 'p99', 'throughput'])
+        self.assertEqual(result['number'], 3)
+        self.assertTrue(result['p50'] <= result['p99'] <= result['max'])
+
+
+class SuiteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_table_data(self):
+        data = benchmark.table_data(3)
+        self.assertEqual(len(data['data']), 3)
+        self.assertEqual(data['active_columns'], ['name', 'desc', 'size'])
+
+    def test_run_suite(self):
+        results = benchmark.run_suite(rows=(10,), number=2)
+        self.assertIn('python', results['environment'])
+        names = sorted(results['results'])
+        self.assertEqual(names, [
+            'execute/repodono.nunja.molds/navtable/rows=10/cold',
+            'execute/repodono.nunja.molds/navtable/rows=10/warm',
+            'execute/repodono.nunja.molds/table/rows=10/cold',
+            'execute/repodono.nunja.molds/table/rows=10/warm',
+            'execute/repodono.nunja.testing.mold/include_by_name/cold',
+            'execute/repodono.nunja.testing.mold/include_by_name/warm',
+            'execute/repodono.nunja.testing.mold/include_by_value/cold',
+            'execute/repodono.nunja.testing.mold/include_by_value/warm',
+            'registry/lookup_path',
+            'registry/lookup_path/cold',
+            'registry/lookup_path/missing',
+            'registry/verify_path',
+            'registry/verify_path/cold',
+        ])
+        self.assertEqual(results['results'][
+            'execute/repodono.nunja.molds/table/rows=10/warm']['number'], 2)
+        self.assertEqual(
+            results['results']['registry/lookup_path']['number'], 200)
+
+    def test_run_suite_row_budget(self):
+        name = 'execute/repodono.nunja.molds/table/rows=100/warm'
+        results = benchmark.run_suite(
+            rows=(100,), number=10, row_budget=300, min_number=1)
+        self.assertEqual(results['results'][name]['number'], 3)
+        # never fewer than the minimum number.
+        results = benchmark.run_suite(rows=(100,), number=10, row_budget=300)
+        self.assertEqual(
+            results['results'][name]['number'], benchmark.DEFAULT_MIN_NUMBER)
+        # unless fewer were asked for.
+        results = benchmark.run_suite(rows=(100,), number=2, row_budget=100)
+        self.assertEqual(results['results'][name]['number'], 2)
+
+    def test_path_cases_cold(self):
+        registry = benchmark.benchmark_registry()
+        invalidated = []
+        registry.invalidation_hooks.append(invalidated.append)
+        results = benchmark.path_cases(registry, 3)
+        self.assertEqual(results['lookup_path/cold']['number'], 3)
+        # the registry was invalidated before every cold lookup.
+        self.assertEqual(invalidated, [None] * 6)
+
+    def test_compare(self):
+        baseline = {'results': {
+            'a': {'p50': 1.0}, 'b': {'p50': 1.0}, 'c': {'p50': 1.0}}}
+        current = {'results': {
+            'a': {'p50': 1.05}, 'b': {'p50': 2.0}, 'd': {'p50': 1.0}}}
+        report = benchmark.compare(baseline, current)
+        self.assertEqual(report, [
+            ('a', 1.0, 1.05, 1.05), ('b', 1.0, 2.0, 2.0)])
+        self.assertEqual(
+            benchmark.regressions(report), [('b', 1.0, 2.0, 2.0)])
+        self.assertEqual(benchmark.regressions(report, threshold=1.5), [])
+        self.assertEqual(
+            benchmark.unmatched(baseline, current), (['d'], ['c']))
+
+    def test_main(self):
+        baseline = join(self.tempdir, 'baseline.json')
+        current = join(self.tempdir, 'current.json')
+        self.assertEqual(benchmark.main([
+            'run', '--rows', '10', '1000', '--max-rows', '10', '-n', '1',
+            '-o', baseline]), 0)
+        with open(baseline) as fd:
+            results = json.load(fd)
+        self.assertIn(
+            'execute/repodono.nunja.molds/table/rows=10/warm',
+            results['results'])
+        self.assertNotIn(
+            'execute/repodono.nunja.molds/table/rows=1000/warm',
+            results['results'])
+
+        for result in results['results'].values():
+            result['p50'] *= 10
+        with open(current, 'w') as fd:
+            json.dump(results, fd)
+
+        stdout = StringIO()
+        self.assertEqual(
+            benchmark.main(['compare', baseline, current], stdout=stdout), 1)
+        self.assertIn('REGRESSION', stdout.getvalue())
+        stdout = StringIO()
+        self.assertEqual(
+            benchmark.main(['compare', current, baseline], stdout=stdout), 0)
+        self.assertNotIn('REGRESSION', stdout.getvalue())
+        self.assertNotIn('ADDED', stdout.getvalue())
+
+        del results['results'][
+            'execute/repodono.nunja.molds/table/rows=10/warm']
+        results['results']['execute/new'] = {'p50': 1.0}
+        with open(current, 'w') as fd:
+            json.dump(results, fd)
+        stdout = StringIO()
+        benchmark.main(['compare', baseline, current], stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertIn('execute/new', [
+            line.split()[0] for line in lines if line.endswith('ADDED')])
+        self.assertIn(
+            'execute/repodono.nunja.molds/table/rows=10/warm', [
+                line.split()[0] for line in lines
+                if line.endswith('REMOVED')])
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import unittest
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from repodono.nunja import utils
+from repodono.nunja.utils import LazyProxy
+from repodono.nunja.utils import atomic_write
+from repodono.nunja.utils import is_initialized
+
+
+class Dummy(object):
+    value = 'dummy'
+
+
+class LazyProxyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def factory(self):
+        self.calls.append(True)
+        return Dummy()
+
+    def test_lazy(self):
+        proxy = LazyProxy(self.factory)
+        self.assertFalse(is_initialized(proxy))
+        self.assertIn('uninitialized', repr(proxy))
+        self.assertEqual(self.calls, [])
+
+        self.assertEqual(proxy.value, 'dummy')
+        self.assertTrue(is_initialized(proxy))
+        self.assertEqual(proxy.value, 'dummy')
+        self.assertEqual(len(self.calls), 1)
+        self.assertIn('Dummy', repr(proxy))
+
+    def test_set_del(self):
+        proxy = LazyProxy(self.factory)
+        proxy.value = 'other'
+        self.assertEqual(proxy.value, 'other')
+        del proxy.value
+        self.assertEqual(proxy.value, 'dummy')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_not_proxy(self):
+        self.assertTrue(is_initialized(Dummy()))
+
+
+class AtomicWriteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.path = join(self.tempdir, 'file')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_write(self):
+        atomic_write(self.path, b'first')
+        atomic_write(self.path, b'second')
+        with open(self.path, 'rb') as fd:
+            self.assertEqual(fd.read(), b'second')
+        self.assertEqual(listdir(self.tempdir), ['file'])
+
+    def test_failure(self):
+        atomic_write(self.path, b'first')
+
+        def failing_replace(src, dst):
+            raise OSError('failed')
+
+        self.addCleanup(setattr, utils, 'replace', utils.replace)
+        utils.replace = failing_replace
+        with self.assertRaises(OSError):
+            atomic_write(self.path, b'second')
+        # the original file is intact and the temporary file is gone.
+        with open(self.path, 'rb') as fd:
+            self.assertEqual(fd.read(), b'first')
+        self.assertEqual(listdir(self.tempdir), ['file'])
+
+    def test_missing_directory(self):
+        with self.assertRaises(OSError):
+            atomic_write(join(self.tempdir, 'missing', 'file'), b'data')
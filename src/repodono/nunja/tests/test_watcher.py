@@ -0,0 +1,155 @@
+import unittest
+import gc
+import time
+from os import mkdir
+from os import remove
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from repodono.nunja import watcher
+from repodono.nunja.engine import Engine
+from repodono.nunja.registry import Registry
+from repodono.nunja.watcher import PollingWatcher
+from repodono.nunja.watcher import Watcher
+
+
+class WatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.molddir = join(self.tempdir, 'mold')
+        mkdir(self.molddir)
+        self.template = join(self.molddir, 'template.jinja')
+        self.write('<span>{{ data }}</span>')
+        self.registry = Registry('tmp', {})
+        self.registry.register_mold(self.molddir, 'tmp/mold')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def write(self, contents):
+        with open(self.template, 'w') as fd:
+            fd.write(contents)
+
+    def test_checker(self):
+        w = PollingWatcher(self.registry)
+        checker = w.checker(self.template)
+        other = w.checker(join(self.tempdir, 'other', 'template.jinja'))
+        self.assertTrue(checker())
+        w.mark_stale(self.molddir)
+        self.assertFalse(checker())
+        self.assertTrue(other())
+        # a new checker is created against the current version.
+        self.assertTrue(w.checker(self.template)())
+
+    def test_poll(self):
+        w = PollingWatcher(self.registry)
+        w.snapshot = w.scan()
+        self.assertEqual(w.poll(), [])
+        self.write('<p>{{ data }}</p>')
+        self.assertEqual(w.poll(), [self.template])
+        remove(self.template)
+        self.assertEqual(w.poll(), [self.template])
+
+    def test_engine_invalidation(self):
+        w = PollingWatcher(self.registry)
+        w.snapshot = w.scan()
+        engine = Engine(self.registry, watcher=w)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        self.write('<p>{{ data }}</p>')
+        # not checked against the filesystem until the watcher says so
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        w.poll()
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<p>Hello</p>\n</div>'
+        )
+        self.assertEqual(engine.cache_stats()['misses'], 2)
+
+    def test_polling_thread(self):
+        with PollingWatcher(self.registry, interval=0.01) as w:
+            engine = Engine(self.registry, watcher=w)
+            template = engine.get_mold('tmp/mold')
+            self.write('<p>{{ data }}</p>')
+            for i in range(500):
+                if not template.is_up_to_date:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(
+                engine.execute('tmp/mold', data={'data': 'Hello'}),
+                '<div data-nunja="tmp/mold">\n<p>Hello</p>\n</div>'
+            )
+        self.assertIsNone(w._thread)
+
+    def test_base_watcher(self):
+        with Watcher(self.registry) as w:
+            checker = w.checker(self.template)
+            w.mark_stale(self.template)
+            self.assertFalse(checker())
+
+    def test_mark_stale_invalidates_registry(self):
+        invalidated = []
+        self.registry.invalidation_hooks.append(invalidated.append)
+        w = Watcher(self.registry)
+        w.mark_stale(self.template)
+        self.assertEqual(invalidated, ['tmp/mold'])
+        # a directory that contain the mold
+        w.mark_stale(self.tempdir)
+        self.assertEqual(invalidated, ['tmp/mold', 'tmp/mold'])
+        # unrelated paths only have their existence checks dropped.
+        other = join(self.tempdir, 'other')
+        self.assertFalse(self.registry.stat_cache.exists(other))
+        w.mark_stale(other)
+        self.assertNotIn(other, self.registry.stat_cache.results)
+        self.assertEqual(invalidated, ['tmp/mold', 'tmp/mold'])
+
+    def test_poll_invalidates_listing(self):
+        w = PollingWatcher(self.registry)
+        w.snapshot = w.scan()
+        self.assertEqual(
+            self.registry.template_paths('tmp/mold'), ['template.jinja'])
+        with open(join(self.molddir, 'row.jinja'), 'w') as fd:
+            fd.write('')
+        w.poll()
+        self.assertEqual(
+            self.registry.template_paths('tmp/mold'),
+            ['row.jinja', 'template.jinja'])
+
+    def test_frozen_engine_invalidation(self):
+        w = PollingWatcher(self.registry)
+        w.snapshot = w.scan()
+        engine = Engine(self.registry, frozen=True, watcher=w)
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<span>Hello</span>\n</div>'
+        )
+        self.write('<p>{{ data }}</p>')
+        w.poll()
+        self.assertEqual(
+            engine.execute('tmp/mold', data={'data': 'Hello'}),
+            '<div data-nunja="tmp/mold">\n<p>Hello</p>\n</div>'
+        )
+
+    def test_engine_hook_released(self):
+        hooks = len(self.registry.invalidation_hooks)
+        engine = Engine(self.registry)
+        self.assertEqual(len(self.registry.invalidation_hooks), hooks + 1)
+        del engine
+        gc.collect()
+        self.registry.invalidate('tmp/mold')
+        self.assertEqual(len(self.registry.invalidation_hooks), hooks)
+
+    def test_create_watcher(self):
+        w = watcher.create_watcher(self.registry, interval=0.5)
+        self.assertEqual(w.interval, 0.5)
+        if watcher.Observer is None:
+            self.assertTrue(isinstance(w, PollingWatcher))
+        else:
+            self.assertTrue(isinstance(w, watcher.WatchdogWatcher))
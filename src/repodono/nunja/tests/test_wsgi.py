@@ -0,0 +1,301 @@
+import unittest
+import gzip
+from io import BytesIO
+from os import mkdir
+from os.path import join
+from tempfile import mkdtemp
+from shutil import rmtree
+from wsgiref.util import setup_testing_defaults
+from wsgiref.validate import validator
+
+from repodono.nunja.registry import Registry
+from repodono.nunja.wsgi import NunjaAssets
+from repodono.nunja.wsgi import accepts_gzip
+
+import repodono.nunja.testing
+
+
+def request(app, path, method='GET', **headers):
+    """
+    Make a request to the WSGI application, returning the status, the
+    headers as a dict and the body.
+    """
+
+    environ = {
+        'PATH_INFO': path, 'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '', 'QUERY_STRING': '',
+    }
+    for key, value in headers.items():
+        environ['HTTP_' + key.upper()] = value
+    setup_testing_defaults(environ)
+    result = {}
+
+    def start_response(status, headers, exc_info=None):
+        result['status'] = status
+        result['headers'] = dict(headers)
+
+    iterable = validator(app)(environ, start_response)
+    try:
+        body = b''.join(iterable)
+    finally:
+        iterable.close()
+    return result['status'], result['headers'], body
+
+
+class NunjaAssetsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.bundle = join(self.tempdir, 'bundle.js')
+        self.bundle_body = b''.join(
+            b'var line%d = %d;\n' % (i, i) for i in range(100))
+        with open(self.bundle, 'wb') as fd:
+            fd.write(self.bundle_body)
+        self.registry = Registry('tmp', {})
+        self.registry.register_module(
+            repodono.nunja.testing, subdir='mold')
+        self.app = NunjaAssets(
+            self.registry, bundles={'repodono.nunja.js': self.bundle},
+            prefix='/nunja',
+        )
+        self.template = '/nunja/repodono.nunja.testing.mold/basic/' \
+            'template.jinja'
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_mold_file(self):
+        status, headers, body = request(self.app, self.template)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, b'<span>{{ value }}</span>\n')
+        self.assertEqual(
+            headers['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        # too small to be compressed.
+        status, headers, body = request(
+            self.app, self.template, accept_encoding='gzip')
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_not_found(self):
+        self.assertEqual(request(
+            self.app, '/nunja/repodono.nunja.testing.mold/basic/nothing'
+        )[0], '404 Not Found')
+        self.assertEqual(request(
+            self.app, '/nunja/repodono.nunja.testing.mold/basic/../../x'
+        )[0], '404 Not Found')
+        self.assertEqual(request(self.app, '/elsewhere')[0], '404 Not Found')
+        self.assertEqual(request(self.app, '/nunja/')[0], '404 Not Found')
+
+    def test_method_not_allowed(self):
+        status, headers, body = request(self.app, self.template, 'POST')
+        self.assertEqual(status, '405 Method Not Allowed')
+        self.assertEqual(headers['Allow'], 'GET, HEAD')
+
+    def test_head(self):
+        status, headers, body = request(self.app, self.template, 'HEAD')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['Content-Length'], '25')
+
+    def test_conditional(self):
+        status, headers, body = request(self.app, self.template)
+        etag = headers['ETag']
+
+        def load(name):
+            raise AssertionError('asset should not be loaded again')
+
+        self.app.load = load
+        status, headers, body = request(
+            self.app, self.template, if_none_match='"other", ' + etag)
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['ETag'], etag)
+        self.assertNotIn('Content-Length', headers)
+
+        status, headers, body = request(
+            self.app, self.template, if_none_match='W/' + etag)
+        self.assertEqual(status, '304 Not Modified')
+
+        status, headers, body = request(
+            self.app, self.template, if_none_match='"other"')
+        self.assertEqual(status, '200 OK')
+
+    def test_gzip(self):
+        status, headers, body = request(
+            self.app, '/nunja/repodono.nunja.js',
+            accept_encoding='gzip, deflate')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            gzip.GzipFile(fileobj=BytesIO(body)).read(), self.bundle_body)
+        gzip_etag = headers['ETag']
+
+        status, headers, body = request(self.app, '/nunja/repodono.nunja.js')
+        self.assertEqual(body, self.bundle_body)
+        self.assertNotEqual(headers['ETag'], gzip_etag)
+
+        status, headers, body = request(
+            self.app, '/nunja/repodono.nunja.js', if_none_match=gzip_etag)
+        self.assertEqual(status, '304 Not Modified')
+        # the ETag that matched is sent back.
+        self.assertEqual(headers['ETag'], gzip_etag)
+        self.assertNotIn('Content-Length', headers)
+
+        status, headers, body = request(
+            self.app, '/nunja/repodono.nunja.js', if_none_match='*',
+            accept_encoding='gzip')
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(headers['ETag'], gzip_etag)
+
+        status, headers, body = request(
+            self.app, '/nunja/repodono.nunja.js',
+            accept_encoding='gzip;q=0, deflate')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, self.bundle_body)
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip('gzip'))
+        self.assertTrue(accepts_gzip('deflate, GZIP;q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertTrue(accepts_gzip('x-gzip'))
+        self.assertFalse(accepts_gzip(''))
+        self.assertFalse(accepts_gzip('identity'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('gzip;q=0.0, *'))
+        self.assertFalse(accepts_gzip('*;q=0'))
+        self.assertFalse(accepts_gzip('gzip;q=bogus'))
+
+    def test_range(self):
+        path = '/nunja/repodono.nunja.js'
+        size = len(self.bundle_body)
+        status, headers, body = request(self.app, path, range='bytes=0-9')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(body, self.bundle_body[:10])
+        self.assertEqual(
+            headers['Content-Range'], 'bytes 0-9/%d' % size)
+
+        status, headers, body = request(self.app, path, range='bytes=10-')
+        self.assertEqual(body, self.bundle_body[10:])
+
+        status, headers, body = request(self.app, path, range='bytes=-5')
+        self.assertEqual(body, self.bundle_body[-5:])
+
+        status, headers, body = request(
+            self.app, path, range='bytes=%d-' % size)
+        self.assertEqual(status, '416 Range Not Satisfiable')
+        self.assertEqual(headers['Content-Range'], 'bytes */%d' % size)
+
+        # multiple ranges are not supported
+        status, headers, body = request(
+            self.app, path, range='bytes=0-1,5-6')
+        self.assertEqual(status, '200 OK')
+
+        # invalid ranges are ignored
+        status, headers, body = request(self.app, path, range='bytes=5-3')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, self.bundle_body)
+
+        # outdated If-Range
+        status, headers, body = request(
+            self.app, path, range='bytes=0-9', if_range='"other"')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, self.bundle_body)
+
+    def test_exports(self):
+        status, headers, body = request(
+            self.app, '/nunja/nunja.generated.js')
+        self.assertEqual(status, '200 OK')
+        self.assertIn(b'repodono.nunja.testing.mold/basic', body)
+        self.assertEqual(
+            headers['Content-Type'], 'application/javascript; charset=utf-8')
+        status, headers, body = request(
+            self.app, '/nunja/nunja_id.exported.js')
+        self.assertIn(b'template_map', body)
+
+    def test_invalidate(self):
+        request(self.app, self.template)
+        request(self.app, '/nunja/nunja.generated.js')
+        request(self.app, '/nunja/repodono.nunja.js')
+        self.registry.invalidate('repodono.nunja.testing.mold/basic')
+        self.assertEqual(sorted(self.app.assets), ['repodono.nunja.js'])
+        self.registry.invalidate()
+        self.assertEqual(self.app.assets, {})
+
+    def test_middleware(self):
+        def fallback(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'fallback']
+
+        app = NunjaAssets(self.registry, app=fallback, prefix='/nunja')
+        self.assertEqual(request(app, '/other')[2], b'fallback')
+        self.assertEqual(request(app, '/nunja/missing')[2], b'fallback')
+        self.assertEqual(
+            request(app, self.template)[2], b'<span>{{ value }}</span>\n')
+
+    def test_unregistered_not_looked_up(self):
+        for path in (
+                '/nunja/no.such/mold/template.jinja',
+                '/nunja/repodono.nunja.testing.mold/template.jinja',
+                '/nunja/nothing.js'):
+            self.assertEqual(request(self.app, path)[0], '404 Not Found')
+        self.assertEqual(len(self.registry._path_index), 0)
+
+    def test_close(self):
+        self.assertIn(self.app.invalidate, self.registry.invalidation_hooks)
+        request(self.app, self.template)
+        self.app.close()
+        self.assertNotIn(
+            self.app.invalidate, self.registry.invalidation_hooks)
+        self.assertEqual(self.app.assets, {})
+        # closing again is harmless.
+        self.app.close()
+
+
+class NunjaAssetsFilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        self.molddir = join(self.tempdir, 'mold')
+        mkdir(self.molddir)
+        for name, contents in (
+                ('template.jinja', '<p>{{ value }}</p>'),
+                ('style.css', 'p { color: red; }'),
+                ('helper.py', 'secret = 1'),
+                ('notes.txt', 'notes')):
+            self.write(name, contents)
+        self.registry = Registry('tmp', {})
+        self.registry.register_mold(self.molddir, 'tmp/mold')
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def write(self, name, contents):
+        with open(join(self.molddir, name), 'w') as fd:
+            fd.write(contents)
+
+    def test_extensions(self):
+        app = NunjaAssets(self.registry)
+        status, headers, body = request(app, '/tmp/mold/style.css')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(
+            request(app, '/tmp/mold/template.jinja')[0], '200 OK')
+        self.assertEqual(
+            request(app, '/tmp/mold/helper.py')[0], '404 Not Found')
+        self.assertEqual(
+            request(app, '/tmp/mold/notes.txt')[0], '404 Not Found')
+
+    def test_revalidated(self):
+        app = NunjaAssets(self.registry)
+        frozen = NunjaAssets(self.registry, frozen=True)
+        for a in (app, frozen):
+            self.assertEqual(
+                request(a, '/tmp/mold/style.css')[2], b'p { color: red; }')
+        # a different size, so the change is seen regardless of the
+        # resolution of the modification time.
+        self.write('style.css', 'p { color: blue; }')
+        self.assertEqual(
+            request(app, '/tmp/mold/style.css')[2], b'p { color: blue; }')
+        self.assertEqual(
+            request(frozen, '/tmp/mold/style.css')[2], b'p { color: red; }')
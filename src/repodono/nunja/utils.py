@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Assorted utilities.
+"""
+
+from os import close
+from os import remove
+from os.path import abspath
+from os.path import basename
+from os.path import dirname
+from tempfile import mkstemp
+from threading import Lock
+
+try:
+    from os import replace
+except ImportError:  # pragma: no cover
+    # rename is already atomic on POSIX for python<3.3
+    from os import rename as replace
+
+_marker = object()
+
+
+def atomic_write(path, data):
+    """
+    Write the data (bytes) to the file at path through a temporary file
+    in the same directory that is then moved into place, such that the
+    file at path is never seen partially written.  Upon any failure the
+    temporary file is removed and the exception is raised.
+    """
+
+    fd, tmpname = mkstemp(
+        prefix=basename(path) + '.', suffix='.tmp',
+        dir=dirname(abspath(path)))
+    close(fd)
+    try:
+        with open(tmpname, 'wb') as f:
+            f.write(data)
+        replace(tmpname, path)
+    except BaseException:
+        try:
+            remove(tmpname)
+        except OSError:
+            pass
+        raise
+
+
+class LazyProxy(object):
+    """
+    A proxy to the object produced by the factory, which will only be
+    called upon the first access of any attribute through the proxy.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_LazyProxy__factory', factory)
+        object.__setattr__(self, '_LazyProxy__target', _marker)
+        object.__setattr__(self, '_LazyProxy__lock', Lock())
+
+    def __resolve(self):
+        target = self.__target
+        if target is _marker:
+            with self.__lock:
+                target = self.__target
+                if target is _marker:
+                    target = self.__factory()
+                    object.__setattr__(self, '_LazyProxy__target', target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self.__resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.__resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.__resolve(), name)
+
+    def __repr__(self):
+        if self.__target is _marker:
+            return '<%s for %r (uninitialized)>' % (
+                type(self).__name__, self.__factory)
+        return repr(self.__target)
+
+
+def is_initialized(obj):
+    """
+    Return False if obj is a LazyProxy that has yet to produce its
+    target, otherwise True.
+    """
+
+    if isinstance(obj, LazyProxy):
+        return object.__getattribute__(
+            obj, '_LazyProxy__target') is not _marker
+    return True
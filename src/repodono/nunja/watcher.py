@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Invalidation of templates through the watching of mold directories.
+
+Rather than having the freshness of every template checked against the
+filesystem whenever it is used, a watcher keeps a version for every
+template file handed out by the loader, which gets bumped whenever a
+change is detected for any file under the registered mold directories.
+Checking whether a template is up to date is then just the comparison
+of that version with the one it was loaded with.
+
+The ``watchdog`` package is used to receive the filesystem events if it
+is available, otherwise the mold directories are polled from a thread.
+"""
+
+from os import stat
+from os import walk
+from os.path import join
+from logging import getLogger
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = getLogger(__name__)
+
+DEFAULT_INTERVAL = 1.0
+
+
+class Watcher(object):
+    """
+    The base watcher, which keep track of the versions of the paths.
+    """
+
+    def __init__(self, registry, interval=DEFAULT_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.versions = {}
+        self._lock = Lock()
+
+    def checker(self, path):
+        """
+        Return the uptodate function for a template loaded from path.
+        """
+
+        versions = self.versions
+        with self._lock:
+            version = versions.setdefault(path, 0)
+
+        def checker():
+            return versions.get(path) == version
+        return checker
+
+    def mold_ids(self, path):
+        """
+        Return the sorted list of the mold_ids of the registered molds
+        that contain the path, or that are underneath it.
+        """
+
+        prefix = join(path, '')
+        return sorted(
+            mold_id for mold_id, root in list(self.registry.molds.items())
+            if root == path or path.startswith(join(root, '')) or
+            root.startswith(prefix)
+        )
+
+    def mark_stale(self, path):
+        """
+        Mark the path, along with everything underneath it, as stale,
+        then invalidate the affected molds through the registry such
+        that its invalidation hooks are notified.
+        """
+
+        prefix = join(path, '')
+        with self._lock:
+            for key in list(self.versions):
+                if key == path or key.startswith(prefix):
+                    self.versions[key] += 1
+
+        mold_ids = self.mold_ids(path)
+        if not mold_ids:
+            self.registry.stat_cache.invalidate(path)
+        for mold_id in mold_ids:
+            self.registry.invalidate(mold_id)
+
+    def start(self):
+        """
+        Start watching.  The base watcher does not watch anything by
+        itself, such that ``mark_stale`` must be called for the changes.
+        """
+
+    def stop(self):
+        """
+        Stop watching.
+        """
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class PollingWatcher(Watcher):
+    """
+    Poll all the files within the registered mold directories from a
+    thread, every interval seconds.
+    """
+
+    def __init__(self, registry, interval=DEFAULT_INTERVAL):
+        super(PollingWatcher, self).__init__(registry, interval)
+        self.snapshot = {}
+        self._stopped = Event()
+        self._thread = None
+
+    def scan(self):
+        """
+        Return a dict of every file path under the mold directories to
+        its modification time and size.
+        """
+
+        results = {}
+        for root in set(self.registry.molds.values()):
+            for r, d, files in walk(root):
+                for name in files:
+                    path = join(r, name)
+                    try:
+                        st = stat(path)
+                    except OSError:
+                        continue
+                    results[path] = (st.st_mtime, st.st_size)
+        return results
+
+    def poll(self):
+        """
+        Compare a new scan with the previous one, then mark all files
+        that got changed, added or removed as stale.
+        """
+
+        snapshot = self.scan()
+        previous = self.snapshot
+        self.snapshot = snapshot
+        changed = [
+            path for path in set(previous) | set(snapshot)
+            if previous.get(path) != snapshot.get(path)
+        ]
+        for path in changed:
+            self.mark_stale(path)
+        return changed
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('failed to poll the mold directories')
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.snapshot = self.scan()
+        self._stopped.clear()
+        self._thread = Thread(target=self.run, name='nunja-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+
+class _EventHandler(FileSystemEventHandler):
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        self.watcher.mark_stale(event.src_path)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.mark_stale(dest_path)
+
+
+class WatchdogWatcher(Watcher):
+    """
+    Mark paths as stale upon receiving the events from ``watchdog`` for
+    the registered mold directories.  The interval is used as the
+    timeout of the observer.
+    """
+
+    def __init__(self, registry, interval=DEFAULT_INTERVAL):
+        if Observer is None:
+            raise ImportError('the watchdog package is not available')
+        super(WatchdogWatcher, self).__init__(registry, interval)
+        self.watched = set()
+        self._observer = None
+
+    def watch(self, mold_id=None):
+        """
+        Schedule all the mold directories that are not already watched.
+        """
+
+        if self._observer is None:
+            return
+        handler = _EventHandler(self)
+        for path in set(self.registry.molds.values()) - self.watched:
+            self._observer.schedule(handler, path, recursive=True)
+            self.watched.add(path)
+
+    def start(self):
+        if self._observer is not None:
+            return
+        self._observer = Observer(timeout=self.interval)
+        self.watch()
+        self.registry.invalidation_hooks.append(self.watch)
+        self._observer.start()
+
+    def stop(self):
+        if self._observer is None:
+            return
+        self.registry.invalidation_hooks.remove(self.watch)
+        self._observer.stop()
+        self._observer.join()
+        self._observer = None
+        self.watched.clear()
+
+
+def create_watcher(registry, interval=DEFAULT_INTERVAL):
+    """
+    Create a watcher for the registry; one that make use of watchdog if
+    it is available, otherwise one that polls.  The returned watcher
+    has not been started.
+    """
+
+    if Observer is not None:
+        return WatchdogWatcher(registry, interval)
+    return PollingWatcher(registry, interval)
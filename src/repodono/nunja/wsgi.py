@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI application for serving the assets provided by the molds.
+
+The templates and the JavaScript and CSS files within the registered
+molds are served at their mold_id paths, along with the requirejs
+configuration and the template map exports, and any bundles that were
+provided.  Every asset is read once and kept until its file changes, at
+which point its ETag and its gzip compressed body are also computed,
+such that conditional requests may be answered with 304 and compressed
+responses may be served without any further work.  Byte range requests
+are supported for the uncompressed bodies.
+
+The cached assets for a mold are dropped whenever the registry
+invalidates it, otherwise ``invalidate`` may be called directly.
+"""
+
+import mimetypes
+import re
+from gzip import GzipFile
+from hashlib import sha256
+from io import BytesIO
+from threading import Lock
+
+from .exc import FileNotFoundError
+from .exporters import export_umd_generic_json
+from .registry import registry as default_registry
+from .registry import TMPL_FN_EXT
+from .resources import read_bytes
+from .resources import stat
+
+REQUIREJS_EXPORT_NAME = 'nunja.generated.js'
+TEMPLATE_MAP_EXPORT_NAME = 'nunja_id.exported.js'
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json',
+)
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.jinja': 'text/plain; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+}
+# the extensions of the files within the molds that may be served.
+SERVED_EXTENSIONS = (TMPL_FN_EXT, '.js', '.css')
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def gzip_compress(body):
+    """
+    Return the gzip compressed body, with a fixed mtime such that the
+    results are reproducible.
+    """
+
+    buf = BytesIO()
+    with GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(body)
+    return buf.getvalue()
+
+
+def guess_content_type(name):
+    for ext, content_type in CONTENT_TYPES.items():
+        if name.endswith(ext):
+            return content_type
+    content_type = mimetypes.guess_type(name)[0]
+    return content_type or 'application/octet-stream'
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Return whether the value of an Accept-Encoding header accepts the
+    gzip coding, i.e. with a q-value that is not 0.
+    """
+
+    qvalues = {}
+    for item in accept_encoding.split(','):
+        params = item.split(';')
+        coding = params[0].strip().lower()
+        qvalue = 1.0
+        for param in params[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        if coding:
+            qvalues[coding] = qvalue
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+
+class Asset(object):
+    """
+    A body to be served, along with its precomputed ETag and the gzip
+    compressed body if it was worth compressing.  If it was read from
+    the file at path, the stat result (the modification time and size)
+    from before the read should be provided for ``is_current``.
+    """
+
+    def __init__(self, body, content_type, min_gzip_size=256, path=None,
+                 stat_result=None):
+        self.body = body
+        self.content_type = content_type
+        self.path = path
+        self.stat_result = stat_result
+        digest = sha256(body).hexdigest()[:32]
+        self.etag = '"%s"' % digest
+        self.gzip_body = None
+        self.gzip_etag = None
+        if (len(body) >= min_gzip_size and
+                content_type.startswith(COMPRESSIBLE_TYPES)):
+            gzip_body = gzip_compress(body)
+            if len(gzip_body) < len(body):
+                self.gzip_body = gzip_body
+                self.gzip_etag = '"%s-gzip"' % digest
+
+    def is_current(self):
+        """
+        Return whether the file the body was read from is unchanged.
+        """
+
+        if self.path is None:
+            return True
+        try:
+            return stat(self.path) == self.stat_result
+        except OSError:
+            return False
+
+    def match(self, if_none_match, etag):
+        """
+        Return the ETag of either of the bodies that the value of an
+        If-None-Match header matches, preferring the etag of the body
+        that would be served, or None if neither does.
+        """
+
+        if if_none_match.strip() == '*':
+            return etag
+        tags = set(
+            tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()
+            for tag in if_none_match.split(',')
+        )
+        for candidate in (etag, self.etag, self.gzip_etag):
+            if candidate is not None and candidate in tags:
+                return candidate
+        return None
+
+
+class NunjaAssets(object):
+    """
+    The WSGI application that serves the assets of the molds in the
+    registry under the prefix.
+
+    Arguments:
+
+    registry
+        The registry with the molds to serve.
+    bundles
+        A dict of names to the paths of files to be served under the
+        prefix by those names, such as the bundle produced by the
+        toolchain.
+    app
+        If provided, requests that are not for anything served here
+        are passed to this WSGI application, making this a middleware;
+        otherwise they are answered with 404.  Only the paths that lead
+        to a registered mold will be looked up.
+    prefix
+        The path under which everything is served.
+    cache_control
+        The value of the Cache-Control header for all the responses.
+    min_gzip_size
+        The minimum size for a body to be gzip compressed.
+    frozen
+        If set, the cached assets are never checked against their files
+        again, otherwise they are reloaded once their files changed.
+
+    The invalidation hook that is added to the registry is removed by
+    ``close``.
+    """
+
+    def __init__(self, registry=default_registry, bundles=None, app=None,
+                 prefix='', cache_control='no-cache', min_gzip_size=256,
+                 frozen=False):
+        self.registry = registry
+        self.bundles = dict(bundles or {})
+        self.app = app
+        self.prefix = prefix.rstrip('/')
+        self.cache_control = cache_control
+        self.min_gzip_size = min_gzip_size
+        self.frozen = frozen
+        self.assets = {}
+        self._lock = Lock()
+        registry.invalidation_hooks.append(self.invalidate)
+
+    def close(self):
+        """
+        Remove the invalidation hook from the registry and drop all the
+        cached assets.
+        """
+
+        try:
+            self.registry.invalidation_hooks.remove(self.invalidate)
+        except ValueError:
+            pass
+        self.invalidate()
+
+    def invalidate(self, mold_id=None):
+        """
+        Drop the cached assets for the mold_id, along with the exports,
+        or everything if no mold_id is provided.
+        """
+
+        with self._lock:
+            if mold_id is None:
+                self.assets.clear()
+                return
+            prefix = mold_id + '/'
+            for name in list(self.assets):
+                if name.startswith(prefix) or name in (
+                        REQUIREJS_EXPORT_NAME, TEMPLATE_MAP_EXPORT_NAME):
+                    del self.assets[name]
+
+    def locate(self, name):
+        """
+        Return the path of the file for the name, or raise KeyError if
+        it is neither a bundle nor a file that may be served from within
+        a registered mold.
+        """
+
+        if name in self.bundles:
+            return self.bundles[name]
+        frags = name.split('/')
+        if len(frags) < 3 or not name.endswith(SERVED_EXTENSIONS):
+            raise KeyError(name)
+        # only the paths within a registered mold are looked up, such
+        # that arbitrary paths will not fill the index of the registry.
+        if self.registry.mold_id_to_path('/'.join(frags[:2]), None) is None:
+            raise KeyError(name)
+        try:
+            return self.registry.verify_path(name)
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def load(self, name):
+        """
+        Load the Asset for the name, or raise KeyError if there is no
+        asset by that name.
+        """
+
+        content_type = guess_content_type(name)
+        if name == REQUIREJS_EXPORT_NAME:
+            return Asset(export_umd_generic_json(
+                self.registry.export_nunja_requirejs_json()).encode('utf-8'),
+                content_type, self.min_gzip_size)
+        if name == TEMPLATE_MAP_EXPORT_NAME:
+            return Asset(export_umd_generic_json(
+                self.registry.export_jinja_template_paths()).encode('utf-8'),
+                content_type, self.min_gzip_size)
+        path = self.locate(name)
+        try:
+            stat_result = stat(path)
+            body = read_bytes(path)
+        except (IOError, OSError):
+            raise KeyError(name)
+        return Asset(
+            body, content_type, self.min_gzip_size, path, stat_result)
+
+    def get_asset(self, name):
+        """
+        Return the Asset for the name, loading it if it has not been or,
+        when not frozen, if its file has changed since.
+        """
+
+        asset = self.assets.get(name)
+        if asset is None or not (self.frozen or asset.is_current()):
+            asset = self.load(name)
+            with self._lock:
+                self.assets[name] = asset
+        return asset
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        name = None
+        if path.startswith(self.prefix + '/'):
+            name = path[len(self.prefix) + 1:]
+
+        asset = None
+        if name:
+            try:
+                asset = self.get_asset(name)
+            except KeyError:
+                pass
+
+        if asset is None:
+            if self.app is not None:
+                return self.app(environ, start_response)
+            return self._respond(
+                start_response, '404 Not Found',
+                [('Content-Type', 'text/plain')], b'Not Found')
+
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if method not in ('GET', 'HEAD'):
+            return self._respond(
+                start_response, '405 Method Not Allowed',
+                [('Allow', 'GET, HEAD'), ('Content-Type', 'text/plain')],
+                b'Method Not Allowed')
+
+        return self.serve(environ, start_response, asset, method == 'HEAD')
+
+    def serve(self, environ, start_response, asset, head=False):
+        headers = [
+            ('Cache-Control', self.cache_control),
+            ('Vary', 'Accept-Encoding'),
+        ]
+
+        gzip = asset.gzip_body is not None and accepts_gzip(
+            environ.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = asset.gzip_etag if gzip else asset.etag
+
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        matched = if_none_match and asset.match(if_none_match, etag)
+        if matched:
+            headers.append(('ETag', matched))
+            # no Content-Length, as it would have to be the length of
+            # the body that would have been served.
+            start_response('304 Not Modified', headers)
+            return [b'']
+
+        headers.append(('Content-Type', asset.content_type))
+        range_header = environ.get('HTTP_RANGE')
+        if_range = environ.get('HTTP_IF_RANGE')
+        if range_header and (not if_range or if_range == asset.etag):
+            result = self._serve_range(
+                start_response, asset, headers, range_header, head)
+            if result is not None:
+                return result
+
+        headers.append(('Accept-Ranges', 'bytes'))
+        headers.append(('ETag', etag))
+        if gzip:
+            headers.append(('Content-Encoding', 'gzip'))
+            body = asset.gzip_body
+        else:
+            body = asset.body
+        return self._respond(start_response, '200 OK', headers, body, head)
+
+    def _serve_range(self, start_response, asset, headers, value, head):
+        match = _range_re.match(value.strip())
+        if not match or match.groups() == ('', ''):
+            # multiple or malformed ranges are not supported, so the
+            # complete body will be served instead.
+            return None
+
+        size = len(asset.body)
+        first, last = match.groups()
+        if first and last and int(last) < int(first):
+            # an invalid range is ignored.
+            return None
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+
+        headers.append(('ETag', asset.etag))
+        if start > end or start >= size:
+            headers.append(('Content-Range', 'bytes */%d' % size))
+            return self._respond(
+                start_response, '416 Range Not Satisfiable', headers, b'')
+
+        headers.append(('Content-Range', 'bytes %d-%d/%d' % (
+            start, end, size)))
+        return self._respond(
+            start_response, '206 Partial Content', headers,
+            asset.body[start:end + 1], head,
+        )
+
+    def _respond(self, start_response, status, headers, body, head=False):
+        headers = list(headers)
+        headers.append(('Content-Length', str(len(body))))
+        start_response(status, headers)
+        return [b''] if head else [body]